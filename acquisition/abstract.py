@@ -1,23 +1,40 @@
 from enum import Enum
-import hashlib
 import os
 import re
-import selectors
-import shlex
 import subprocess
-import sys
 import time
 from abc import ABC, abstractmethod
-from dataclasses import dataclass, field
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import contextmanager
+from dataclasses import asdict, dataclass, field
 from datetime import datetime
 from pathlib import Path
-from shutil import copy, make_archive
 from subprocess import Popen
-from typing import IO, List, Optional, Tuple
-
-from meta import AUTHOR, VERSION
-from shared.environment import RECOVERY, SOURCE_PATH
-from shared.utils import datetime_string, lines_to_properties
+from typing import (
+    BinaryIO,
+    Callable,
+    Iterable,
+    Iterator,
+    List,
+    Optional,
+    Tuple,
+    Union,
+)
+
+from acquisition.checkpoint import Checkpoint
+from acquisition.report_log import ReportLog, stage_line
+from meta import VERSION
+from shared.compression import CompressionPolicy
+from shared.environment import ENVIRONMENT, RECOVERY
+from shared.hashing import DEFAULT_ALGORITHMS, copy_and_hash, hash_file
+from shared.inventory import INVENTORY
+from shared.manifest import write_manifest
+from shared.process import CaptureSink, ConsoleSink, Sink, run_process
+from shared.progress import ProgressTracker, percent_parser
+from shared.segments import SegmentedWriter, copy_to_segments
+from shared.sizing import SizeEstimate, shared_estimate
+from shared.store import ChunkStore, ingest_tree
+from shared.zipwriter import ZipWriter
 
 
 @dataclass
@@ -26,10 +43,20 @@ class Parameters:
     examiner: str = ""
     notes: str = ""
     image_name: str = "Mac_Acquisition"
-    source: Path = Path(SOURCE_PATH)
+    source: Path = field(default_factory=lambda: Path(ENVIRONMENT.source_path))
     tmp: Path = Path("/Volumes/Fuji")
     destination: Path = Path("/Volumes/Fuji")
     sound: bool = not RECOVERY
+    digests: Tuple[str, ...] = DEFAULT_ALGORITHMS
+    # Read the output through mmap while hashing it (local destinations)
+    hash_mmap: bool = False
+    manifest: bool = False
+    # Split the output in files of this size, if not zero
+    segment_size: int = 0
+    # Deduplicating store receiving the data instead of a DMG or ZIP file
+    store: Optional[Path] = None
+    # Searchable SQLite index of the unified logs (Sysdiagnose only)
+    log_index: bool = False
 
 
 @dataclass
@@ -52,6 +79,21 @@ class HashedFile:
     sha256: str = ""
 
 
+@dataclass
+class StageTiming:
+    name: str
+    seconds: float = 0.0
+    bytes: int = 0
+
+    @property
+    def rate(self) -> float:
+        # Bytes per second
+        return self.bytes / self.seconds if self.seconds > 0 else 0.0
+
+    def describe(self) -> str:
+        return stage_line(self.name, self.seconds, self.bytes)
+
+
 @dataclass
 class Report:
     parameters: Parameters
@@ -63,6 +105,9 @@ class Report:
     success: bool = False
     output_files: List[Path] = field(default_factory=list)
     result: HashedFile = None  # type: ignore
+    stages: List[StageTiming] = field(default_factory=list)
+    source_estimate: Optional[SizeEstimate] = None
+    segments: List[HashedFile] = field(default_factory=list)
 
 
 @dataclass
@@ -73,6 +118,10 @@ class SparseInfo:
     mount: str
 
 
+# File systems where the DMG can be written directly by hdiutil
+DIRECT_FILESYSTEMS = {"apfs", "hfs"}
+
+
 class OutputFormat(Enum):
     DMG = 1
     ZIP = 2
@@ -84,48 +133,26 @@ class AcquisitionMethod(ABC):
 
     temporary_image: Optional[SparseInfo] = None
     output_path: Path
+    checkpoint: Checkpoint
+    report_log: ReportLog
+    # Whether the image contains a copy of the source, and can be sized on it
+    copies_source = True
+
+    def __init__(self):
+        self.progress = ProgressTracker()
 
     def available(self) -> bool:
         """Returns whether the acquisition method is available."""
         return True
 
-    def _limited_read(self, file: IO[str], limit: int, encoding: str) -> str:
-        sel = selectors.DefaultSelector()
-        sel.register(file, selectors.EVENT_READ)
-
-        events = sel.select(0.125)
-        if events:
-            data = os.read(file.fileno(), limit)
-            return data.decode(encoding, "ignore")
-        else:
-            # Timeout occurred
-            return ""
-
-    def _create_shell_process(
-        self,
-        arguments: List[str],
-        awake=True,
-        redirect: Optional[Path] = None,
-    ) -> Popen[str]:
+    def _awake(self, arguments: List[str], awake=True) -> List[str]:
         if awake:
-            arguments = ["caffeinate", "-dimsu"] + arguments
-
-        command = shlex.join(arguments) + " 2>&1"
-        if redirect is not None:
-            command = command + " > " + shlex.quote(redirect.as_posix())
-
-        p = subprocess.Popen(
-            command,
-            stdout=subprocess.PIPE,
-            shell=True,
-            universal_newlines=True,
-        )
-        return p
+            return ["caffeinate", "-dimsu"] + arguments
+        return arguments
 
     def _run_silent(self, arguments: List[str], awake=True) -> Tuple[int, str]:
         # Run a process silently. Return its status code and output.
-        if awake:
-            arguments = ["caffeinate", "-dimsu"] + arguments
+        arguments = self._awake(arguments, awake)
 
         p = subprocess.run(arguments, capture_output=True, universal_newlines=True)
         return p.returncode, p.stdout
@@ -135,69 +162,39 @@ class AcquisitionMethod(ABC):
         arguments: List[str],
         awake=True,
         buffer_size=1024000,
+        sinks: Iterable[Sink] = (),
     ) -> Tuple[int, str]:
-        # Run a process in plain sight. Return its status code and output.
-        p = self._create_shell_process(arguments, awake=awake)
-
-        stdout: IO[str] = p.stdout  # type: ignore
-        encoding: str = stdout.encoding  # type: ignore
-        output = ""
-        while True:
-            # Let it breathe and avoid the UI getting stuck
-            time.sleep(0.1)
-            out = self._limited_read(stdout, buffer_size, encoding)
-            if out:
-                sys.stdout.write(out)
-                output = output + out
-
-            if p.poll() != None:
-                out = stdout.read()
-                sys.stdout.write(out)
-                output = output + out
-                break
-
-        return p.returncode, output
+        # Run a process in plain sight. Return its status code and output (up
+        # to the last buffer_size bytes). Additional sinks can parse the
+        # output, e.g. for tracking progress.
+        capture = CaptureSink(buffer_size)
+        status = run_process(
+            self._awake(arguments, awake), sinks=[ConsoleSink(), capture, *sinks]
+        )
+        return status, capture.getvalue()
 
     def _run_status(
-        self,
-        arguments: List[str],
-        awake=True,
-        buffer_size=1024000,
+        self, arguments: List[str], awake=True, sinks: Iterable[Sink] = ()
     ) -> int:
         # Run a process in plain sight. Return its status code.
-        p = self._create_shell_process(arguments, awake=awake)
-
-        stdout: IO[str] = p.stdout  # type: ignore
-        encoding: str = stdout.encoding  # type: ignore
-        while True:
-            # Let it breathe and avoid the UI getting stuck
-            time.sleep(0.1)
-            out = self._limited_read(stdout, buffer_size, encoding)
-            if out:
-                sys.stdout.write(out)
-
-            if p.poll() != None:
-                out = stdout.read()
-                sys.stdout.write(out)
-                break
-
-        return p.returncode
+        return run_process(self._awake(arguments, awake), sinks=[ConsoleSink(), *sinks])
 
     def _run_dots(
-        self, arguments: List[str], awake=True, redirect=Path(os.devnull)
+        self,
+        arguments: List[str],
+        awake=True,
+        redirect=Path(os.devnull),
+        output: Optional[Sink] = None,
     ) -> int:
-        # Run a long process while showing some dots during execution
-        p = self._create_shell_process(arguments, awake=awake, redirect=redirect)
-
-        while True:
-            time.sleep(0.5)
-
-            if p.poll() != None:
-                break
-
-            print(".", end="")
-
-        return p.returncode
+        # Run a long process while showing some dots during execution. The
+        # standard output goes to the output sink, if any, or to a file.
+        return run_process(
+            self._awake(arguments, awake),
+            redirect=None if output else redirect,
+            heartbeat=lambda: print(".", end=""),
+            interval=0.5,
+            output=output,
+        )
 
     def _disk_from_device(self, device: str) -> str:
         if not device.startswith("/dev/disk"):
@@ -206,9 +203,7 @@ class AcquisitionMethod(ABC):
         return "/dev/disk" + chunk
 
     def _find_mount_point(self, path: Path) -> Path:
-        path = Path(os.path.realpath(path))
-        while not path.is_mount():
-            path = path.parent
+        path = INVENTORY.mount_point(path)
 
         # Special case for avoiding bugs in recovery environment
         if RECOVERY and len(path.parts) > 3 and path.parts[1] == "Volumes":
@@ -223,17 +218,13 @@ class AcquisitionMethod(ABC):
 
         disk_device = ""
         if is_disk:
-            disk_info = subprocess.check_output(
-                ["diskutil", "info", f"{path}"], universal_newlines=True
-            )
-            diskutil_info = lines_to_properties(disk_info.splitlines())
-
-            valid = "Device Node" in diskutil_info
-            if valid:
-                disk_device = diskutil_info["Device Node"]
+            volume = INVENTORY.volume(path)
+            disk_info = volume.text
+            if volume.device:
+                disk_device = volume.device
             else:
                 is_disk = False
-            filesystem = diskutil_info.get("Type (Bundle)", "")
+            filesystem = volume.filesystem
         else:
             mount_point = self._find_mount_point(path)
             mount_info = self._gather_path_info(mount_point)
@@ -255,6 +246,70 @@ class AcquisitionMethod(ABC):
         )
         return details
 
+    def _compute_exclusions(self, params: Parameters) -> List[Path]:
+        # Copy tools can be tricked into acquiring files multiple times by macOS,
+        # due to how it handles mount points inside the APFS container. This
+        # method aims to prevent acquiring duplicates of the same files.
+
+        source_info = self._gather_path_info(params.source)
+        source_disk = source_info.disk_parent
+
+        results = []
+        for mount in INVENTORY.mounts():
+            if not mount.device.startswith("/dev/disk"):
+                continue
+            point_path = Path(mount.mount_point)
+            point_disk = self._disk_from_device(mount.device)
+
+            if point_disk == source_disk and params.source in point_path.parents:
+                results.append(point_path)
+
+        return results
+
+    def _used_space(self, path: Path) -> int:
+        try:
+            stats = os.statvfs(path)
+        except OSError:
+            return 0
+        return (stats.f_blocks - stats.f_bfree) * stats.f_frsize
+
+    def _free_space(self, path: Path) -> int:
+        try:
+            stats = os.statvfs(path)
+        except OSError:
+            return 0
+        return stats.f_bavail * stats.f_frsize
+
+    def _source_size(self, report: Report) -> int:
+        # Expected size of the copy
+        if report.source_estimate:
+            return report.source_estimate.logical_bytes
+        if not report.path_details.is_disk:
+            return 0
+        return self._used_space(report.parameters.source)
+
+    @contextmanager
+    def _stage(
+        self, report: Report, name: str, bytes_total=0, files_total=0
+    ) -> Iterator[None]:
+        # Time a stage of the acquisition, which also becomes the current stage
+        # of the progress tracker. The bytes processed are taken from it.
+        self.progress.start(name, bytes_total=bytes_total, files_total=files_total)
+        start = time.monotonic()
+        try:
+            yield
+        finally:
+            current = self.progress.current()
+            processed = current.bytes_done if current else 0
+            self.progress.finish()
+            seconds = time.monotonic() - start
+            timing = StageTiming(name, seconds=seconds, bytes=processed)
+            report.stages.append(timing)
+            self.report_log.append("stage", **asdict(timing))
+
+    def _copy_stage(self, report: Report):
+        return self._stage(report, "Copying", bytes_total=self._source_size(report))
+
     def _gather_hardware_info(self) -> str:
         _, hardware_info = self._run_silent(
             [
@@ -282,26 +337,45 @@ class AcquisitionMethod(ABC):
         # Add a bit of extra space to ensure the destination is large enough
         extra_gigabyte_sectors = 2 * 10**6
         sectors = report.path_details.disk_sectors + extra_gigabyte_sectors
+        estimate = report.source_estimate
+        if estimate and estimate.scanned:
+            # A folder needs an image as large as its contents, not the disk
+            upper_sectors = -(-estimate.upper // 512)
+            sectors = min(sectors, upper_sectors + extra_gigabyte_sectors)
         temporary_path = output_directory / f"{params.image_name}{suffix}.sparseimage"
 
         image_path: str = f"{temporary_path}"
-        result, output = self._run_process(
-            [
-                "hdiutil",
-                "create",
-                "-sectors",
-                f"{sectors}",
-                "-fs",
-                best_filesystem,
-                "-volname",
-                params.image_name,
-                image_path,
-            ],
-        )
-        if result > 0:
-            return None
-
+        stage = f"image{suffix}"
+        if temporary_path.exists() and self.checkpoint.done(stage):
+            # Left by an interrupted acquisition, reuse it
+            print("\nReattaching", temporary_path)
+        else:
+            with self._stage(report, "Creating image"):
+                result, output = self._run_process(
+                    [
+                        "hdiutil",
+                        "create",
+                        "-sectors",
+                        f"{sectors}",
+                        "-fs",
+                        best_filesystem,
+                        "-volname",
+                        params.image_name,
+                        image_path,
+                    ],
+                )
+            if result > 0:
+                return None
+            self.checkpoint.complete(stage, path=image_path)
+
+        return self._attach_sparse_image(report, temporary_path)
+
+    def _attach_sparse_image(
+        self, report: Report, temporary_path: Path
+    ) -> Optional[SparseInfo]:
+        image_path: str = f"{temporary_path}"
         result, output = self._run_process(["hdiutil", "attach", image_path])
+        INVENTORY.invalidate()
         output_lines = output.strip().splitlines()
 
         container_lines = [
@@ -320,9 +394,7 @@ class AcquisitionMethod(ABC):
             temporary_volume = parts[0]
             temporary_mount = parts[2]
 
-            report.output_files.append(temporary_path)
-            # Write preliminary report
-            self._write_report(report)
+            self._add_artifact(report, temporary_path)
 
             image_info = SparseInfo(
                 path=temporary_path,
@@ -335,11 +407,20 @@ class AcquisitionMethod(ABC):
         return None
 
     def _create_temporary_image(self, report: Report) -> Optional[SparseInfo]:
+        converted = self.checkpoint.get("converted")
+        if converted:
+            # The temporary image was already converted and removed before the
+            # acquisition was interrupted
+            info = SparseInfo(**converted["temporary_image"])
+            info.path = Path(info.path)
+            self.temporary_image = info
+            return info
+
         # Temporary image is placed in the destination directory
         base = report.parameters.destination
-        info = self._create_sparse_image(report, base=base, suffix="-temporary")
-        self.temporary_image = info
-        return info
+        created = self._create_sparse_image(report, base=base, suffix="-temporary")
+        self.temporary_image = created
+        return created
 
     def _create_conversion_image(self, report: Report) -> Optional[SparseInfo]:
         # Conversion image is placed in the temporary directory
@@ -366,6 +447,7 @@ class AcquisitionMethod(ABC):
 
         # This could be automatically unmounted, we don't check for success
         self._run_silent(["hdiutil", "detach", "-force", image.container])
+        INVENTORY.invalidate()
         return True
 
     def _start_coffee(self) -> Popen:
@@ -377,12 +459,51 @@ class AcquisitionMethod(ABC):
         coffee: Popen = subprocess.Popen(["caffeinate", "-dimsu", "-t", f"{one_week}"])
         return coffee
 
-    def _generate_dmg(self, report: Report) -> bool:
-        if not self.temporary_image:
+    def _can_convert_directly(self, report: Report) -> bool:
+        # hdiutil writes the DMG in place only on local Mac file systems.
+        # Anything else (e.g. exFAT or network shares) goes through a
+        # conversion image on the temporary location.
+        destination = report.parameters.destination
+        mount = INVENTORY.mount_at(INVENTORY.mount_point(destination))
+        if not mount:
+            return False
+        if mount.filesystem not in DIRECT_FILESYSTEMS or "local" not in mount.options:
             return False
 
-        result = self._detach_sparse_image(self.temporary_image)
-        if not result:
+        # A partial DMG left by a full destination would be useless. The DMG
+        # is estimated from the data in the (still attached) temporary image.
+        image = self.temporary_image
+        if not image:
+            return False
+        sparse_size = os.stat(image.path).st_size
+        dmg_size = self._used_space(Path(image.mount))
+        return self._free_space(destination) >= sparse_size + dmg_size
+
+    def _convert_image(self, report: Report, output: Path) -> bool:
+        sparseimage = f"{self.temporary_image.path}"  # type: ignore
+        dmg = f"{output}"
+        print("\nConverting", sparseimage, "->", dmg)
+        total_size = os.stat(sparseimage).st_size
+        with self._stage(report, "Converting", bytes_total=total_size):
+            # Machine-readable progress is printed with -puppetstrings
+            result = self._run_status(
+                [
+                    "hdiutil",
+                    "convert",
+                    sparseimage,
+                    "-format",
+                    "UDZO",
+                    "-puppetstrings",
+                    "-ov",
+                    "-o",
+                    dmg,
+                ],
+                sinks=[percent_parser(self.progress)],
+            )
+        return result == 0
+
+    def _generate_dmg(self, report: Report) -> bool:
+        if not self.temporary_image:
             return False
 
         params = report.parameters
@@ -391,40 +512,117 @@ class AcquisitionMethod(ABC):
         final_image_name = f"{params.image_name}.dmg"
         self.output_path = output_directory / final_image_name
 
-        conversion_image = self._create_conversion_image(report)
-        if not conversion_image:
-            return False
-
-        temporary_output_path = Path(conversion_image.mount) / final_image_name
-        print("\nConverting", self.temporary_image.path, "->", temporary_output_path)
-        sparseimage = f"{self.temporary_image.path}"
-        dmg = f"{temporary_output_path}"
-        result = self._run_status(
-            ["hdiutil", "convert", sparseimage, "-format", "UDZO", "-o", dmg]
+        output = self.checkpoint.get("output")
+        if output:
+            # Completed before the acquisition was interrupted
+            self._restore_output(report, output)
+            return True
+
+        converted = self.checkpoint.get("converted")
+        if converted and converted.get("direct"):
+            # Only the hashes are missing
+            self._add_artifact(report, self.output_path)
+            return True
+
+        # Segments are written while copying the DMG out of the staging image
+        conversion_image: Optional[SparseInfo] = None
+        direct = (
+            not converted
+            and not params.segment_size
+            and self._can_convert_directly(report)
         )
-        success = result == 0
+        if converted:
+            conversion_image = self._create_conversion_image(report)
+            if not conversion_image:
+                return False
+            temporary_output_path = Path(conversion_image.mount) / final_image_name
+        else:
+            if direct:
+                # The DMG is hashed afterwards, by reading it once
+                temporary_output_path = self.output_path
+            else:
+                # Created while the manifest is still being written
+                conversion_image = self._create_conversion_image(report)
+                if not conversion_image:
+                    self._finish_manifest(report)
+                    return False
+                temporary_output_path = Path(conversion_image.mount) / final_image_name
+
+            # hdiutil converts the image only once it is detached
+            self._finish_manifest(report)
+            with self._stage(report, "Detaching"):
+                result = self._detach_sparse_image(self.temporary_image)
+            if not result:
+                return False
 
-        if not success:
-            return False
+            if not self._convert_image(report, temporary_output_path):
+                if not direct:
+                    return False
+                # The destination might not work with hdiutil after all
+                print("\nDirect conversion failed, retrying on the temporary location")
+                self.output_path.unlink(missing_ok=True)
+                direct = False
+                conversion_image = self._create_conversion_image(report)
+                if not conversion_image:
+                    return False
+                temporary_output_path = Path(conversion_image.mount) / final_image_name
+                if not self._convert_image(report, temporary_output_path):
+                    return False
+
+            temporary_image = {
+                "path": f"{self.temporary_image.path}",
+                "container": self.temporary_image.container,
+                "volume": self.temporary_image.volume,
+                "mount": self.temporary_image.mount,
+            }
+            self.checkpoint.complete(
+                "converted", temporary_image=temporary_image, direct=direct
+            )
 
-        # Remove the temporary image and free up space for the DMG
-        self.temporary_image.path.unlink(missing_ok=True)
+            # Remove the temporary image and free up space for the DMG
+            self.temporary_image.path.unlink(missing_ok=True)
 
-        # Copy file to final destination
-        print("\nMoving", temporary_output_path, "->", self.output_path)
-        coffee = self._start_coffee()
-        try:
-            copy(temporary_output_path, self.output_path)
-            report.output_files.append(self.output_path)
-            success = True
-        except Exception as e:
-            print("Error while moving DMG to final destination!")
-            print(f"{e}")
-            success = False
-        finally:
-            coffee.kill()
+            if direct:
+                self._add_artifact(report, self.output_path)
+                return True
 
-        detach_result = self._detach_sparse_image(conversion_image)
+        # Only direct conversions, which returned above, have no staging image
+        assert conversion_image is not None
+
+        # Copy file to final destination, hashing it along the way
+        print("\nMoving", temporary_output_path, "->", self.output_path)
+        total_size = os.stat(temporary_output_path).st_size
+        with self._stage(report, "Moving DMG", bytes_total=total_size):
+            coffee = self._start_coffee()
+            try:
+                if params.segment_size:
+                    with self._segmented_writer(report) as writer:
+                        copy_to_segments(
+                            temporary_output_path,
+                            writer,
+                            progress=self._track_bytes(),
+                        )
+                    self._store_segments(report, writer)
+                else:
+                    digests = copy_and_hash(
+                        temporary_output_path,
+                        self.output_path,
+                        report.parameters.digests,
+                        progress=self._track_bytes(),
+                    )
+                    self._add_artifact(report, self.output_path)
+                    report.result = HashedFile(self.output_path, **digests)
+                    self.checkpoint.complete("output", hashes=digests)
+                success = True
+            except Exception as e:
+                print("Error while moving DMG to final destination!")
+                print(f"{e}")
+                success = False
+            finally:
+                coffee.kill()
+
+        with self._stage(report, "Detaching"):
+            detach_result = self._detach_sparse_image(conversion_image)
         # Try to remove the conversion image directory, if empty
         conversion_image.path.unlink(missing_ok=True)
         try:
@@ -441,27 +639,107 @@ class AcquisitionMethod(ABC):
         params = report.parameters
         output_directory = params.destination / params.image_name
         output_directory.mkdir(parents=True, exist_ok=True)
-        output_path_no_extension = output_directory / params.image_name
         self.output_path = output_directory / f"{params.image_name}.zip"
 
-        print("\nConverting", self.temporary_image.mount, "->", self.output_path)
-        coffee = self._start_coffee()
-        try:
-            make_archive(
-                output_path_no_extension.as_posix(),
-                format="zip",
-                root_dir=self.temporary_image.mount,
-            )
-            report.output_files.append(self.output_path)
+        output = self.checkpoint.get("output")
+        if output:
+            # Completed before the acquisition was interrupted
+            self._restore_output(report, output)
             success = True
-        except Exception as e:
-            print("Error while creating ZIP file!")
-            print(f"{e}")
-            success = False
-        finally:
-            coffee.kill()
+        else:
+            print("\nConverting", self.temporary_image.mount, "->", self.output_path)
+            mount = Path(self.temporary_image.mount)
+            total_size = self._used_space(mount)
+            with self._stage(report, "Creating ZIP", bytes_total=total_size):
+                coffee = self._start_coffee()
+                try:
+                    stream: Union[SegmentedWriter, BinaryIO]
+                    if params.segment_size:
+                        stream = self._segmented_writer(report)
+                    else:
+                        stream = open(self.output_path, "wb")
+                    policy = CompressionPolicy()
+                    with stream, ZipWriter(
+                        stream,  # type: ignore
+                        progress=self._track_bytes(),
+                        policy=policy,
+                    ) as writer:
+                        writer.write_tree(Path(self.temporary_image.mount))
+                    self.report_log.append("compression", **policy.summary())
+                    if isinstance(stream, SegmentedWriter):
+                        self._store_segments(report, stream)
+                    else:
+                        self._add_artifact(report, self.output_path)
+                        self.checkpoint.complete("output")
+                    success = True
+                except Exception as e:
+                    print("Error while creating ZIP file!")
+                    print(f"{e}")
+                    success = False
+                finally:
+                    coffee.kill()
+
+        self._finish_manifest(report)
+        with self._stage(report, "Detaching"):
+            detach_result = self._detach_sparse_image(self.temporary_image)
+        # Try to remove the temporary image directory, if empty
+        self.temporary_image.path.unlink(missing_ok=True)
+        try:
+            self.temporary_image.path.parent.rmdir()
+        except Exception:
+            pass
+
+        return success and detach_result
+
+    def _generate_store(self, report: Report) -> bool:
+        # Only the chunks which are not yet in the store are written, and the
+        # acquisition is described by an index referring to them
+        if not self.temporary_image:
+            return False
 
-        detach_result = self._detach_sparse_image(self.temporary_image)
+        params = report.parameters
+        store_path: Path = params.store  # type: ignore
+        output_directory = params.destination / params.image_name
+        output_directory.mkdir(parents=True, exist_ok=True)
+        self.output_path = output_directory / f"{params.image_name}.index.jsonl.gz"
+
+        if self.checkpoint.done("output"):
+            # Completed before the acquisition was interrupted
+            self._add_artifact(report, self.output_path)
+            success = True
+        else:
+            print("\nStoring", self.temporary_image.mount, "->", store_path)
+            mount = Path(self.temporary_image.mount)
+            total_size = self._used_space(mount)
+            with self._stage(report, "Storing", bytes_total=total_size):
+                coffee = self._start_coffee()
+                try:
+                    with ChunkStore(store_path) as store:
+                        stats = ingest_tree(
+                            store,
+                            mount,
+                            self.output_path,
+                            progress=self._track_bytes(),
+                        )
+                    self._add_artifact(report, self.output_path)
+                    self.report_log.append(
+                        "store",
+                        path=f"{store_path}",
+                        index=f"{self.output_path}",
+                        **asdict(stats),
+                    )
+                    self.checkpoint.complete("output")
+                    success = True
+                except Exception as e:
+                    print("Error while writing to the store!")
+                    print(f"{e}")
+                    success = False
+                finally:
+                    coffee.kill()
+
+        self._finish_manifest(report)
+        with self._stage(report, "Detaching"):
+            detach_result = self._detach_sparse_image(self.temporary_image)
         # Try to remove the temporary image directory, if empty
         self.temporary_image.path.unlink(missing_ok=True)
         try:
@@ -471,126 +749,256 @@ class AcquisitionMethod(ABC):
 
         return success and detach_result
 
-    def _compute_hashes(self, path: Path) -> HashedFile:
-        print("\nHashing", path)
+    def _track_bytes(self) -> Callable[[int], None]:
+        # Progress callback for the current stage
+        def update(amount: int) -> None:
+            self.progress.update(bytes_done=amount)
 
-        total_size = os.stat(path).st_size
-        amount = 0
-        last_percent = 0
-        chunk_size = 16 * 1024
+        return update
 
-        sha1 = hashlib.sha1()
-        sha256 = hashlib.sha256()
-        md5 = hashlib.md5()
+    def _compute_hashes(
+        self, report: Report, path: Path, algorithms=DEFAULT_ALGORITHMS
+    ) -> HashedFile:
+        print("\nHashing", path)
 
+        total_size = os.stat(path).st_size
         coffee = self._start_coffee()
 
         try:
-            with open(path, "rb") as f:
-                while True:
-                    chunk = f.read(chunk_size)
-                    if not chunk:
-                        print("")
-                        break
-                    sha1.update(chunk)
-                    sha256.update(chunk)
-                    md5.update(chunk)
-
-                    amount = amount + chunk_size
-                    percent = 100 * amount // total_size
-                    if percent > last_percent:
-                        print(f"{percent}% ", end="")
-                        last_percent = percent
+            with self._stage(report, "Hashing", bytes_total=total_size):
+                digests = hash_file(
+                    path,
+                    algorithms,
+                    use_mmap=report.parameters.hash_mmap,
+                    progress=self._track_bytes(),
+                )
         finally:
             coffee.kill()
 
-        result = HashedFile(
-            path, md5=md5.hexdigest(), sha1=sha1.hexdigest(), sha256=sha256.hexdigest()
-        )
+        result = HashedFile(path, **digests)
         return result
 
-    def _write_report(self, report: Report) -> None:
+    def _add_artifact(self, report: Report, path: Path) -> None:
+        report.output_files.append(path)
+        # Artifacts are logged once, even when reused after resuming
+        if f"{path}" not in self.report_log.artifacts():
+            self.report_log.append("artifact", path=f"{path}")
+
+    def _segmented_writer(self, report: Report) -> SegmentedWriter:
         params = report.parameters
-        output_directory = params.destination / params.image_name
-        output_directory.mkdir(parents=True, exist_ok=True)
-        self.output_report = output_directory / f"{params.image_name}.txt"
+        return SegmentedWriter(self.output_path, params.segment_size, params.digests)
 
-        print("\nWriting report file", self.output_report)
+    def _store_segments(self, report: Report, writer: SegmentedWriter) -> None:
+        # Segments and the digests of the whole stream, computed while writing
+        segments = [
+            {"path": f"{segment.path}", "size": segment.size, **segment.digests}
+            for segment in writer.segments
+        ]
+        self.checkpoint.complete("output", hashes=writer.digests, segments=segments)
+        self._restore_output(report, {"hashes": writer.digests, "segments": segments})
+
+    def _restore_output(self, report: Report, output: dict) -> None:
+        segments = output.get("segments")
+        if not segments:
+            self._add_artifact(report, self.output_path)
+            if output.get("hashes"):
+                report.result = HashedFile(self.output_path, **output["hashes"])
+            return
+
+        report.segments = []
+        for segment in segments:
+            path = Path(segment["path"])
+            digests = {
+                name: value
+                for name, value in segment.items()
+                if name not in ("path", "size")
+            }
+            self._add_artifact(report, path)
+            report.segments.append(HashedFile(path, **digests))
+        report.result = HashedFile(self.output_path, **output["hashes"])
+
+    def _log_hashes(self, report: Report) -> None:
+        if report.segments and not self.report_log.has("segments"):
+            segments = []
+            for segment in report.segments:
+                values = asdict(segment)
+                values["path"] = f"{segment.path}"
+                values["size"] = os.stat(segment.path).st_size
+                segments.append({k: v for k, v in values.items() if v != ""})
+            self.report_log.append("segments", segments=segments)
+        if self.report_log.has("hashes"):
+            return
+        hashes = {
+            name: value
+            for name, value in asdict(report.result).items()
+            if name != "path" and value
+        }
+        if report.segments:
+            # Digests of the concatenation of all segments
+            hashes["segments"] = len(report.segments)
+        self.report_log.append("hashes", path=f"{report.result.path}", **hashes)
+
+    def _initialize_report(self, params: Parameters) -> Optional[Report]:
+        self.progress.reset()
+        location = Checkpoint.location(params.destination, params.image_name)
+        self.checkpoint = Checkpoint(location)
+        if not self.checkpoint.matches(self.name, params.source):
+            # The report of the other acquisition must not be overwritten
+            print(f"\n{location.parent} contains a different acquisition!")
+            print("Choose another image name or destination")
+            return None
+        started = self.checkpoint.get("started")
 
-        separator = "-" * 80
-
-        output_files = []
-        if len(report.output_files):
-            output_files = [
-                separator,
-                "Generated artifacts (including temporary ones):",
-            ] + [f"    - {file}" for file in report.output_files]
-
-        hashes = []
-        if report.result:
-            hashes = [
-                separator,
-                f"Computed hashes ({report.result.path.name}):",
-                f"    - MD5: {report.result.md5}",
-                f"    - SHA1: {report.result.sha1}",
-                f"    - SHA256: {report.result.sha256}",
-            ]
+        output_directory = params.destination / params.image_name
+        self.report_log = ReportLog(output_directory, params.image_name)
+        self.output_report = self.report_log.text_path
+        print("\nWriting report file", self.output_report)
 
-        with open(self.output_report, "w") as output:
-            for line in (
-                [
-                    "Fuji - Forensic Unattended Juicy Imaging",
-                    f"Version {VERSION} by {AUTHOR}",
-                    "Acquisition log",
-                    separator,
-                    f"Case name: {report.parameters.case}",
-                    f"Examiner: {report.parameters.examiner}",
-                    f"Notes: {report.parameters.notes}",
-                    separator,
-                    f"Start time: {datetime_string(report.start_time)}",
-                    f"End time: {datetime_string(report.end_time)}",
-                    f"Source: {report.parameters.source}",
-                    f"Acquisition method: {report.method.name}",
-                    f"Running in recovery environment: {'Yes' if RECOVERY else 'No'}",
-                    separator,
-                    report.hardware_info,
-                    separator,
-                    "Volume:",
-                    "",
-                    report.path_details.disk_info,
-                ]
-                + output_files
-                + hashes
-            ):
-                output.write(line + "\n")
-
-    def _initialize_report(self, params: Parameters) -> Report:
         report = Report(params, self, start_time=datetime.now())
-        report.path_details = self._gather_path_info(params.source)
-        report.hardware_info = self._gather_hardware_info()
-        # Preliminary report
-        self._write_report(report)
+        if started:
+            print("Resuming interrupted acquisition...")
+            report.start_time = datetime.fromisoformat(started["start_time"])
+            self.report_log.load()
+            self.report_log.append("resumed")
+        else:
+            self.report_log.reset()
+            self.report_log.append(
+                "started",
+                **{
+                    name: value
+                    for name, value in asdict(params).items()
+                    if name != "sound"
+                },
+                method=self.name,
+                start_time=report.start_time.isoformat(),  # type: ignore
+                recovery=RECOVERY,
+                version=VERSION,
+            )
+
+        with self._stage(report, "Preparing"):
+            report.path_details = self._gather_path_info(params.source)
+            report.hardware_info = self._gather_hardware_info()
+            # These are logged only once, even when resuming
+            if not self.report_log.has("hardware"):
+                self.report_log.append("hardware", info=report.hardware_info)
+            if not self.report_log.has("volume"):
+                self.report_log.append("volume", **asdict(report.path_details))
+            if self.copies_source:
+                exclusions = self._compute_exclusions(params)
+                # Usually computed already by the free space check
+                estimate = shared_estimate(params.source, exclusions).result()
+                report.source_estimate = estimate
+                if not self.report_log.has("size"):
+                    self.report_log.append(
+                        "size",
+                        **asdict(estimate),
+                        lower=estimate.lower,
+                        expected=estimate.expected,
+                        upper=estimate.upper,
+                    )
+
+        if not started:
+            self.checkpoint.complete(
+                "started",
+                method=self.name,
+                source=f"{params.source}",
+                start_time=report.start_time.isoformat(),  # type: ignore
+            )
         return report
 
+    def _start_manifest(self, report: Report) -> None:
+        # The files are hashed on a background thread, while the image is
+        # being packed. The thread is joined before the image is detached.
+        self._manifest_job = None
+        if not self.temporary_image:
+            return
+
+        params = report.parameters
+        output_directory = params.destination / params.image_name
+        output_directory.mkdir(parents=True, exist_ok=True)
+        manifest_path = output_directory / f"{params.image_name}_manifest.csv"
+        if self.checkpoint.done("manifest"):
+            self._add_artifact(report, manifest_path)
+            return
+
+        root = Path(self.temporary_image.mount)
+        if not root.is_dir():
+            print("\nCannot find", root, "to generate the file manifest")
+            return
+
+        print("\nWriting file manifest", manifest_path)
+        start = time.monotonic()
+
+        def write() -> Tuple[int, float]:
+            count = write_manifest(root, manifest_path)
+            return count, time.monotonic() - start
+
+        executor = ThreadPoolExecutor(1)
+        self._manifest_job = (manifest_path, executor.submit(write))
+        executor.shutdown(wait=False)
+
+    def _finish_manifest(self, report: Report) -> None:
+        job = getattr(self, "_manifest_job", None)
+        if not job:
+            return
+        self._manifest_job = None
+        manifest_path, future = job
+        try:
+            count, seconds = future.result()
+            # Logged like a stage, although it overlapped with others
+            timing = StageTiming("Manifest", seconds=seconds)
+            report.stages.append(timing)
+            self.report_log.append("stage", **asdict(timing))
+            self._add_artifact(report, manifest_path)
+            self.checkpoint.complete("manifest")
+            print(f"\nHashed {count} entries")
+        except Exception as e:
+            print("Error while writing the file manifest!")
+            print(f"{e}")
+
     def _pack_and_hash(self, report: Report, format=OutputFormat.DMG) -> Report:
         if not self.temporary_image:
             return report
 
-        if format == OutputFormat.DMG:
+        # The manifest is computed while the temporary image is still mounted
+        if report.parameters.manifest:
+            self._start_manifest(report)
+
+        if report.parameters.store:
+            result = self._generate_store(report)
+        elif format == OutputFormat.DMG:
             result = self._generate_dmg(report)
         else:
             result = self._generate_zip(report)
+        # In case the image was not detached
+        self._finish_manifest(report)
         if not result:
             return report
 
-        # Compute all hashes and mark report as done
-        report.result = self._compute_hashes(self.output_path)
+        # Compute all hashes (unless already done while copying) and mark
+        # report as done
+        hashes = self.checkpoint.get("hashes")
+        if not report.result and hashes:
+            report.result = HashedFile(self.output_path, **hashes)
+        elif not report.result:
+            report.result = self._compute_hashes(
+                report, self.output_path, report.parameters.digests
+            )
+            digests = report.parameters.digests
+            hashes = {name: getattr(report.result, name) for name in digests}
+            self.checkpoint.complete("hashes", **hashes)
+        self._log_hashes(report)
         report.success = True
         report.end_time = datetime.now()
-        # Final report
-        self._write_report(report)
+        self.report_log.append(
+            "end", end_time=report.end_time.isoformat(), success=True
+        )
+        # Nothing left to resume
+        self.checkpoint.discard()
 
         print("\nAcquisition completed!")
+        for stage in report.stages:
+            print(f"    - {stage.describe()}")
         return report
 
     @abstractmethod
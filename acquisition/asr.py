@@ -1,5 +1,6 @@
 from datetime import datetime
 from acquisition.abstract import AcquisitionMethod, Parameters, Report
+from shared.progress import asr_parser
 
 
 class AsrMethod(AcquisitionMethod):
@@ -10,30 +11,39 @@ class AsrMethod(AcquisitionMethod):
     def execute(self, params: Parameters) -> Report:
         # Prepare report
         report = self._initialize_report(params)
+        if not report:
+            return Report(params, self)
 
         temporary_image = self._create_temporary_image(report)
         if not temporary_image:
             return report
 
-        print("\nASR", params.source, "->", temporary_image.volume)
-        command = [
-            "asr",
-            "restore",
-            "--source",
-            f"{params.source}",
-            "--target",
-            temporary_image.volume,
-            "--noprompt",
-            "--erase",
-        ]
-        status, output = self._run_process(command)
-
-        # Sometimes ASR crashes at the end but the acquisition is still OK
-        success = status == 0 or (
-            output.count("..100") > 1 and "Restored target" in output
-        )
-
-        if not success:
-            return report
+        if not self.checkpoint.done("copy"):
+            # ASR erases the target, so an interrupted restore starts over
+            print("\nASR", params.source, "->", temporary_image.volume)
+            command = [
+                "asr",
+                "restore",
+                "--source",
+                f"{params.source}",
+                "--target",
+                temporary_image.volume,
+                "--noprompt",
+                "--erase",
+            ]
+            # The percentage goes up to 100 twice, for validation and restore
+            with self._copy_stage(report):
+                status, output = self._run_process(
+                    command, sinks=[asr_parser(self.progress)]
+                )
+
+            # Sometimes ASR crashes at the end but the acquisition is still OK
+            success = status == 0 or (
+                output.count("..100") > 1 and "Restored target" in output
+            )
+
+            if not success:
+                return report
+            self.checkpoint.complete("copy")
 
         return self._pack_and_hash(report)
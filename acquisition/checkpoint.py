@@ -0,0 +1,101 @@
+import json
+import os
+import threading
+from datetime import datetime
+from pathlib import Path
+from typing import IO, Any, Dict, Optional, Set
+
+
+class Checkpoint:
+    # Append-only journal of the completed acquisition stages, stored next to
+    # the report. Each line is a JSON object with the stage name and its data.
+    # A second file keeps the list of files already copied by methods that are
+    # able to skip them when resuming.
+
+    def __init__(self, path: Path):
+        self.path = path
+        self.files_path = path.with_name(path.name + "-files")
+        self.stages: Dict[str, Dict[str, Any]] = {}
+        self._files: Optional[IO[str]] = None
+        self._files_lock = threading.Lock()
+        self._pending_files = 0
+        self.load()
+
+    @staticmethod
+    def location(destination: Path, image_name: str) -> Path:
+        return destination / image_name / f"{image_name}.checkpoint"
+
+    def load(self) -> None:
+        self.stages = {}
+        if not self.path.exists():
+            return
+        with open(self.path) as journal:
+            for line in journal:
+                try:
+                    record = json.loads(line)
+                except json.JSONDecodeError:
+                    # Last line might be truncated if we were interrupted
+                    continue
+                self.stages[record["stage"]] = record.get("data", {})
+
+    @property
+    def resuming(self) -> bool:
+        return bool(self.stages)
+
+    def matches(self, method: str, source: Path) -> bool:
+        # Whether the journal can be resumed by an acquisition of the source
+        # with the method
+        started = self.get("started")
+        if not started:
+            return not self.resuming
+        return started.get("method") == method and started.get("source") == f"{source}"
+
+    def done(self, stage: str) -> bool:
+        return stage in self.stages
+
+    def get(self, stage: str) -> Dict[str, Any]:
+        return self.stages.get(stage, {})
+
+    def complete(self, stage: str, **data) -> None:
+        self.stages[stage] = data
+        record = {"stage": stage, "time": datetime.now().isoformat(), "data": data}
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        with open(self.path, "a") as journal:
+            journal.write(json.dumps(record) + "\n")
+            journal.flush()
+            os.fsync(journal.fileno())
+
+    def copied_files(self) -> Set[str]:
+        if not self.files_path.exists():
+            return set()
+        result = set()
+        with open(self.files_path) as files:
+            for line in files:
+                try:
+                    result.add(json.loads(line))
+                except json.JSONDecodeError:
+                    continue
+        return result
+
+    def record_file(self, relative_path: str) -> None:
+        with self._files_lock:
+            if self._files is None:
+                self._files = open(self.files_path, "a")
+            # Encoded as JSON strings, since paths can contain new lines
+            self._files.write(json.dumps(relative_path) + "\n")
+            self._pending_files = self._pending_files + 1
+            if self._pending_files >= 1000:
+                self._files.flush()
+                self._pending_files = 0
+
+    def close_files(self) -> None:
+        with self._files_lock:
+            if self._files is not None:
+                self._files.close()
+                self._files = None
+
+    def discard(self) -> None:
+        self.close_files()
+        self.stages = {}
+        self.path.unlink(missing_ok=True)
+        self.files_path.unlink(missing_ok=True)
@@ -2,6 +2,7 @@ from datetime import datetime
 
 from acquisition.abstract import AcquisitionMethod, Parameters, Report
 from shared.environment import RECOVERY
+from shared.progress import VolumeMonitor, line_counter
 
 
 class DittoMethod(AcquisitionMethod):
@@ -18,23 +19,31 @@ class DittoMethod(AcquisitionMethod):
     def execute(self, params: Parameters) -> Report:
         # Prepare report
         report = self._initialize_report(params)
+        if not report:
+            return Report(params, self)
 
         temporary_image = self._create_temporary_image(report)
         if not temporary_image:
             return report
 
-        print("\nDitto", params.source, "->", temporary_image.mount)
-        source_str = f"{params.source}"
-        if not source_str.endswith("/"):
-            source_str = source_str + "/"
-        command = ["ditto", "-X", "-V", source_str, temporary_image.mount]
-        status = self._run_status(command)
-
-        # We cannot rely on the exit code, because it will probably contain some
-        # errors if a few files cannot be copied.
-        if status != 0:
-            print(f"Ditto terminated (with status {status})")
-        else:
-            print("Ditto terminated")
+        if not self.checkpoint.done("copy"):
+            print("\nDitto", params.source, "->", temporary_image.mount)
+            source_str = f"{params.source}"
+            if not source_str.endswith("/"):
+                source_str = source_str + "/"
+            command = ["ditto", "-X", "-V", source_str, temporary_image.mount]
+            # Ditto prints a line for each file, bytes are measured on the image
+            with self._copy_stage(report), VolumeMonitor(
+                temporary_image.mount, self.progress
+            ):
+                status = self._run_status(command, sinks=[line_counter(self.progress)])
+
+            # We cannot rely on the exit code, because it will probably contain
+            # some errors if a few files cannot be copied.
+            if status != 0:
+                print(f"Ditto terminated (with status {status})")
+            else:
+                print("Ditto terminated")
+            self.checkpoint.complete("copy")
 
         return self._pack_and_hash(report)
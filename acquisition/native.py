@@ -0,0 +1,56 @@
+import os
+from pathlib import Path
+
+from acquisition.abstract import AcquisitionMethod, Parameters, Report
+from shared.copier import ParallelCopier
+
+
+class NativeMethod(AcquisitionMethod):
+    name = "Native"
+    description = """Files and directories are copied in parallel by Fuji itself.
+    This is fast on SSD sources and it can be used on any source directory. Errors are ignored."""
+
+    walkers = 4
+    copiers = 4 * (os.cpu_count() or 4)
+
+    def execute(self, params: Parameters) -> Report:
+        # Prepare report
+        report = self._initialize_report(params)
+        if not report:
+            return Report(params, self)
+
+        print("Computing exclusions...")
+        exclusions = self._compute_exclusions(params)
+
+        temporary_image = self._create_temporary_image(report)
+        if not temporary_image:
+            return report
+
+        if not self.checkpoint.done("copy"):
+            print("\nCopying", params.source, "->", temporary_image.mount)
+            # Files copied before an interruption are skipped
+            copier = ParallelCopier(
+                params.source,
+                Path(temporary_image.mount),
+                exclusions=exclusions,
+                walkers=self.walkers,
+                copiers=self.copiers,
+                skip=self.checkpoint.copied_files(),
+                on_copied=self.checkpoint.record_file,
+                progress=lambda size, files: self.progress.update(
+                    bytes_done=size, files_done=files
+                ),
+            )
+            coffee = self._start_coffee()
+            try:
+                with self._copy_stage(report):
+                    stats = copier.run()
+            finally:
+                coffee.kill()
+                self.checkpoint.close_files()
+
+            # Like the other copy methods, errors on single files are not fatal
+            print(f"Copy terminated ({stats.errors} errors)")
+            self.checkpoint.complete("copy")
+
+        return self._pack_and_hash(report)
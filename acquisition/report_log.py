@@ -0,0 +1,266 @@
+import json
+import os
+from datetime import datetime, timedelta
+from pathlib import Path
+from typing import Any, Dict, List, Optional
+
+import humanize
+
+from meta import AUTHOR, VERSION
+from shared.utils import datetime_string
+
+SEPARATOR = "-" * 80
+
+# Events listed in chronological order under a common heading
+STEP_EVENTS = {"artifact", "stage", "resumed"}
+
+HASH_LABELS = {"md5": "MD5", "sha1": "SHA1", "sha256": "SHA256"}
+
+
+def stage_line(name: str, seconds: float, processed: int) -> str:
+    line = f"{name}: {timedelta(seconds=round(seconds))}"
+    if processed:
+        size = humanize.naturalsize(processed)
+        rate = humanize.naturalsize(processed / seconds if seconds > 0 else 0)
+        line = line + f", {size} ({rate}/s)"
+    return line
+
+
+def _time(value: Optional[str]) -> str:
+    return datetime_string(datetime.fromisoformat(value) if value else None)
+
+
+def _hash_lines(values: Dict[str, Any], indent: int = 4) -> List[str]:
+    return [
+        f"{' ' * indent}- {label}: {values[algorithm]}"
+        for algorithm, label in HASH_LABELS.items()
+        if values.get(algorithm)
+    ]
+
+
+def _size_lines(event: Dict[str, Any]) -> List[str]:
+    if not event["scanned"]:
+        used = humanize.naturalsize(event["expected"])
+        return [SEPARATOR, f"Used space on the source volume: {used}"]
+    lines = [
+        SEPARATOR,
+        "Source size:",
+        f"    - Files: {event['files']} ({event['hardlinks']} hard links)",
+        f"    - Directories: {event['directories']}",
+        f"    - Logical size: {humanize.naturalsize(event['logical_bytes'])}",
+        f"    - Allocated size: {humanize.naturalsize(event['allocated_bytes'])}",
+        "    - Estimated copy size: "
+        + f"{humanize.naturalsize(event['lower'])} to "
+        + humanize.naturalsize(event["upper"]),
+    ]
+    if event["unreadable"]:
+        unreadable = event["unreadable"]
+        lines.append(f"    - Directories which could not be read: {unreadable}")
+    return lines
+
+
+def _compression_lines(event: Dict[str, Any]) -> List[str]:
+    lines = [SEPARATOR, "ZIP compression:"]
+    for kind, stats in event["classes"].items():
+        if not stats["files"]:
+            continue
+        size = humanize.naturalsize(stats["bytes"])
+        ratio = stats["compressed_bytes"] / stats["bytes"] if stats["bytes"] else 1
+        lines.append(
+            f"    - {kind.capitalize()}: {stats['files']} files, {size} "
+            + f"(compressed to {ratio:.1%})"
+        )
+    reasons = ", ".join(f"{name} {count}" for name, count in event["reasons"].items())
+    if reasons:
+        lines.append(f"    - Decisions: {reasons}")
+    return lines
+
+
+def _log_conversion_lines(event: Dict[str, Any]) -> List[str]:
+    return [
+        SEPARATOR,
+        f"Unified logs converted in {event['windows']} time windows",
+        f"    - Records outside their window, skipped: {event['skipped']}",
+    ]
+
+
+def _log_index_lines(event: Dict[str, Any]) -> List[str]:
+    search = "with" if event["full_text"] else "without"
+    lines = [
+        SEPARATOR,
+        f"Unified log index: {Path(event['path']).name}",
+        f"    - Records: {event['records']} ({search} full-text search)",
+        f"    - Process, subsystem and category names: {event['names']}",
+    ]
+    if event["malformed"]:
+        lines.append(f"    - Malformed lines: {event['malformed']}")
+    return lines
+
+
+def _store_lines(event: Dict[str, Any]) -> List[str]:
+    new = humanize.naturalsize(event["new_bytes"])
+    stored = humanize.naturalsize(event["stored_bytes"])
+    return [
+        SEPARATOR,
+        f"Deduplicating store: {event['path']}",
+        f"    - Index: {Path(event['index']).name}",
+        f"    - Files: {event['files']}",
+        f"    - Data: {humanize.naturalsize(event['bytes'])} "
+        + f"in {event['chunks']} chunks",
+        f"    - New data: {new} in {event['new_chunks']} chunks ({stored} written)",
+    ]
+
+
+def _verification_lines(event: Dict[str, Any]) -> List[str]:
+    result = "passed" if event["passed"] else "FAILED"
+    lines = [SEPARATOR, f"Verification at {_time(event['time'])}: {result}"]
+    if event["error"]:
+        lines.append(f"    - {event['error']}")
+    for item in event["files"]:
+        status = "OK" if item["passed"] else item["error"] or "hash mismatch"
+        lines.append(f"    - {Path(item['path']).name}: {status}")
+    if event["zip_members"]:
+        errors = len(event["zip_errors"])
+        lines.append(f"    - ZIP members checked: {event['zip_members']}")
+        lines.append(f"    - ZIP members with errors: {errors}")
+    for error in event["zip_errors"]:
+        lines.append(f"        {error}")
+    return lines
+
+
+class TextRenderer:
+    # Turns events into lines of the human-readable report. Consecutive steps
+    # (artifacts and stage timings) share a heading.
+
+    def __init__(self):
+        self.in_steps = False
+
+    def render(self, event: Dict[str, Any]) -> List[str]:
+        kind = event["event"]
+        lines = []
+        if kind in STEP_EVENTS and not self.in_steps:
+            lines.extend([SEPARATOR, "Acquisition steps:"])
+        self.in_steps = kind in STEP_EVENTS
+
+        if kind == "started":
+            lines.extend(
+                [
+                    "Fuji - Forensic Unattended Juicy Imaging",
+                    f"Version {event.get('version', VERSION)} by {AUTHOR}",
+                    "Acquisition log",
+                    SEPARATOR,
+                    f"Case name: {event['case']}",
+                    f"Examiner: {event['examiner']}",
+                    f"Notes: {event['notes']}",
+                    SEPARATOR,
+                    f"Start time: {_time(event['start_time'])}",
+                    f"Source: {event['source']}",
+                    f"Acquisition method: {event['method']}",
+                    "Running in recovery environment: "
+                    + ("Yes" if event["recovery"] else "No"),
+                ]
+            )
+        elif kind == "hardware":
+            lines.extend([SEPARATOR, event["info"]])
+        elif kind == "volume":
+            lines.extend([SEPARATOR, "Volume:", "", event["disk_info"]])
+        elif kind == "size":
+            lines.extend(_size_lines(event))
+        elif kind == "artifact":
+            lines.append(f"    - Generated artifact: {event['path']}")
+        elif kind == "stage":
+            line = stage_line(event["name"], event["seconds"], event["bytes"])
+            lines.append(f"    - Stage {line}")
+        elif kind == "hashes":
+            name = Path(event["path"]).name
+            if event.get("segments"):
+                name = f"{name}, all segments"
+            lines.extend([SEPARATOR, f"Computed hashes ({name}):"])
+            lines.extend(_hash_lines(event))
+        elif kind == "segments":
+            lines.extend([SEPARATOR, "Output segments:"])
+            for segment in event["segments"]:
+                name = Path(segment["path"]).name
+                size = humanize.naturalsize(segment["size"])
+                lines.append(f"    {name} ({size}):")
+                lines.extend(_hash_lines(segment, indent=8))
+        elif kind == "resumed":
+            lines.append(f"    - Resumed at {_time(event['time'])}")
+        elif kind == "compression":
+            lines.extend(_compression_lines(event))
+        elif kind == "log_conversion":
+            lines.extend(_log_conversion_lines(event))
+        elif kind == "log_index":
+            lines.extend(_log_index_lines(event))
+        elif kind == "store":
+            lines.extend(_store_lines(event))
+        elif kind == "verification":
+            lines.extend(_verification_lines(event))
+        elif kind == "end":
+            result = "completed" if event["success"] else "failed"
+            lines.extend(
+                [
+                    SEPARATOR,
+                    f"End time: {_time(event['end_time'])}",
+                    f"Acquisition {result}",
+                ]
+            )
+        return lines
+
+
+class ReportLog:
+    # Acquisition report kept as an append-only journal of JSON events, one
+    # per line. The text report is rendered from the events as they are
+    # appended, so nothing is written twice.
+
+    def __init__(self, directory: Path, image_name: str):
+        self.path = directory / f"{image_name}.jsonl"
+        self.text_path = directory / f"{image_name}.txt"
+        self.events: List[Dict[str, Any]] = []
+        self.renderer = TextRenderer()
+
+    @staticmethod
+    def read(path: Path) -> List[Dict[str, Any]]:
+        events = []
+        with open(path) as journal:
+            for line in journal:
+                try:
+                    events.append(json.loads(line))
+                except json.JSONDecodeError:
+                    # Last line might be truncated if we were interrupted
+                    continue
+        return events
+
+    def load(self) -> None:
+        # Continue an existing journal, rendering the text report again
+        self.events = self.read(self.path) if self.path.exists() else []
+        self.renderer = TextRenderer()
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        with open(self.text_path, "w") as output:
+            for event in self.events:
+                for line in self.renderer.render(event):
+                    output.write(line + "\n")
+
+    def reset(self) -> None:
+        self.events = []
+        self.renderer = TextRenderer()
+        self.path.unlink(missing_ok=True)
+        self.text_path.unlink(missing_ok=True)
+
+    def has(self, kind: str) -> bool:
+        return any(event["event"] == kind for event in self.events)
+
+    def artifacts(self) -> List[str]:
+        return [event["path"] for event in self.events if event["event"] == "artifact"]
+
+    def append(self, kind: str, **data) -> None:
+        event = {"event": kind, "time": datetime.now().isoformat(), **data}
+        self.events.append(event)
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        with open(self.path, "a") as journal:
+            journal.write(json.dumps(event, default=str) + "\n")
+            journal.flush()
+            os.fsync(journal.fileno())
+        with open(self.text_path, "a") as output:
+            for line in self.renderer.render(event):
+                output.write(line + "\n")
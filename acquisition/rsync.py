@@ -1,9 +1,8 @@
 from datetime import datetime
-from pathlib import Path
-from typing import List
 
 from acquisition.abstract import AcquisitionMethod, Parameters, Report
-from shared.environment import RECOVERY, RSYNC_PATH
+from shared.environment import ENVIRONMENT, RECOVERY
+from shared.progress import VolumeMonitor, rsync_parser
 
 
 class RsyncMethod(AcquisitionMethod):
@@ -14,34 +13,11 @@ class RsyncMethod(AcquisitionMethod):
     def available(self) -> bool:
         return not RECOVERY
 
-    def _compute_exclusions(self, params: Parameters) -> List[Path]:
-        # Rsync can be tricked into acquiring files multiple times by macOS, due
-        # to how it handles mount points inside the APFS container. This method
-        # aims to prevent acquiring duplicates of the same files.
-
-        _, mount_points = self._run_silent(["mount"])
-        lines = mount_points.splitlines()
-
-        source_info = self._gather_path_info(params.source)
-        source_disk = source_info.disk_parent
-
-        results = []
-        for line in lines:
-            if not (line.startswith("/dev/disk") and " on " in line):
-                continue
-            device = line.split(" on ")[0]
-            point = line.split(" on ")[1].split("(")[0].strip()
-            point_path = Path(point)
-            point_disk = self._disk_from_device(device)
-
-            if point_disk == source_disk and params.source in point_path.parents:
-                results.append(point_path)
-
-        return results
-
     def execute(self, params: Parameters) -> Report:
         # Prepare report
         report = self._initialize_report(params)
+        if not report:
+            return Report(params, self)
 
         print("Computing exclusions...")
         exclusions = self._compute_exclusions(params)
@@ -50,21 +26,28 @@ class RsyncMethod(AcquisitionMethod):
         if not temporary_image:
             return report
 
-        print("\nRsync", params.source, "->", temporary_image.mount)
-        source_str = f"{params.source}"
-        if not source_str.endswith("/"):
-            source_str = source_str + "/"
-        command = [RSYNC_PATH, "-xrlptgoEv", "--progress"]
-        for exclusion in exclusions:
-            command.extend(["--exclude", f"{exclusion}/"])
-        command.extend([source_str, temporary_image.mount])
-        status = self._run_status(command)
-
-        # We cannot rely on the exit code, because it will probably contain some
-        # errors if a few files cannot be copied.
-        if status != 0:
-            print(f"Rsync terminated (with status {status})")
-        else:
-            print("Rsync terminated")
+        # When resuming, rsync skips the files that were already copied
+        if not self.checkpoint.done("copy"):
+            print("\nRsync", params.source, "->", temporary_image.mount)
+            source_str = f"{params.source}"
+            if not source_str.endswith("/"):
+                source_str = source_str + "/"
+            command = [ENVIRONMENT.rsync_path, "-xrlptgoEv", "--progress"]
+            for exclusion in exclusions:
+                command.extend(["--exclude", f"{exclusion}/"])
+            command.extend([source_str, temporary_image.mount])
+            # Rsync prints a file count, bytes are measured on the image
+            with self._copy_stage(report), VolumeMonitor(
+                temporary_image.mount, self.progress
+            ):
+                status = self._run_status(command, sinks=[rsync_parser(self.progress)])
+
+            # We cannot rely on the exit code, because it will probably contain
+            # some errors if a few files cannot be copied.
+            if status != 0:
+                print(f"Rsync terminated (with status {status})")
+            else:
+                print("Rsync terminated")
+            self.checkpoint.complete("copy")
 
         return self._pack_and_hash(report)
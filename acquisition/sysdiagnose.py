@@ -1,7 +1,12 @@
+import os
+import shutil
+import threading
 import time
+from concurrent.futures import ThreadPoolExecutor, wait
+from dataclasses import asdict
 from datetime import datetime
 from pathlib import Path
-from typing import Optional
+from typing import List, Optional
 
 from acquisition.abstract import (
     AcquisitionMethod,
@@ -11,12 +16,17 @@ from acquisition.abstract import (
     SparseInfo,
 )
 from shared.environment import RECOVERY
+from shared.gzipwriter import ParallelGzipWriter
+from shared.logindex import build_log_index
+from shared.process import ConsoleSink, run_process
+from shared.unifiedlog import WindowFilter, log_span, plan_windows, window_options
 
 
 class SysdiagnoseMethod(AcquisitionMethod):
     name = "Sysdiagnose and logs"
     description = """System logs and configuration.
-    This only acquires system data and unified logs (converted to JSONL)."""
+    This only acquires system data and unified logs (converted to gzipped JSONL)."""
+    copies_source = False
 
     def available(self) -> bool:
         return not RECOVERY
@@ -28,12 +38,22 @@ class SysdiagnoseMethod(AcquisitionMethod):
         self.temporary_image = info
         return info
 
-    def _convert_logs(self, logarchive: Path, temporary_image: SparseInfo) -> int:
-        print("\nRunning log show on", logarchive)
-
-        output_file = Path(temporary_image.mount) / "unified_logs.jsonl"
+    def _convert_logs(
+        self, report: Report, logarchive: Path, temporary_image: SparseInfo
+    ) -> int:
+        # The archive is split in time windows converted concurrently, since a
+        # single log show process is mostly single threaded
+        windows = plan_windows(log_span(logarchive), min(os.cpu_count() or 1, 8))
+        print(f"\nRunning log show on {logarchive} ({len(windows)} time windows)")
+
+        # Compressed while it is produced, so the plain text never hits the
+        # disk. The ZIP stores it as it is.
+        output_file = Path(temporary_image.mount) / "unified_logs.jsonl.gz"
+        parts = [output_file] + [
+            output_file.with_name(f"{output_file.name}.{index:02}")
+            for index in range(1, len(windows))
+        ]
 
-        # Run log show
         command = [
             "log",
             "show",
@@ -45,13 +65,82 @@ class SysdiagnoseMethod(AcquisitionMethod):
             "--archive",
             f"{logarchive}",
         ]
-        status = self._run_dots(command, redirect=output_file)
 
-        return status
+        sizes = [0] * len(windows)
+        filters: List[Optional[WindowFilter]] = [None] * len(windows)
+        lock = threading.Lock()
+        track = self._track_bytes()
+
+        def convert(index: int) -> int:
+            def progress(amount: int) -> None:
+                with lock:
+                    sizes[index] = amount
+                    track(sum(sizes))
+
+            try:
+                with open(parts[index], "wb") as f:
+                    writer = ParallelGzipWriter(f, workers=2, progress=progress)
+                    try:
+                        filters[index] = WindowFilter(writer, windows[index])
+                        arguments = command + window_options(windows[index])
+                        return run_process(
+                            self._awake(arguments),
+                            sinks=[ConsoleSink()],
+                            output=filters[index],
+                        )
+                    finally:
+                        writer.close()
+            except Exception as e:
+                # Reported like a failure of log show, the other windows go on
+                print(f"\nError while converting the logs: {e}")
+                return 1
+
+        with self._stage(report, "Converting logs"), ThreadPoolExecutor(
+            len(windows)
+        ) as pool:
+            jobs = [pool.submit(convert, index) for index in range(len(windows))]
+            while wait(jobs, timeout=0.5).not_done:
+                print(".", end="")
+            statuses = [job.result() for job in jobs]
+
+            # Concatenated gzip members form a valid gzip file
+            with open(output_file, "ab") as output:
+                for part in parts[1:]:
+                    with open(part, "rb") as f:
+                        shutil.copyfileobj(f, output, 1024 * 1024)
+                    part.unlink()
+
+        # Records of the overlap between windows, converted twice
+        skipped = sum(f.skipped for f in filters if f)
+        self.report_log.append("log_conversion", windows=len(windows), skipped=skipped)
+        return next((status for status in statuses if status != 0), 0)
+
+    def _index_logs(self, report: Report, temporary_image: SparseInfo) -> None:
+        # Optional, the acquisition goes on without the index if it fails
+        mount = Path(temporary_image.mount)
+        source = mount / "unified_logs.jsonl.gz"
+        database = mount / "unified_logs.sqlite"
+        print("\nIndexing", source, "->", database)
+        coffee = self._start_coffee()
+        try:
+            with self._stage(report, "Indexing logs"):
+                stats = build_log_index(source, database, progress=self._track_bytes())
+            self.report_log.append("log_index", path=f"{database}", **asdict(stats))
+            self.checkpoint.complete("log_index")
+            print(f"Indexed {stats.records} records")
+        except Exception as e:
+            # Also corrupted or truncated archives (EOFError, zlib.error)
+            print("Error while indexing the logs!")
+            print(f"{e}")
+            database.unlink(missing_ok=True)
+        finally:
+            coffee.kill()
 
     def execute(self, params: Parameters) -> Report:
         # Prepare report
         report = self._initialize_report(params)
+        if not report:
+            return Report(params, self)
 
         temporary_image = self._create_temporary_image(report)
         if not temporary_image:
@@ -61,41 +150,54 @@ class SysdiagnoseMethod(AcquisitionMethod):
         folder_name = "sysdiagnose_fuji"
         mount_point = self._find_mount_point(params.source)
 
-        print("\nRunning sysdiagnose ->", sysdiagnose_destination)
-        command = [
-            "sysdiagnose",
-            "-f",
-            f"{sysdiagnose_destination}",
-            "-A",
-            f"{folder_name}",
-            "-n",
-            "-u",
-            "-b",
-            "-V",
-            f"{mount_point}",
-        ]
-        status = self._run_status(command)
-
-        if not status == 0:
-            return report
+        if not self.checkpoint.done("sysdiagnose"):
+            print("\nRunning sysdiagnose ->", sysdiagnose_destination)
+            command = [
+                "sysdiagnose",
+                "-f",
+                f"{sysdiagnose_destination}",
+                "-A",
+                f"{folder_name}",
+                "-n",
+                "-u",
+                "-b",
+                "-V",
+                f"{mount_point}",
+            ]
+            with self._stage(report, "Sysdiagnose"):
+                status = self._run_status(command)
+
+            if not status == 0:
+                return report
+            self.checkpoint.complete("sysdiagnose")
 
         logarchive = sysdiagnose_destination / "unified_logs.logarchive"
 
-        print("\nRunning log collect ->", logarchive)
-        command = [
-            "log",
-            "collect",
-            "--output",
-            logarchive.as_posix(),
-        ]
-        status = self._run_status(command)
-
-        if not status == 0:
-            return report
-
-        status = self._convert_logs(logarchive, temporary_image)
-
-        if not status == 0:
-            return report
+        if not self.checkpoint.done("collect"):
+            # A partial archive from an interrupted run cannot be reused
+            shutil.rmtree(logarchive, ignore_errors=True)
+            print("\nRunning log collect ->", logarchive)
+            command = [
+                "log",
+                "collect",
+                "--output",
+                logarchive.as_posix(),
+            ]
+            with self._stage(report, "Collecting logs"):
+                status = self._run_status(command)
+
+            if not status == 0:
+                return report
+            self.checkpoint.complete("collect")
+
+        if not self.checkpoint.done("logs"):
+            status = self._convert_logs(report, logarchive, temporary_image)
+
+            if not status == 0:
+                return report
+            self.checkpoint.complete("logs")
+
+        if params.log_index and not self.checkpoint.done("log_index"):
+            self._index_logs(report, temporary_image)
 
         return self._pack_and_hash(report, format=OutputFormat.ZIP)
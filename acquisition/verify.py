@@ -0,0 +1,210 @@
+import io
+import os
+import time
+import zipfile
+import zlib
+from concurrent.futures import Future, ThreadPoolExecutor
+from dataclasses import dataclass, field
+from pathlib import Path
+from typing import Dict, List, Optional, Sequence
+
+from acquisition.report_log import ReportLog
+from shared.hashing import BLOCK_SIZE, MultiHasher, hash_file
+from shared.segments import SegmentReader
+
+# Verification of the output of an acquisition against the digests in its
+# report. Files are looked up next to the report first, so that copies of the
+# evidence can be verified wherever they are. Segments are hashed in parallel
+# and, for ZIP output, member CRCs are checked by concurrent workers.
+
+
+@dataclass
+class FileVerification:
+    path: Path
+    expected: Dict[str, str]
+    actual: Dict[str, str] = field(default_factory=dict)
+    error: str = ""
+
+    @property
+    def passed(self) -> bool:
+        if self.error:
+            return False
+        expected = self.expected.items()
+        return all(self.actual.get(name) == value for name, value in expected)
+
+
+@dataclass
+class Verification:
+    report: Path
+    files: List[FileVerification] = field(default_factory=list)
+    zip_members: int = 0
+    zip_errors: List[str] = field(default_factory=list)
+    error: str = ""
+    seconds: float = 0.0
+
+    @property
+    def passed(self) -> bool:
+        if self.error or self.zip_errors or not self.files:
+            return False
+        return all(f.passed for f in self.files)
+
+
+def report_journal(path: Path) -> Path:
+    # Accept the directory of the acquisition or its text report as well
+    if path.is_dir():
+        return path / f"{path.name}.jsonl"
+    return path.with_suffix(".jsonl")
+
+
+def _locate(directory: Path, recorded: str) -> Path:
+    candidate = directory / Path(recorded).name
+    if candidate.exists():
+        return candidate
+    return Path(recorded)
+
+
+def _digests(values: Dict) -> Dict[str, str]:
+    return {
+        name: value
+        for name, value in values.items()
+        if name in ("md5", "sha1", "sha256") and value
+    }
+
+
+def _hash(check: FileVerification) -> None:
+    try:
+        check.actual = hash_file(check.path, tuple(check.expected), use_mmap=True)
+    except (OSError, ValueError) as e:
+        check.error = f"{e}"
+
+
+def _hash_stream(check: FileVerification, paths: Sequence[Path]) -> None:
+    # Digests of the concatenation of the segments
+    algorithms = tuple(check.expected)
+    try:
+        with SegmentReader(paths) as reader, MultiHasher(algorithms) as hasher:
+            while True:
+                block = reader.read(BLOCK_SIZE)
+                if not block:
+                    break
+                hasher.update(block)
+            check.actual = hasher.hexdigests()
+    except OSError as e:
+        check.error = f"{e}"
+
+
+def _zip_members(paths: Sequence[Path]) -> List[zipfile.ZipInfo]:
+    with SegmentReader(paths) as raw, zipfile.ZipFile(io.BufferedReader(raw)) as zip:
+        return [info for info in zip.infolist() if not info.is_dir()]
+
+
+def _check_members(paths: Sequence[Path], names: List[str]) -> List[str]:
+    # Reading a member to the end makes zipfile compare its CRC. Every worker
+    # has its own handles, and zlib releases the GIL while decompressing.
+    errors = []
+    with SegmentReader(paths) as raw, zipfile.ZipFile(io.BufferedReader(raw)) as zip:
+        for name in names:
+            try:
+                with zip.open(name) as member:
+                    while member.read(BLOCK_SIZE):
+                        pass
+            except (zipfile.BadZipFile, OSError, zlib.error) as e:
+                errors.append(f"{name}: {e}")
+    return errors
+
+
+def _partition(members: List[zipfile.ZipInfo], count: int) -> List[List[str]]:
+    # Balance the compressed bytes read by every worker
+    groups: List[List[str]] = [[] for _ in range(count)]
+    sizes = [0] * count
+    for info in sorted(members, key=lambda i: i.compress_size, reverse=True):
+        index = sizes.index(min(sizes))
+        groups[index].append(info.filename)
+        sizes[index] = sizes[index] + info.compress_size
+    return [group for group in groups if group]
+
+
+def verify(
+    report: Path,
+    workers: Optional[int] = None,
+    full_stream: bool = False,
+    check_zip: bool = True,
+) -> Verification:
+    journal = report_journal(report)
+    result = Verification(journal)
+    start = time.monotonic()
+    if not journal.exists():
+        result.error = f"Cannot find the report {journal}"
+        return result
+
+    events = ReportLog.read(journal)
+    hashes = next((e for e in events if e["event"] == "hashes"), None)
+    if not hashes:
+        result.error = "The report does not contain any hashes"
+        return result
+    segments = next((e for e in events if e["event"] == "segments"), None)
+
+    directory = journal.parent
+    output = _locate(directory, hashes["path"])
+    paths: List[Path] = []
+    stream: Optional[FileVerification] = None
+    if segments:
+        for segment in segments["segments"]:
+            path = _locate(directory, segment["path"])
+            paths.append(path)
+            result.files.append(FileVerification(path, _digests(segment)))
+        # Matching segments imply a matching stream, which is thus only
+        # hashed again on request
+        if full_stream:
+            stream = FileVerification(output, _digests(hashes))
+            result.files.append(stream)
+    else:
+        paths.append(output)
+        result.files.append(FileVerification(output, _digests(hashes)))
+
+    workers = workers or os.cpu_count() or 4
+    jobs: List[Future] = []
+    crc_jobs: List[Future] = []
+    with ThreadPoolExecutor(workers) as pool:
+        for check in result.files:
+            if check is stream:
+                jobs.append(pool.submit(_hash_stream, check, paths))
+            else:
+                jobs.append(pool.submit(_hash, check))
+
+        if check_zip and output.name.lower().endswith(".zip"):
+            try:
+                members = _zip_members(paths)
+            except (zipfile.BadZipFile, OSError) as e:
+                result.zip_errors.append(f"{e}")
+                members = []
+            result.zip_members = len(members)
+            for names in _partition(members, workers):
+                crc_jobs.append(pool.submit(_check_members, paths, names))
+
+        for job in jobs:
+            job.result()
+        for job in crc_jobs:
+            result.zip_errors.extend(job.result())
+
+    result.seconds = time.monotonic() - start
+    return result
+
+
+def record(verification: Verification) -> None:
+    # Append the outcome to the report of the acquisition
+    journal = verification.report
+    log = ReportLog(journal.parent, journal.stem)
+    log.load()
+    log.append(
+        "verification",
+        passed=verification.passed,
+        error=verification.error,
+        files=[
+            {"path": f"{f.path}", "passed": f.passed, "error": f.error}
+            for f in verification.files
+        ],
+        zip_members=verification.zip_members,
+        zip_errors=verification.zip_errors,
+        seconds=verification.seconds,
+    )
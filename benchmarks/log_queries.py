@@ -0,0 +1,164 @@
+import argparse
+import gzip
+import json
+import random
+import sqlite3
+import sys
+import tempfile
+import time
+from pathlib import Path
+from typing import Callable, List, Tuple
+
+# Query times on the SQLite index of the unified logs, compared with linear
+# scans of the compressed NDJSON (what an analyst does with zcat and grep).
+# Usage:
+#
+#     python -m benchmarks.log_queries [--records 1000000]
+
+REPOSITORY = Path(__file__).absolute().parent.parent
+
+sys.path.insert(0, f"{REPOSITORY}")
+
+from shared.gzipwriter import ParallelGzipWriter  # noqa: E402
+from shared.logindex import build_log_index  # noqa: E402
+from shared.unifiedlog import parse_time  # noqa: E402
+
+START = 1700000000.0
+WORDS = (
+    "connection request failed completed sending received service daemon "
+    "invalid token session activity state changed timer fired power network "
+    "interface bluetooth wifi update check policy process launch exit signal"
+).split()
+PROCESSES = [f"process{index}" for index in range(200)]
+SUBSYSTEMS = [f"com.example.subsystem{index}" for index in range(60)]
+# Rare word, searched in the messages
+NEEDLE = "quarantined"
+
+
+def generate(path: Path, records: int) -> None:
+    rng = random.Random(0)
+    with open(path, "wb") as f, ParallelGzipWriter(f) as writer:
+        lines = []
+        for index in range(records):
+            words = rng.choices(WORDS, k=rng.randint(4, 14))
+            if rng.random() < 0.001:
+                words.insert(rng.randrange(len(words)), NEEDLE)
+            moment = time.gmtime(START + index / 100)
+            stamp = time.strftime("%Y-%m-%d %H:%M:%S", moment)
+            record = {
+                "timestamp": f"{stamp}.{index % 100:02}0000+0000",
+                "messageType": rng.choice(["Default", "Info", "Debug", "Error"]),
+                "eventMessage": " ".join(words),
+                "processImagePath": f"/usr/libexec/{rng.choice(PROCESSES)}",
+                "processID": rng.randint(100, 5000),
+                "subsystem": rng.choice(SUBSYSTEMS),
+                "category": rng.choice(["default", "connection", "state"]),
+            }
+            lines.append(json.dumps(record) + "\n")
+            if len(lines) == 10000:
+                writer.write("".join(lines).encode())
+                lines = []
+        writer.write("".join(lines).encode())
+
+
+def _records(path: Path):
+    with gzip.open(path, "rb") as source:
+        for line in source:
+            yield line
+
+
+def scan_time(path: Path, start: float, end: float) -> int:
+    count = 0
+    for line in _records(path):
+        moment = parse_time(json.loads(line)["timestamp"])
+        if moment is not None and start <= moment < end:
+            count = count + 1
+    return count
+
+
+def scan_process(path: Path, process: str) -> int:
+    suffix = f"/{process}"
+    count = 0
+    for line in _records(path):
+        if json.loads(line).get("processImagePath", "").endswith(suffix):
+            count = count + 1
+    return count
+
+
+def scan_text(path: Path, word: str) -> int:
+    # Like grep, without decoding JSON
+    needle = word.encode()
+    return sum(1 for line in _records(path) if needle in line)
+
+
+def _timed(function: Callable[[], int]) -> Tuple[float, int]:
+    start = time.monotonic()
+    result = function()
+    return time.monotonic() - start, result
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description="Benchmark the unified log index")
+    parser.add_argument("--records", type=int, default=1000000)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory(prefix="fuji-logs-") as directory:
+        source = Path(directory) / "unified_logs.jsonl.gz"
+        database = Path(directory) / "unified_logs.sqlite"
+        print(f"Generating {args.records} records...")
+        generate(source, args.records)
+
+        seconds, _ = _timed(lambda: build_log_index(source, database).records)
+        size = database.stat().st_size / 1024**2
+        compressed = source.stat().st_size / 1024**2
+        print(f"Index built in {seconds:.2f} s ({size:.1f} MiB, logs {compressed:.1f})")
+
+        # One percent of the time span, in the middle
+        span = args.records / 100
+        start, end = START + span * 0.5, START + span * 0.51
+        connection = sqlite3.connect(database)
+        queries: List[Tuple[str, Callable[[], int], Callable[[], int]]] = [
+            (
+                "time range",
+                lambda: connection.execute(
+                    "SELECT COUNT(*) FROM records "
+                    "WHERE timestamp >= ? AND timestamp < ?",
+                    (start, end),
+                ).fetchone()[0],
+                lambda: scan_time(source, start, end),
+            ),
+            (
+                "process",
+                lambda: connection.execute(
+                    "SELECT COUNT(*) FROM logs WHERE process = ?", (PROCESSES[7],)
+                ).fetchone()[0],
+                lambda: scan_process(source, PROCESSES[7]),
+            ),
+            (
+                "message word",
+                lambda: connection.execute(
+                    "SELECT COUNT(*) FROM messages WHERE messages MATCH ?", (NEEDLE,)
+                ).fetchone()[0],
+                lambda: scan_text(source, NEEDLE),
+            ),
+        ]
+
+        failed = False
+        for name, indexed, linear in queries:
+            index_seconds, index_count = _timed(indexed)
+            scan_seconds, scan_count = _timed(linear)
+            speedup = scan_seconds / index_seconds if index_seconds else float("inf")
+            print(
+                f"{name:<14} index {index_seconds * 1000:9.2f} ms, "
+                f"scan {scan_seconds * 1000:9.1f} ms ({speedup:,.0f}x), "
+                f"{index_count} records"
+            )
+            if index_count != scan_count:
+                print(f"    mismatch: the scan found {scan_count} records")
+                failed = True
+        connection.close()
+    return 1 if failed else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
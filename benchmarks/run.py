@@ -0,0 +1,309 @@
+import argparse
+import json
+import os
+import resource
+import shutil
+import subprocess
+import sys
+import tempfile
+import time
+from contextlib import contextmanager
+from functools import partialmethod
+from pathlib import Path
+from typing import Callable, Dict, Iterator, List
+
+# Benchmark of the acquisition methods, running on any POSIX system thanks to
+# the stand-ins in benchmarks/tools.py. Every run happens in a separate process
+# so that the peak memory usage can be measured. Usage:
+#
+#     python -m benchmarks.run [--methods Rsync Native] [--scale 0.5]
+#     python -m benchmarks.run --save-baseline
+#
+# Timings depend on the machine, so no baseline is shipped. Without one, the
+# results are only printed. --save-baseline stores them in baseline.json, next
+# to this file, and later runs exit with an error on regressions.
+#
+# The ZIP entry is not a method: it packs the source tree with ZipWriter and,
+# for reference, with shutil.make_archive.
+#
+# The system tools (rsync, ditto, asr, hdiutil...) are replaced by Python
+# stand-ins, so stages like "Copying" and "Converting" measure the stand-ins,
+# not the real tools. The code of Fuji around them is measured as it is.
+
+REPOSITORY = Path(__file__).absolute().parent.parent
+BASELINE_PATH = Path(__file__).absolute().parent / "baseline.json"
+
+sys.path.insert(0, f"{REPOSITORY}")
+
+from benchmarks import tools  # noqa: E402
+from benchmarks.trees import SCENARIOS, tree_size  # noqa: E402
+
+METHOD_NAMES = ["Rsync", "Ditto", "Native", "ASR", "Sysdiagnose", "ZIP"]
+# Sysdiagnose does not read the source tree
+LOG_SCENARIO = "logs"
+
+# Stages shorter than this are too noisy to be compared
+MIN_STAGE_SECONDS = 0.5
+
+
+def _method(name: str):
+    # Imported late, after the environment for the stand-ins is ready
+    from acquisition.abstract import AcquisitionMethod
+    from acquisition.asr import AsrMethod
+    from acquisition.ditto import DittoMethod
+    from acquisition.native import NativeMethod
+    from acquisition.rsync import RsyncMethod
+    from acquisition.sysdiagnose import SysdiagnoseMethod
+
+    methods: Dict[str, Callable[[], AcquisitionMethod]] = {
+        "Rsync": RsyncMethod,
+        "Ditto": DittoMethod,
+        "Native": NativeMethod,
+        "ASR": AsrMethod,
+        "Sysdiagnose": SysdiagnoseMethod,
+    }
+    return methods[name]()
+
+
+def _peak_rss() -> int:
+    # Kilobytes on Linux, bytes on macOS
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    if sys.platform == "darwin":
+        peak = peak // 1024
+    return peak
+
+
+@contextmanager
+def _stand_ins() -> Iterator[None]:
+    # Adapt Fuji to the stand-ins for the duration of a run
+    from acquisition.abstract import AcquisitionMethod
+    from shared.environment import ENVIRONMENT
+
+    detach = AcquisitionMethod._detach_sparse_image
+    rsync_path = ENVIRONMENT.__dict__.get("rsync_path")
+    # No need to wait for Spotlight and friends before detaching
+    AcquisitionMethod._detach_sparse_image = partialmethod(  # type: ignore
+        detach, delay=0, interval=0.1
+    )
+    # The stand-in on PATH, instead of /usr/bin/rsync
+    ENVIRONMENT.__dict__["rsync_path"] = shutil.which("rsync")
+    try:
+        yield
+    finally:
+        AcquisitionMethod._detach_sparse_image = detach  # type: ignore
+        ENVIRONMENT.__dict__.pop("rsync_path", None)
+        if rsync_path is not None:
+            ENVIRONMENT.__dict__["rsync_path"] = rsync_path
+
+
+def zip_worker(source: Path, root: Path) -> Dict:
+    from shared.compression import CompressionPolicy
+    from shared.zipwriter import ZipWriter
+
+    root.mkdir(parents=True, exist_ok=True)
+    size = tree_size(source)
+    stages: Dict[str, Dict[str, float]] = {}
+
+    start = time.monotonic()
+    with open(root / "zipwriter.zip", "wb") as output, ZipWriter(
+        output, policy=CompressionPolicy()
+    ) as writer:
+        writer.write_tree(source)
+    stages["ZipWriter"] = {"seconds": time.monotonic() - start, "bytes": size}
+
+    start = time.monotonic()
+    shutil.make_archive(f"{root / 'reference'}", "zip", source)
+    stages["make_archive"] = {"seconds": time.monotonic() - start, "bytes": size}
+
+    return {
+        "success": True,
+        "seconds": stages["ZipWriter"]["seconds"],
+        "stages": stages,
+    }
+
+
+def run_worker(method_name: str, source: Path, root: Path, result_path: Path) -> None:
+    if method_name == "ZIP":
+        result = zip_worker(source, root / "output")
+        result["peak_rss_kb"] = _peak_rss()
+        result_path.write_text(json.dumps(result))
+        return
+
+    from acquisition.abstract import Parameters
+
+    method = _method(method_name)
+    params = Parameters(
+        case="Benchmark",
+        image_name=f"{method_name}_Benchmark",
+        source=source,
+        tmp=root / "tmp",
+        destination=root / "output",
+        sound=False,
+    )
+    start = time.monotonic()
+    with _stand_ins():
+        report = method.execute(params)
+    total = time.monotonic() - start
+
+    stages: Dict[str, Dict[str, float]] = {}
+    for stage in report.stages:
+        # Some stages (e.g. detaching) happen more than once
+        entry = stages.setdefault(stage.name, {"seconds": 0.0, "bytes": 0})
+        entry["seconds"] = entry["seconds"] + stage.seconds
+        entry["bytes"] = entry["bytes"] + stage.bytes
+
+    result = {
+        "success": report.success,
+        "seconds": total,
+        "stages": stages,
+        "peak_rss_kb": _peak_rss(),
+    }
+    result_path.write_text(json.dumps(result))
+
+
+def run_benchmark(method_name: str, scenario: str, source: Path, verbose: bool) -> Dict:
+    with tempfile.TemporaryDirectory(prefix="fuji-run-") as directory:
+        root = Path(directory)
+        binaries = root / "bin"
+        tools.install(binaries)
+        environment = dict(os.environ)
+        environment["PATH"] = f"{binaries}{os.pathsep}{environment['PATH']}"
+        environment["FUJI_BENCH_ROOT"] = f"{root}"
+
+        result_path = root / "result.json"
+        command = [
+            sys.executable,
+            "-m",
+            "benchmarks.run",
+            "--worker",
+            method_name,
+            f"{source}",
+            f"{root}",
+            f"{result_path}",
+        ]
+        output = None if verbose else subprocess.DEVNULL
+        subprocess.run(
+            command,
+            cwd=REPOSITORY,
+            env=environment,
+            stdout=output,
+            stderr=output,
+            check=True,
+        )
+        result = json.loads(result_path.read_text())
+
+    size = tree_size(source) if scenario != LOG_SCENARIO else 0
+    result["source_bytes"] = size
+    result["throughput"] = size / result["seconds"] if result["seconds"] else 0
+    return result
+
+
+def compare(results: Dict[str, Dict], baseline: Dict[str, Dict], threshold: float):
+    regressions: List[str] = []
+    for key, result in results.items():
+        reference = baseline.get(key)
+        if not reference:
+            print(f"{key}: no baseline")
+            continue
+
+        checks = [("total time", result["seconds"], reference["seconds"])]
+        for name, stage in result["stages"].items():
+            previous = reference["stages"].get(name)
+            if previous and previous["seconds"] >= MIN_STAGE_SECONDS:
+                checks.append((name, stage["seconds"], previous["seconds"]))
+        checks.append(("peak RSS", result["peak_rss_kb"], reference["peak_rss_kb"]))
+
+        for label, current, previous in checks:
+            if previous and current > previous * (1 + threshold):
+                change = 100 * (current / previous - 1)
+                regressions.append(f"{key}: {label} is {change:.0f}% worse")
+    return regressions
+
+
+def print_result(key: str, result: Dict) -> None:
+    status = "ok" if result["success"] else "FAILED"
+    throughput = result["throughput"] / 1024**2
+    print(
+        f"{key}: {result['seconds']:.2f} s, {throughput:.1f} MiB/s, "
+        f"peak RSS {result['peak_rss_kb'] / 1024:.0f} MiB ({status})"
+    )
+    for name, stage in result["stages"].items():
+        rate = stage["bytes"] / stage["seconds"] / 1024**2 if stage["seconds"] else 0
+        print(f"    {name:<16} {stage['seconds']:8.2f} s {rate:10.1f} MiB/s")
+
+
+def main() -> int:
+    if len(sys.argv) > 1 and sys.argv[1] == "--worker":
+        method_name, source, root, result_path = sys.argv[2:6]
+        run_worker(method_name, Path(source), Path(root), Path(result_path))
+        return 0
+
+    parser = argparse.ArgumentParser(description="Benchmark the acquisition methods")
+    parser.add_argument("--methods", nargs="+", default=METHOD_NAMES)
+    parser.add_argument("--scenarios", nargs="+", default=list(SCENARIOS))
+    parser.add_argument(
+        "--scale", type=float, default=1.0, help="size of the synthetic trees"
+    )
+    parser.add_argument("--baseline", type=Path, default=BASELINE_PATH)
+    parser.add_argument(
+        "--save-baseline", action="store_true", help="store results as baseline"
+    )
+    parser.add_argument(
+        "--threshold", type=float, default=0.25, help="tolerated slowdown"
+    )
+    parser.add_argument("--verbose", action="store_true", help="show tool output")
+    args = parser.parse_args()
+
+    print("System tools are replaced by stand-ins, see benchmarks/tools.py")
+    results: Dict[str, Dict] = {}
+    with tempfile.TemporaryDirectory(prefix="fuji-trees-") as directory:
+        for scenario in args.scenarios:
+            source = Path(directory) / scenario
+            print(f"Generating {scenario}...")
+            SCENARIOS[scenario](source, args.scale)
+            for method_name in args.methods:
+                if method_name == "Sysdiagnose":
+                    continue
+                key = f"{method_name}/{scenario}"
+                results[key] = run_benchmark(
+                    method_name, scenario, source, args.verbose
+                )
+                print_result(key, results[key])
+            shutil.rmtree(source)
+
+        if "Sysdiagnose" in args.methods:
+            key = f"Sysdiagnose/{LOG_SCENARIO}"
+            results[key] = run_benchmark(
+                "Sysdiagnose", LOG_SCENARIO, Path(directory), args.verbose
+            )
+            print_result(key, results[key])
+
+    failed = [key for key, result in results.items() if not result["success"]]
+    for key in failed:
+        print(f"{key}: acquisition failed")
+
+    if args.save_baseline:
+        baseline = {}
+        if args.baseline.exists():
+            baseline = json.loads(args.baseline.read_text())
+        baseline.update(results)
+        args.baseline.write_text(json.dumps(baseline, indent=2, sort_keys=True))
+        print(f"Baseline saved to {args.baseline}")
+        return 1 if failed else 0
+
+    if not args.baseline.exists():
+        # Not an error: the first run on a machine has nothing to compare
+        print("No baseline to compare against, run with --save-baseline first")
+        return 1 if failed else 0
+
+    baseline = json.loads(args.baseline.read_text())
+    regressions = compare(results, baseline, args.threshold)
+    for regression in regressions:
+        print(regression)
+    if not regressions:
+        print("No performance regressions")
+    return 1 if failed or regressions else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
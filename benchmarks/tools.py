@@ -0,0 +1,446 @@
+import json
+import os
+import random
+import shutil
+import stat
+import sys
+import tarfile
+import time
+import uuid
+from datetime import datetime
+from pathlib import Path
+from typing import Callable, Dict, List, Optional, Tuple
+
+# Stand-ins for the macOS executables used by the acquisition methods. Each
+# tool is installed as a small wrapper script calling this file with its own
+# name. Images are plain directories under FUJI_BENCH_ROOT, which are moved to
+# a "Volumes" directory when attached.
+
+TOOLS = [
+    "asr",
+    "caffeinate",
+    "diskutil",
+    "ditto",
+    "hdiutil",
+    "log",
+    "mount",
+    "rsync",
+    "sysdiagnose",
+    "system_profiler",
+]
+
+# Options of the emulated tools which are followed by a value
+VALUE_OPTIONS = {
+    "-A",
+    "-V",
+    "-f",
+    "-format",
+    "-fs",
+    "-o",
+    "-sectors",
+    "-srcfolder",
+    "-t",
+    "-volname",
+    "--archive",
+    "--end",
+    "--exclude",
+    "--output",
+    "--source",
+    "--start",
+    "--style",
+    "--target",
+}
+
+ROOT_DEVICE = "/dev/disk1s1"
+
+
+def install(directory: Path) -> None:
+    # Write one wrapper per tool, to be placed first in PATH
+    directory.mkdir(parents=True, exist_ok=True)
+    script = Path(__file__).absolute()
+    for tool in TOOLS:
+        wrapper = directory / tool
+        wrapper.write_text(
+            f'#!/bin/sh\nexec "{sys.executable}" "{script}" {tool} "$@"\n'
+        )
+        wrapper.chmod(wrapper.stat().st_mode | stat.S_IXUSR | stat.S_IXGRP)
+
+
+def _root() -> Path:
+    return Path(os.environ["FUJI_BENCH_ROOT"])
+
+
+def _load_state() -> Dict:
+    path = _root() / "state.json"
+    if not path.exists():
+        return {"next_disk": 10, "attached": {}}
+    return json.loads(path.read_text())
+
+
+def _save_state(state: Dict) -> None:
+    path = _root() / "state.json"
+    temporary = path.with_suffix(".tmp")
+    temporary.write_text(json.dumps(state))
+    os.replace(temporary, path)
+
+
+def _parse(arguments: List[str]) -> Tuple[List[str], Dict[str, List[str]]]:
+    positional: List[str] = []
+    options: Dict[str, List[str]] = {}
+    iterator = iter(arguments)
+    for argument in iterator:
+        if argument in VALUE_OPTIONS:
+            options.setdefault(argument, []).append(next(iterator, ""))
+        elif argument.startswith("-") and len(argument) > 1:
+            options.setdefault(argument, []).append("")
+        else:
+            positional.append(argument)
+    return positional, options
+
+
+def _copy_tree(
+    source: str,
+    destination: str,
+    on_file: Callable[[str, int], None],
+    exclusions: Tuple[str, ...] = (),
+) -> None:
+    # Plain copy preserving symlinks and metadata, reporting every file
+    os.makedirs(destination, exist_ok=True)
+    for directory, folders, files in os.walk(source):
+        folders[:] = [
+            f for f in folders if os.path.join(directory, f) not in exclusions
+        ]
+        relative = os.path.relpath(directory, source)
+        target = os.path.normpath(os.path.join(destination, relative))
+        os.makedirs(target, exist_ok=True)
+        for name in folders + files:
+            path = os.path.join(directory, name)
+            if os.path.islink(path):
+                link = os.path.join(target, name)
+                if os.path.lexists(link):
+                    os.unlink(link)
+                os.symlink(os.readlink(path), link)
+        for name in files:
+            path = os.path.join(directory, name)
+            if os.path.islink(path):
+                continue
+            try:
+                shutil.copy2(path, os.path.join(target, name))
+                on_file(os.path.join(relative, name), os.path.getsize(path))
+            except OSError as e:
+                print(f"Cannot copy {path}: {e}", file=sys.stderr)
+
+
+def _tree_size(path: str) -> Tuple[int, int]:
+    files = size = 0
+    for directory, _, names in os.walk(path):
+        for name in names:
+            full = os.path.join(directory, name)
+            if not os.path.islink(full):
+                files = files + 1
+                size = size + os.path.getsize(full)
+    return files, size
+
+
+def _find_attached(state: Dict, device: str) -> Optional[Dict]:
+    for volume, image in state["attached"].items():
+        if device in (volume, image["container"]):
+            return image
+    return None
+
+
+def hdiutil(arguments: List[str]) -> int:
+    command = arguments[0] if arguments else ""
+    positional, options = _parse(arguments[1:])
+    state = _load_state()
+
+    if command == "create" and "-srcfolder" in options:
+        # Image of an existing folder, written like the output of convert
+        output = Path(positional[0])
+        source = options["-srcfolder"][0]
+        with tarfile.open(output, "w:gz", compresslevel=1) as archive:
+            archive.add(source, os.path.basename(source))
+        print(f"created: {output}")
+        return 0
+
+    if command == "create":
+        image = Path(positional[0])
+        data = _root() / "data" / uuid.uuid4().hex
+        data.mkdir(parents=True)
+        volname = options.get("-volname", ["untitled"])[0]
+        image.write_text(json.dumps({"volname": volname, "data": f"{data}"}))
+        print(f"created: {image}")
+        return 0
+
+    if command == "attach":
+        image = Path(positional[0])
+        info = json.loads(image.read_text())
+        disk = state["next_disk"]
+        state["next_disk"] = disk + 1
+
+        volumes = _root() / "Volumes"
+        volumes.mkdir(exist_ok=True)
+        mount = volumes / info["volname"]
+        counter = 1
+        while mount.exists():
+            mount = volumes / f"{info['volname']} {counter}"
+            counter = counter + 1
+        os.rename(info["data"], mount)
+
+        container = f"/dev/disk{disk}"
+        volume = f"{container}s1"
+        state["attached"][volume] = {
+            "container": container,
+            "mount": f"{mount}",
+            "data": info["data"],
+        }
+        _save_state(state)
+        print(f"{container:<20}\tGUID_partition_scheme          \t")
+        print(f"{volume:<20}\tApple_HFS                      \t{mount}")
+        return 0
+
+    if command == "detach":
+        device = positional[0]
+        attached = _find_attached(state, device)
+        if attached is None:
+            print("hdiutil: detach failed - No such file or directory")
+            return 1
+        os.rename(attached["mount"], attached["data"])
+        state["attached"] = {
+            volume: image
+            for volume, image in state["attached"].items()
+            if image is not attached
+        }
+        _save_state(state)
+        print(f'"{device}" ejected.')
+        return 0
+
+    if command == "convert":
+        image = Path(positional[0])
+        output = Path(options["-o"][0])
+        info = json.loads(image.read_text())
+        source = info["data"]
+        for attached in state["attached"].values():
+            if attached["data"] == source:
+                source = attached["mount"]
+
+        # Compressed like UDZO, although the format is a tar stream
+        puppet = "-puppetstrings" in options
+        _, total = _tree_size(source)
+        done = 0
+        last = -1
+        with tarfile.open(output, "w:gz", compresslevel=1) as archive:
+            for directory, _, names in os.walk(source):
+                for name in sorted(names):
+                    path = os.path.join(directory, name)
+                    archive.add(path, os.path.relpath(path, source))
+                    if not os.path.islink(path):
+                        done = done + os.path.getsize(path)
+                    percent = 100 * done // total if total else 100
+                    if puppet and percent > last:
+                        print(f"PERCENT:{percent}", flush=True)
+                        last = percent
+        print(f"created: {output}")
+        return 0
+
+    print(f"hdiutil: unsupported command {command}", file=sys.stderr)
+    return 1
+
+
+def diskutil(arguments: List[str]) -> int:
+    if arguments[:1] != ["info"]:
+        return 1
+    path = arguments[1]
+    state = _load_state()
+    device = ROOT_DEVICE
+    for volume, image in state["attached"].items():
+        if image["mount"] == path:
+            device = volume
+    print(f"   Device Identifier:         {device[5:]}")
+    print(f"   Device Node:               {device}")
+    print("   Volume Name:               Benchmark")
+    print(f"   Mount Point:               {path}")
+    print("   Type (Bundle):             apfs")
+    print("   Name (User Visible):       APFS")
+    return 0
+
+
+def mount(arguments: List[str]) -> int:
+    print(f"{ROOT_DEVICE} on / (apfs, local, journaled)")
+    state = _load_state()
+    for volume, image in state["attached"].items():
+        print(f"{volume} on {image['mount']} (hfs, local, nodev, nosuid)")
+    return 0
+
+
+def system_profiler(arguments: List[str]) -> int:
+    print("Software:\n\n    System Software Overview:\n")
+    print("      System Version: macOS (benchmark)")
+    print("      Kernel Version: Darwin")
+    print("\nHardware:\n\n    Hardware Overview:\n")
+    print("      Model Name: Benchmark")
+    print(f"      Total Number of Cores: {os.cpu_count()}")
+    return 0
+
+
+def caffeinate(arguments: List[str]) -> int:
+    positional, options = _parse(arguments)
+    if positional:
+        # Remaining arguments are the command to keep awake
+        index = arguments.index(positional[0])
+        os.execvp(arguments[index], arguments[index:])
+    time.sleep(float(options.get("-t", ["86400"])[0]))
+    return 0
+
+
+def rsync(arguments: List[str]) -> int:
+    positional, options = _parse(arguments)
+    source, destination = positional[-2:]
+    exclusions = tuple(e.rstrip("/") for e in options.get("--exclude", []))
+    total, _ = _tree_size(source)
+    copied = 0
+
+    def on_file(relative: str, size: int) -> None:
+        nonlocal copied
+        copied = copied + 1
+        print(relative)
+        print(
+            f"{size:>15,} 100%  100.00MB/s    0:00:00 "
+            f"(xfr#{copied}, to-check={max(total - copied, 0)}/{total})"
+        )
+
+    print("building file list ... done")
+    _copy_tree(source, destination, on_file, exclusions)
+    return 0
+
+
+def ditto(arguments: List[str]) -> int:
+    source, destination = arguments[-2:]
+    _copy_tree(
+        source,
+        destination,
+        lambda relative, size: print(f"Copying {os.path.join(source, relative)}"),
+    )
+    return 0
+
+
+def asr(arguments: List[str]) -> int:
+    _, options = _parse(arguments[1:])
+    source = options["--source"][0]
+    state = _load_state()
+    target = _find_attached(state, options["--target"][0])
+    if target is None:
+        print("Could not find target")
+        return 1
+
+    print("Validating target...done")
+    print("Validating source...done")
+    mount = target["mount"]
+    for name in os.listdir(mount):
+        path = os.path.join(mount, name)
+        if os.path.isdir(path) and not os.path.islink(path):
+            shutil.rmtree(path)
+        else:
+            os.unlink(path)
+
+    _, total = _tree_size(source)
+    done = 0
+    last = 0
+
+    def on_file(relative: str, size: int) -> None:
+        nonlocal done, last
+        done = done + size
+        percent = 100 * done // total if total else 100
+        while last + 10 <= percent:
+            last = last + 10
+            print(f"....{last}", end="", flush=True)
+
+    print("Restoring  ", end="")
+    _copy_tree(source, mount, on_file)
+    while last < 100:
+        last = last + 10
+        print(f"....{last}", end="")
+    print("\nVerifying  ....10....20....30....40....50....60....70....80....90....100")
+    print(f"Restored target device is {options['--target'][0]}.")
+    return 0
+
+
+def _write_files(directory: Path, count: int, size: int) -> None:
+    directory.mkdir(parents=True, exist_ok=True)
+    rng = random.Random(count)
+    for index in range(count):
+        text = "".join(rng.choice("abcdef0123456789\n") for _ in range(256))
+        with open(directory / f"file_{index:04}.log", "w") as output:
+            for _ in range(size // len(text)):
+                output.write(text)
+
+
+def sysdiagnose(arguments: List[str]) -> int:
+    _, options = _parse(arguments)
+    destination = Path(options["-f"][0]) / options["-A"][0]
+    _write_files(destination, 50, 256 * 1024)
+    print(f"Sysdiagnose written to {destination}")
+    return 0
+
+
+def _parse_time(text: str) -> float:
+    moment = datetime.strptime(text, "%Y-%m-%d %H:%M:%S%z")
+    return moment.timestamp()
+
+
+def log(arguments: List[str]) -> int:
+    command = arguments[0] if arguments else ""
+    _, options = _parse(arguments[1:])
+
+    if command == "collect":
+        archive = Path(options["--output"][0])
+        _write_files(archive / "Persist", 20, 1024 * 1024)
+        (archive / "Info.plist").write_text("<plist></plist>\n")
+        print(f"Archive successfully written to {archive}")
+        return 0
+
+    # Synthetic archive with 100 records per second
+    lines = int(os.environ.get("FUJI_BENCH_LOG_LINES", "200000"))
+    start = 1700000000.0
+
+    if command == "stats":
+        for name, moment in (("start", start), ("end", start + lines / 100)):
+            text = time.strftime("%Y-%m-%d %H:%M:%S", time.gmtime(moment))
+            print(f"{name}: {text}.000000+0000")
+        return 0
+
+    if command == "show":
+        # Inclusive bounds with a precision of one second, like log show
+        first, last = 0, lines
+        if "--start" in options:
+            begin = _parse_time(options["--start"][0])
+            first = max(int((begin - start) * 100), 0)
+        if "--end" in options:
+            end = _parse_time(options["--end"][0]) + 1
+            last = min(max(int((end - start) * 100), 0), lines)
+        output = sys.stdout
+        for index in range(first, last):
+            stamp = time.strftime("%Y-%m-%d %H:%M:%S", time.gmtime(start + index / 100))
+            record = {
+                "timestamp": f"{stamp}.{index % 100:02}0000+0000",
+                "messageType": "Default",
+                "eventMessage": f"Benchmark message {index} for subsystem",
+                "processImagePath": f"/usr/libexec/benchmarkd{index % 50}",
+                "processID": 100 + index % 50,
+                "subsystem": "com.example.benchmark",
+                "category": f"category{index % 7}",
+            }
+            output.write(json.dumps(record) + "\n")
+        output.flush()
+        return 0
+
+    return 1
+
+
+def main() -> int:
+    tool, arguments = sys.argv[1], sys.argv[2:]
+    return globals()[tool](arguments)
+
+
+if __name__ == "__main__":
+    sys.exit(main())
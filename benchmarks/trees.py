@@ -0,0 +1,77 @@
+import os
+import random
+from pathlib import Path
+from typing import Callable, Dict
+
+# Synthetic source trees. Contents are deterministic and about half
+# compressible, so that conversion and ZIP stages do realistic work.
+
+BLOCK_SIZE = 64 * 1024
+
+
+def _blocks(seed: int):
+    rng = random.Random(seed)
+    noise = rng.randbytes(BLOCK_SIZE // 2)
+    pattern = bytes(range(256)) * (BLOCK_SIZE // 512)
+    while True:
+        # Rotate the noise so that blocks are not trivially deduplicated
+        offset = rng.randrange(len(noise))
+        yield noise[offset:] + noise[:offset] + pattern
+
+
+def _write_file(path: Path, size: int, seed: int) -> None:
+    blocks = _blocks(seed)
+    with open(path, "wb") as output:
+        remaining = size
+        while remaining > 0:
+            block = next(blocks)[:remaining]
+            output.write(block)
+            remaining = remaining - len(block)
+
+
+def small_files(root: Path, scale: float) -> None:
+    # Many small files spread over a few hundred directories
+    count = int(20000 * scale)
+    for index in range(count):
+        directory = root / f"dir_{index % 200:03}"
+        directory.mkdir(parents=True, exist_ok=True)
+        _write_file(directory / f"file_{index:06}.dat", 1024 + index % 8192, index)
+
+
+def large_files(root: Path, scale: float) -> None:
+    # A few files large enough to be split in many chunks
+    size = int(256 * 1024 * 1024 * scale)
+    root.mkdir(parents=True, exist_ok=True)
+    for index in range(4):
+        _write_file(root / f"large_{index}.bin", size, index)
+
+
+def deep_nesting(root: Path, scale: float) -> None:
+    # Long chains of directories with a few files and symlinks at each level
+    branches = max(int(20 * scale), 1)
+    for branch in range(branches):
+        directory = root / f"branch_{branch:02}"
+        for level in range(48):
+            directory = directory / f"level_{level:02}"
+            directory.mkdir(parents=True, exist_ok=True)
+            for index in range(3):
+                seed = branch * 1000 + level * 10 + index
+                _write_file(directory / f"file_{index}.txt", 4096, seed)
+            os.symlink("file_0.txt", directory / "link.txt")
+
+
+SCENARIOS: Dict[str, Callable[[Path, float], None]] = {
+    "small_files": small_files,
+    "large_files": large_files,
+    "deep_nesting": deep_nesting,
+}
+
+
+def tree_size(root: Path) -> int:
+    total = 0
+    for directory, _, names in os.walk(root):
+        for name in names:
+            path = os.path.join(directory, name)
+            if not os.path.islink(path):
+                total = total + os.path.getsize(path)
+    return total
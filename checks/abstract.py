@@ -1,7 +1,8 @@
 from abc import ABC, abstractmethod
 from dataclasses import dataclass
+from typing import Tuple
 
-from acquisition.abstract import Parameters
+from acquisition.abstract import AcquisitionMethod, Parameters
 
 
 @dataclass
@@ -18,7 +19,13 @@ class CheckResult:
 
 class Check(ABC):
     name = "Abstract check"
+    # Fields of the parameters which affect the result
+    depends_on: Tuple[str, ...] = ()
+    # Seconds before the check is given up
+    timeout: float = 10
+    # Seconds for which a result can be reused
+    max_age: float = 60
 
     @abstractmethod
-    def execute(self, params: Parameters) -> CheckResult:
+    def execute(self, params: Parameters, method: AcquisitionMethod) -> CheckResult:
         pass
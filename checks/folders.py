@@ -1,13 +1,18 @@
 import os
 
-from acquisition.abstract import Parameters
+from acquisition.abstract import AcquisitionMethod, Parameters
+from acquisition.checkpoint import Checkpoint
 from checks.abstract import Check, CheckResult
 
 
 class FoldersCheck(Check):
     name = "Folders check"
+    depends_on = ("source", "tmp", "destination", "image_name")
+    # Going back and forth between the windows should not list the folders
+    # again. Acquisitions clear the cached results, since they change them.
+    max_age = 30
 
-    def execute(self, params: Parameters) -> CheckResult:
+    def execute(self, params: Parameters, method: AcquisitionMethod) -> CheckResult:
         result = CheckResult(passed=True)
 
         source_is_directory = os.path.isdir(params.source)
@@ -25,6 +30,16 @@ class FoldersCheck(Check):
         destination_path = params.destination / params.image_name
         destination_busy = os.path.exists(destination_path)
 
+        # Leftovers of an interrupted acquisition are reused when resuming,
+        # but only by an acquisition of the same source with the same method
+        checkpoint_path = Checkpoint.location(params.destination, params.image_name)
+        resumable = os.path.exists(checkpoint_path) and Checkpoint(
+            checkpoint_path
+        ).matches(method.name, params.source)
+        if resumable:
+            tmp_busy = False
+            destination_busy = False
+
         if not same_path:
             if not tmp_is_directory:
                 result.write("Temporary files location is not a directory!")
@@ -43,6 +58,8 @@ class FoldersCheck(Check):
         elif destination_busy:
             result.write(f"Destination already contains {params.image_name}!")
             result.passed = False
+        elif resumable:
+            result.write("Destination contains an interrupted acquisition to resume")
         else:
             result.write("Destination is a valid directory")
 
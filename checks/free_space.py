@@ -1,21 +1,22 @@
 import os
+from concurrent.futures import TimeoutError
 
 import humanize
-from acquisition.abstract import Parameters
+from acquisition.abstract import AcquisitionMethod, Parameters
 from checks.abstract import Check, CheckResult
+from shared.sizing import shared_estimate, volume_estimate
 
 
 class FreeSpaceCheck(Check):
     name = "Free space check"
-
-    def _get_used_space(self, path):
-        try:
-            statvfs = os.statvfs(path)
-        except FileNotFoundError:
-            return 0
-        total_space = statvfs.f_blocks * statvfs.f_frsize
-        free_space = statvfs.f_bfree * statvfs.f_frsize
-        return total_space - free_space
+    depends_on = ("source", "tmp", "destination")
+    # External drives might need to spin up, and folders are scanned
+    timeout = 120
+    # Seconds to wait for the size of the source, within the timeout
+    estimate_timeout = 100
+    # Reused for a short time only, since the source is scanned but the free
+    # space can change. Acquisitions clear the cached results.
+    max_age = 30
 
     def _get_free_space(self, path):
         try:
@@ -25,10 +26,21 @@ class FreeSpaceCheck(Check):
         free_space = statvfs.f_bfree * statvfs.f_frsize
         return free_space
 
-    def execute(self, params: Parameters) -> CheckResult:
+    def execute(self, params: Parameters, method: AcquisitionMethod) -> CheckResult:
         result = CheckResult()
 
-        source_used = self._get_used_space(params.source)
+        # Upper bound of the size of the copy, which for folders is much
+        # smaller than the used space of the volume. The estimate is reused
+        # by the acquisition, so it skips the same exclusions.
+        exclusions = method._compute_exclusions(params)
+        estimate = shared_estimate(params.source, exclusions)
+        try:
+            source_used = estimate.result(timeout=self.estimate_timeout).upper
+        except TimeoutError:
+            # Very large folders take long to scan. The used space of the
+            # whole volume is an upper bound, available immediately.
+            source_used = volume_estimate(params.source).upper
+            result.write("Source still being scanned, using its whole volume")
         tmp_string = f"{params.tmp}"
         destination_string = f"{params.destination}"
         same_volume = tmp_string.startswith(
@@ -1,13 +1,15 @@
 import os
 
-from acquisition.abstract import Parameters
+from acquisition.abstract import AcquisitionMethod, Parameters
 from checks.abstract import Check, CheckResult
 
 
 class NameCheck(Check):
     name = "Name check"
+    depends_on = ("image_name",)
+    max_age = float("inf")
 
-    def execute(self, params: Parameters) -> CheckResult:
+    def execute(self, params: Parameters, method: AcquisitionMethod) -> CheckResult:
         special_extensions = {
             ".app",
             ".bundle",
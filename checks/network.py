@@ -1,13 +1,15 @@
 import subprocess
 
-from acquisition.abstract import Parameters
+from acquisition.abstract import AcquisitionMethod, Parameters
 from checks.abstract import Check, CheckResult
 
 
 class NetworkCheck(Check):
     name = "Network check"
+    timeout = 5
+    max_age = 15
 
-    def execute(self, params: Parameters) -> CheckResult:
+    def execute(self, params: Parameters, method: AcquisitionMethod) -> CheckResult:
         result = CheckResult()
 
         # This is the CDN server used by the 'networkquality' command
@@ -0,0 +1,162 @@
+import queue
+import threading
+import time
+from dataclasses import replace
+from typing import Callable, Dict, Hashable, List, Optional, Tuple
+
+from acquisition.abstract import AcquisitionMethod, Parameters
+from checks.abstract import Check, CheckResult
+
+# Receives the generation of the run, the position of the check and its result
+ResultCallback = Callable[[int, int, CheckResult], None]
+
+
+class CheckRunner:
+    # Executes the checks concurrently, so that a slow drive or network does
+    # not hold up the others. Results are delivered as soon as each check
+    # completes. Passed checks are not executed again for check.max_age
+    # seconds, as long as the method and the parameters used by the check do
+    # not change. Starting a new run makes the results of the previous one
+    # stale, and they are not delivered.
+
+    def __init__(self, checks: List[Check]):
+        self.checks = checks
+        self.generation = 0
+        self._lock = threading.Lock()
+        self._cache: Dict[Hashable, Tuple[float, CheckResult]] = {}
+
+    def _key(
+        self, check: Check, params: Parameters, method: AcquisitionMethod
+    ) -> Hashable:
+        values = tuple(f"{getattr(params, name)}" for name in check.depends_on)
+        return type(check), method.name, values
+
+    def _cached(
+        self, check: Check, params: Parameters, method: AcquisitionMethod
+    ) -> Optional[CheckResult]:
+        with self._lock:
+            entry = self._cache.get(self._key(check, params, method))
+        if entry and time.monotonic() - entry[0] < check.max_age:
+            return entry[1]
+        return None
+
+    def _store(
+        self,
+        check: Check,
+        params: Parameters,
+        method: AcquisitionMethod,
+        result: CheckResult,
+    ) -> None:
+        with self._lock:
+            self._cache[self._key(check, params, method)] = (time.monotonic(), result)
+
+    def invalidate(self) -> None:
+        with self._lock:
+            self._cache.clear()
+
+    def cancel(self) -> None:
+        # Results of the current run will not be delivered
+        with self._lock:
+            self.generation = self.generation + 1
+
+    def _execute(
+        self, check: Check, params: Parameters, method: AcquisitionMethod
+    ) -> CheckResult:
+        try:
+            result = check.execute(params, method)
+        except Exception as e:
+            return CheckResult(passed=False, message=f"The check failed: {e}")
+        # Failures are checked again, since the examiner is probably fixing them
+        if result.passed:
+            self._store(check, params, method, result)
+        return result
+
+    def run(
+        self, params: Parameters, method: AcquisitionMethod, callback: ResultCallback
+    ) -> int:
+        # Start the checks and return immediately. The callback is invoked
+        # from a background thread.
+        with self._lock:
+            self.generation = self.generation + 1
+            generation = self.generation
+        # Later changes to the parameters do not affect this run
+        params = replace(params)
+
+        def deliver(index: int, result: CheckResult) -> None:
+            with self._lock:
+                current = generation == self.generation
+            if current:
+                callback(generation, index, result)
+
+        pending: List[int] = []
+        for index, check in enumerate(self.checks):
+            cached = self._cached(check, params, method)
+            if cached:
+                deliver(index, cached)
+            else:
+                pending.append(index)
+
+        if pending:
+            thread = threading.Thread(
+                target=self._collect,
+                args=(params, method, pending, deliver),
+                daemon=True,
+            )
+            thread.start()
+        return generation
+
+    def _collect(
+        self,
+        params: Parameters,
+        method: AcquisitionMethod,
+        indexes: List[int],
+        deliver: Callable[[int, CheckResult], None],
+    ) -> None:
+        finished: "queue.Queue[Tuple[int, CheckResult]]" = queue.Queue()
+        now = time.monotonic()
+        deadlines: Dict[int, float] = {}
+        for index in indexes:
+            check = self.checks[index]
+            deadlines[index] = now + check.timeout
+            # Daemon threads, so that a stuck check is abandoned and does not
+            # prevent the application from exiting
+            thread = threading.Thread(
+                target=lambda c=check, i=index: finished.put(
+                    (i, self._execute(c, params, method))
+                ),
+                daemon=True,
+            )
+            thread.start()
+
+        while deadlines:
+            timeout = max(min(deadlines.values()) - time.monotonic(), 0)
+            try:
+                index, result = finished.get(timeout=timeout)
+                if deadlines.pop(index, None) is not None:
+                    deliver(index, result)
+            except queue.Empty:
+                pass
+
+            now = time.monotonic()
+            for index, limit in list(deadlines.items()):
+                if limit <= now:
+                    del deadlines[index]
+                    check = self.checks[index]
+                    message = f"The check did not complete within {check.timeout} s"
+                    deliver(index, CheckResult(passed=False, message=message))
+
+    def run_all(
+        self, params: Parameters, method: AcquisitionMethod
+    ) -> List[CheckResult]:
+        # Blocking version of run(), with results in the order of the checks
+        results: List[Optional[CheckResult]] = [None] * len(self.checks)
+        finished = threading.Semaphore(0)
+
+        def collect(generation: int, index: int, result: CheckResult) -> None:
+            results[index] = result
+            finished.release()
+
+        self.run(params, method, collect)
+        for _ in self.checks:
+            finished.acquire()
+        return results  # type: ignore
@@ -1,130 +1,184 @@
 import os
-import re
 import string
 import subprocess
 import sys
 import threading
-from dataclasses import dataclass
+from collections import deque
 from pathlib import Path
-from typing import Iterable, List, Optional
+from typing import Deque, List, Optional
 
 import humanize
 import wx
 
 from acquisition.abstract import AcquisitionMethod, Parameters
-from acquisition.asr import AsrMethod
-from acquisition.ditto import DittoMethod
-from acquisition.rsync import RsyncMethod
-from acquisition.sysdiagnose import SysdiagnoseMethod
-from checks.folders import FoldersCheck
-from checks.free_space import FreeSpaceCheck
-from checks.name import NameCheck
-from checks.network import NetworkCheck
+from checks.abstract import CheckResult
 from meta import AUTHOR, HOMEPAGE, VERSION
-from shared.environment import RECOVERY, AdaptiveHyperLinkCtrl, attempt_ramdisk
+from registry import CHECK_RUNNER, CHECKS, METHODS, default_image_name
+from shared.environment import ENVIRONMENT, RECOVERY, attempt_ramdisk
+from shared.gui import AdaptiveHyperLinkCtrl, set_font
+from shared.inventory import INVENTORY, PartitionInfo
+from shared.progress import ProgressTracker
 from shared.utils import (
     ACCENT_COLOR,
     GREEN_COLOR,
     RED_COLOR,
-    command_to_properties,
     dedent,
     lines_to_properties,
-    set_font,
 )
 
-ALL_METHODS: List[AcquisitionMethod] = [
-    DittoMethod(),
-    RsyncMethod(),
-    AsrMethod(),
-    SysdiagnoseMethod(),
-]
-METHODS = [m for m in ALL_METHODS if m.available()]
-CHECKS = [NameCheck(), FoldersCheck(), FreeSpaceCheck(), NetworkCheck()]
 PARAMS = Parameters()
+# Output can be split for file systems with a maximum file size, like FAT32
+SEGMENT_CHOICES = [
+    ("Single file", 0),
+    ("Segments of 2 GB", 2 * 10**9),
+    ("Segments of 4 GB", 4 * 10**9),
+]
 
 INPUT_WINDOW: "InputWindow"
 OVERVIEW_WINDOW: "OverviewWindow"
 PROCESSING_WINDOW: "ProcessingWindow"
 
 
-class RedirectText(object):
-    out: wx.TextCtrl
-    max_lines = 500
+class ConsoleCtrl(wx.ListCtrl):
+    # Virtual list control: only the visible lines are requested and drawn
+    def __init__(self, parent):
+        super().__init__(
+            parent,
+            style=wx.LC_REPORT | wx.LC_VIRTUAL | wx.LC_NO_HEADER | wx.BORDER_SUNKEN,
+        )
+        self.InsertColumn(0, "")
+        self.source: Optional["RedirectText"] = None
+        self.Bind(wx.EVT_SIZE, self.on_size)
+
+        # Copy selected lines with the usual shortcut
+        self.Bind(wx.EVT_MENU, self.on_copy, id=wx.ID_COPY)
+        shortcut = wx.AcceleratorEntry(wx.ACCEL_CTRL, ord("C"), wx.ID_COPY)
+        self.SetAcceleratorTable(wx.AcceleratorTable([shortcut]))
+
+    def OnGetItemText(self, item, column):
+        if self.source is None:
+            return ""
+        return self.source.line(item)
+
+    def on_size(self, event):
+        self.SetColumnWidth(0, max(self.GetClientSize().GetWidth(), 100))
+        event.Skip()
+
+    def on_copy(self, event):
+        if self.source is None:
+            return
+        lines = []
+        item = self.GetFirstSelected()
+        while item != -1:
+            lines.append(self.source.line(item))
+            item = self.GetNextSelected(item)
+        if lines and wx.TheClipboard.Open():
+            wx.TheClipboard.SetData(wx.TextDataObject("\n".join(lines)))
+            wx.TheClipboard.Close()
+
 
-    def __init__(self, control: wx.TextCtrl):
+class RedirectText(object):
+    # Writes can come from any thread at any rate: they are only appended to a
+    # queue (deque operations are atomic), which the GUI thread consumes at a
+    # fixed frame rate in a single batch. When the GUI falls behind, the queue
+    # is merged and trimmed to the lines which could be shown anyway, and the
+    # number of dropped lines is reported.
+    out: ConsoleCtrl
+    max_lines = 5000
+    max_pending = 10000
+    max_line_length = 10000
+    frame_interval = 50
+
+    def __init__(self, control: ConsoleCtrl):
         self.out = control
+        self.pending: Deque[str] = deque()
+        self.pending_lock = threading.Lock()
+        self.dropped = 0
+        self.lines: Deque[str] = deque(maxlen=self.max_lines)
+        self.current = ""
+
+        self.out.source = self
+        self.out.SetItemCount(0)
+        self.timer = wx.Timer()
+        self.timer.Bind(wx.EVT_TIMER, self.on_timer)
+        self.timer.Start(self.frame_interval)
 
     def write(self, value):
-        wx.CallAfter(self.append_shrink, value)
-
-    def append_shrink(self, value):
-        self.out.AppendText(value)
-        lines = self.out.GetNumberOfLines()
-        if lines > self.max_lines:
-            delta = lines - self.max_lines
-            position = self.out.XYToPosition(0, delta - 1)
-            self.out.Remove(0, position)
-        self.out.ShowPosition(self.out.GetLastPosition())
-
-
-@dataclass
-class DiskSpaceInfo:
-    identifier: str = ""
-    size: int = 0
-    used_space: int = 0
-    free_space: int = 0
-    mount_point: str = ""
-
-
-@dataclass
-class DeviceInfo:
-    indent: int = 0
-    type: str = ""
-    name: str = ""
-    size: str = ""
-    identifier: str = ""
-    status: str = ""
-    disk_space: Optional[DiskSpaceInfo] = None
-
+        self.pending.append(value)
+        if len(self.pending) > self.max_pending:
+            self._compact()
+
+    def _take(self) -> List[str]:
+        # Called with the lock held
+        chunks = []
+        while True:
+            try:
+                chunks.append(self.pending.popleft())
+            except IndexError:
+                return chunks
+
+    def _compact(self):
+        with self.pending_lock:
+            if len(self.pending) <= self.max_pending:
+                return
+            parts = "".join(self._take()).split("\n")
+            excess = len(parts) - 1 - self.max_lines
+            if excess > 0:
+                self.dropped = self.dropped + excess
+                parts = parts[excess:]
+            # Older than anything appended in the meantime
+            self.pending.appendleft("\n".join(parts))
+
+    def flush(self):
+        pass
+
+    def stop(self):
+        self.timer.Stop()
+        self.on_timer(None)
+
+    def line(self, index: int) -> str:
+        if index < len(self.lines):
+            return self.lines[index]
+        return self.current.replace("\r", "")
+
+    def _collapse(self, text: str) -> str:
+        # A carriage return rewrites the line, as in a terminal (e.g. progress
+        # shown by rsync)
+        end = len(text.rstrip("\r"))
+        start = text.rfind("\r", 0, end) + 1
+        return text[start:][-self.max_line_length :]
+
+    def on_timer(self, event):
+        with self.pending_lock:
+            chunks = self._take()
+            dropped, self.dropped = self.dropped, 0
+        if not chunks:
+            return
 
-class DevicesWindow(wx.Frame):
-    def _parse_stanza(
-        self, stanza: str, mount_info: dict[str, DiskSpaceInfo]
-    ) -> Iterable[DeviceInfo]:
-        lines = stanza.splitlines()
-        first, second = lines[:2]
-        status = ""
-        if "(" in first:
-            status = first.split("(")[1].split(")")[0]
-        pivot_1 = second.index(":") + 1
-        pivot_2 = second.index(" NAME")
-        pivot_3 = second.index(" SIZE")
-        pivot_4 = second.index(" IDENTIFIER")
-
-        is_disk = True
-        for line in lines[2:]:
-            type = line[pivot_1 + 1 : pivot_2].strip()
-            name = line[pivot_2:pivot_3].strip()
-            size = line[pivot_3 + 1 : pivot_4].strip()
-            identifier = line[pivot_4:].strip()
-            if not identifier:
-                continue
-            indent = identifier[4:].count("s")
-            if identifier == "-":
-                indent = 1
-            device_info = DeviceInfo(
-                indent=indent,
-                type=type,
-                name=name,
-                size=size,
-                identifier=identifier,
-                status=status if is_disk else "",
-                disk_space=mount_info.get(identifier),
-            )
+        parts = "".join(chunks).replace("\r\n", "\n").split("\n")
+        # Leave room for the note about the dropped lines
+        excess = len(parts) - self.max_lines
+        if excess > 0:
+            dropped = dropped + excess
+            parts = parts[excess:]
+        if dropped:
+            if self.current:
+                self.lines.append(self._collapse(self.current).replace("\r", ""))
+            self.lines.append(f"[{dropped} lines of output dropped]")
+            self.current = ""
+        parts[0] = self.current + parts[0]
+        for part in parts[:-1]:
+            self.lines.append(self._collapse(part).replace("\r", ""))
+        self.current = self._collapse(parts[-1])
+
+        count = len(self.lines) + (1 if self.current else 0)
+        self.out.SetItemCount(count)
+        if count:
+            self.out.RefreshItems(0, count - 1)
+            self.out.EnsureVisible(count - 1)
 
-            is_disk = False
-            yield device_info
 
+class DevicesWindow(wx.Frame):
     def __init__(self, parent):
         super().__init__(parent, title="Fuji - Drives and partitions")
         self.parent = parent
@@ -142,31 +196,10 @@ class DevicesWindow(wx.Frame):
         self.list_ctrl.Bind(wx.EVT_LIST_ITEM_FOCUSED, self.on_item_focused)
         self.list_ctrl.Bind(wx.EVT_LIST_ITEM_ACTIVATED, self.on_item_activated)
 
-        mount_info: dict[str, DiskSpaceInfo] = {}
-        df_lines = subprocess.check_output(["df"], universal_newlines=True).splitlines()
-        for line in df_lines:
-            if not line.startswith("/dev/disk"):
-                continue
-            identifier, size, used, free, _, _, _, _, mount_point = re.split(
-                r"\s+", line, maxsplit=8
-            )
-            short_identifier: str = identifier[5:]
-            mount_info[short_identifier] = DiskSpaceInfo(
-                identifier=identifier,
-                size=int(size) * 512,
-                used_space=int(used) * 512,
-                free_space=int(free) * 512,
-                mount_point=mount_point,
-            )
-
-        self.devices: List[DeviceInfo] = []
-
-        diskutil_list = subprocess.check_output(
-            ["diskutil", "list"], universal_newlines=True
-        )
-        stanzas = diskutil_list.strip().split("\n\n")
-        for stanza in stanzas:
-            self.devices.extend(self._parse_stanza(stanza, mount_info))
+        # Always show the current state of the drives, and pick up a source
+        # volume which was mounted in the meantime
+        ENVIRONMENT.refresh()
+        self.devices: List[PartitionInfo] = list(INVENTORY.partitions())
 
         # Add columns to the list control
         columns = [
@@ -261,7 +294,7 @@ class DevicesWindow(wx.Frame):
 
     def on_item_focused(self, event):
         index = event.GetIndex()
-        device: DeviceInfo = self.devices[index]
+        device: PartitionInfo = self.devices[index]
         if device.disk_space and device.disk_space.mount_point:
             self.selected_index = event.GetIndex()
         else:
@@ -269,7 +302,7 @@ class DevicesWindow(wx.Frame):
 
     def on_item_activated(self, event):
         index = event.GetIndex()
-        device: DeviceInfo = self.devices[index]
+        device: PartitionInfo = self.devices[index]
         if device.disk_space and device.disk_space.mount_point:
             PARAMS.source = Path(device.disk_space.mount_point)
             self.parent.source_picker.SetPath(device.disk_space.mount_point)
@@ -349,6 +382,16 @@ class InputWindow(wx.Frame):
         self.method_choice = wx.Choice(panel, choices=[m.name for m in METHODS])
         self.method_choice.Bind(wx.EVT_CHOICE, self.on_method_changed)
         self.method_choice.SetSelection(0)
+        segments_label = wx.StaticText(panel, label="Output segments:")
+        self.segments_choice = wx.Choice(
+            panel, choices=[label for label, _ in SEGMENT_CHOICES]
+        )
+        self.segments_choice.SetSelection(0)
+        store_label = wx.StaticText(panel, label="Deduplicating store:")
+        self.store_picker = wx.DirPickerCtrl(panel)
+        self.store_picker.SetInitialDirectory("/Volumes")
+        if PARAMS.store:
+            self.store_picker.SetPath(str(PARAMS.store))
 
         # Prepare method descriptions
         for method in METHODS:
@@ -361,6 +404,18 @@ class InputWindow(wx.Frame):
         )
         self.sound_checkbox.SetValue(PARAMS.sound)
 
+        # Manifest checkbox
+        self.manifest_checkbox = wx.CheckBox(
+            panel, label="Generate a hash manifest of the acquired files"
+        )
+        self.manifest_checkbox.SetValue(PARAMS.manifest)
+
+        # Log index checkbox
+        self.log_index_checkbox = wx.CheckBox(
+            panel, label="Build a searchable index of the unified logs"
+        )
+        self.log_index_checkbox.SetValue(PARAMS.log_index)
+
         # Buttons
         continue_btn = wx.Button(panel, label="Continue")
         continue_btn.Bind(wx.EVT_BUTTON, self.on_continue)
@@ -400,6 +455,10 @@ class InputWindow(wx.Frame):
         output_info.Add(self.tmp_picker, 1, wx.EXPAND)
         output_info.Add(method_label, 0, wx.ALIGN_LEFT | wx.ALIGN_CENTER_VERTICAL)
         output_info.Add(self.method_choice, 1, wx.EXPAND)
+        output_info.Add(segments_label, 0, wx.ALIGN_LEFT | wx.ALIGN_CENTER_VERTICAL)
+        output_info.Add(self.segments_choice, 1, wx.EXPAND)
+        output_info.Add(store_label, 0, wx.ALIGN_LEFT | wx.ALIGN_CENTER_VERTICAL)
+        output_info.Add(self.store_picker, 1, wx.EXPAND)
         output_info.AddGrowableCol(1, 1)
 
         vbox.Add(output_info, 0, wx.EXPAND | wx.ALL, 10)
@@ -409,6 +468,8 @@ class InputWindow(wx.Frame):
         self.describe_method(0)
 
         vbox.Add((0, 20))
+        vbox.Add(self.manifest_checkbox, 0, wx.ALIGN_CENTER_HORIZONTAL | wx.BOTTOM, 10)
+        vbox.Add(self.log_index_checkbox, 0, wx.ALIGN_CENTER_HORIZONTAL | wx.BOTTOM, 10)
         if not RECOVERY:
             vbox.Add(self.sound_checkbox, 0, wx.ALIGN_CENTER_HORIZONTAL | wx.BOTTOM, 10)
         else:
@@ -484,6 +545,12 @@ class InputWindow(wx.Frame):
         PARAMS.tmp = Path(self.tmp_picker.GetPath().strip())
         PARAMS.destination = Path(self.destination_picker.GetPath().strip())
         PARAMS.sound = self.sound_checkbox.GetValue()
+        PARAMS.manifest = self.manifest_checkbox.GetValue()
+        PARAMS.log_index = self.log_index_checkbox.GetValue()
+        PARAMS.segment_size = SEGMENT_CHOICES[self.segments_choice.GetSelection()][1]
+        # The store is optional, an empty path means a DMG or ZIP output
+        store = self.store_picker.GetPath().strip()
+        PARAMS.store = Path(store) if store else None
         self.method = METHODS[self.method_choice.GetSelection()]
 
         self.Hide()
@@ -503,6 +570,9 @@ class InputWindow(wx.Frame):
 
 
 class OverviewWindow(wx.Frame):
+    max_text_width = 600
+    generation = 0
+
     def __init__(self):
         super().__init__(
             parent=None,
@@ -557,11 +627,19 @@ class OverviewWindow(wx.Frame):
             "Output destination": PARAMS.destination,
             "Temporary files": PARAMS.tmp,
             "Acquisition method": INPUT_WINDOW.method.name,
+            "File manifest": "Yes" if PARAMS.manifest else "No",
+            "Unified log index": "Yes" if PARAMS.log_index else "No",
+            "Output segments": (
+                humanize.naturalsize(PARAMS.segment_size)
+                if PARAMS.segment_size
+                else "No"
+            ),
+            "Deduplicating store": PARAMS.store or "No",
         }
         if not RECOVERY:
             data["Play sound"] = "Yes" if PARAMS.sound else "No"
 
-        max_text_width = 600
+        max_text_width = self.max_text_width
 
         # Insert rows into the grid
         for label, value in data.items():
@@ -576,36 +654,56 @@ class OverviewWindow(wx.Frame):
             self.overview_grid.Add(label_text, 0, wx.ALIGN_LEFT | wx.ALIGN_TOP)
             self.overview_grid.Add(value_text, 1, wx.ALIGN_LEFT | wx.ALIGN_TOP)
 
-        # Perform checks
+        # Perform checks in the background, showing results as they arrive
+        self.check_rows = []
         for check in CHECKS:
-            result = check.execute(PARAMS)
             label_text = wx.StaticText(self.panel, label=check.name)
             set_font(label_text, weight=wx.FONTWEIGHT_BOLD)
-            if not result.passed:
-                label_text.SetForegroundColour(RED_COLOR)
-            else:
-                label_text.SetForegroundColour(GREEN_COLOR)
+            label_text.SetForegroundColour((128, 128, 128))
             value_text = wx.StaticText(
                 self.panel,
-                label=result.message,
-                size=(max_text_width, -1),
+                label="Checking...",
+                size=(self.max_text_width, -1),
             )
-            value_text.Wrap(max_text_width)
             self.overview_grid.Add(label_text, 0, wx.ALIGN_LEFT | wx.ALIGN_TOP)
             self.overview_grid.Add(value_text, 1, wx.ALIGN_LEFT | wx.ALIGN_TOP)
+            self.check_rows.append((label_text, value_text))
+
+        self._update_layout()
+        self.generation = CHECK_RUNNER.run(
+            PARAMS,
+            INPUT_WINDOW.method,
+            lambda *args: wx.CallAfter(self.show_check_result, *args),
+        )
 
-        # Update the layout
+    def show_check_result(self, generation: int, index: int, result: CheckResult):
+        # Results of a previous run might arrive after the grid was rebuilt
+        if generation != self.generation:
+            return
+        label_text, value_text = self.check_rows[index]
+        if not result.passed:
+            label_text.SetForegroundColour(RED_COLOR)
+        else:
+            label_text.SetForegroundColour(GREEN_COLOR)
+        label_text.Refresh()
+        value_text.SetLabel(result.message)
+        value_text.Wrap(self.max_text_width)
+        self._update_layout()
+
+    def _update_layout(self):
         self.panel.Layout()
         self.panel.Fit()
         self.Fit()
 
     def on_back(self, event):
         # Hide the overview window and show the input window again
+        CHECK_RUNNER.cancel()
         self.Hide()
         INPUT_WINDOW.Show()
 
     def on_confirm(self, event):
         # Start acquisition
+        CHECK_RUNNER.cancel()
         self.Hide()
         PROCESSING_WINDOW.activate()
 
@@ -613,8 +711,74 @@ class OverviewWindow(wx.Frame):
         self.on_back(event)
 
 
+class ProgressPanel(wx.Panel):
+    # Progress of the current stage, with a summary of the completed ones
+    refresh_interval = 500
+
+    def __init__(self, parent):
+        super().__init__(parent)
+        self.tracker: Optional[ProgressTracker] = None
+
+        self.stage_label = wx.StaticText(self, label="")
+        set_font(self.stage_label, weight=wx.FONTWEIGHT_BOLD)
+        self.gauge = wx.Gauge(self, range=1000)
+        self.completed_label = wx.StaticText(self, label="")
+
+        vbox = wx.BoxSizer(wx.VERTICAL)
+        vbox.Add(self.stage_label, 0, wx.EXPAND | wx.BOTTOM, 5)
+        vbox.Add(self.gauge, 0, wx.EXPAND | wx.BOTTOM, 5)
+        vbox.Add(self.completed_label, 0, wx.EXPAND)
+        self.SetSizer(vbox)
+
+        self.timer = wx.Timer()
+        self.timer.Bind(wx.EVT_TIMER, self.on_timer)
+
+    def track(self, tracker: ProgressTracker):
+        self.tracker = tracker
+        self.stage_label.SetLabel("")
+        self.completed_label.SetLabel("")
+        self.gauge.SetValue(0)
+        self.timer.Start(self.refresh_interval)
+
+    def stop(self):
+        self.timer.Stop()
+        if self.tracker:
+            # Stages interrupted by errors are closed too
+            self.tracker.finish()
+        self.refresh()
+
+    def on_timer(self, event):
+        self.refresh()
+
+    def refresh(self):
+        if not self.tracker:
+            return
+        stages = self.tracker.snapshot()
+        current = stages[-1] if stages and stages[-1].finished is None else None
+        completed = [stage for stage in stages if stage is not current]
+
+        if current:
+            self.stage_label.SetLabel(current.describe())
+            fraction = current.fraction
+            if fraction is None:
+                # Unknown total
+                self.gauge.Pulse()
+            else:
+                self.gauge.SetValue(int(fraction * 1000))
+        else:
+            self.stage_label.SetLabel("")
+            self.gauge.SetValue(1000 if completed else 0)
+
+        self.completed_label.SetLabel(
+            "\n".join(stage.describe() for stage in completed)
+        )
+        self.Layout()
+        self.GetParent().Layout()
+
+
 class ProcessingWindow(wx.Frame):
     running = False
+    redirect: Optional[RedirectText] = None
 
     def __init__(self):
         super().__init__(
@@ -627,14 +791,14 @@ class ProcessingWindow(wx.Frame):
         # Components
         self.title = wx.StaticText(self.panel, label="Acquisition in progress")
         set_font(self.title, size=18, weight=wx.FONTWEIGHT_BOLD)
-        self.output_text = wx.TextCtrl(
-            self.panel, style=wx.TE_MULTILINE | wx.TE_READONLY | wx.VSCROLL
-        )
+        self.progress = ProgressPanel(self.panel)
+        self.output_text = ConsoleCtrl(self.panel)
 
         # Layout
         vbox = wx.BoxSizer(wx.VERTICAL)
         vbox.Add(self.title, 0, wx.ALIGN_CENTER_HORIZONTAL | wx.TOP, 20)
         vbox.Add((0, 10))
+        vbox.Add(self.progress, 0, wx.EXPAND | wx.LEFT | wx.RIGHT, 10)
         vbox.Add(self.output_text, 1, wx.EXPAND | wx.ALL, 10)
 
         self.panel.SetSizer(vbox)
@@ -649,20 +813,25 @@ class ProcessingWindow(wx.Frame):
         # Reset initial status
         self.title.SetLabel("Acquisition in progress")
         self.title.SetForegroundColour(wx.NullColour)
-        self.output_text.SetValue("")
 
         self.Show()
 
         # Redirect sys.stdout to the custom file-like object
-        redir = RedirectText(self.output_text)
-        sys.stdout = redir
-        sys.stderr = redir
+        if self.redirect:
+            self.redirect.stop()
+        self.redirect = RedirectText(self.output_text)
+        sys.stdout = self.redirect
+        sys.stderr = self.redirect
+
+        self.progress.track(INPUT_WINDOW.method.progress)
 
         # Start acquisition process in a separate thread
         self.acquisition_thread = threading.Thread(target=self.execute_acquisition)
         self.acquisition_thread.start()
 
     def execute_acquisition(self):
+        # The acquisition changes the folders and free space seen by the checks
+        CHECK_RUNNER.invalidate()
         try:
             method = INPUT_WINDOW.method
             result = method.execute(PARAMS)
@@ -677,6 +846,8 @@ class ProcessingWindow(wx.Frame):
             # Acquisition failed
             wx.CallAfter(self.set_completion_status, False)
             wx.CallAfter(sys.stdout.write, f"Error: {str(e)}\n")
+        finally:
+            CHECK_RUNNER.invalidate()
 
     def play_sound(self, success: bool):
         MAX_VOLUME = 7
@@ -705,6 +876,7 @@ class ProcessingWindow(wx.Frame):
         else:
             self.title.SetLabel("Acquisition failed")
             self.title.SetForegroundColour(RED_COLOR)
+        self.progress.stop()
         self.running = False
 
     def on_close(self, event):
@@ -719,14 +891,7 @@ if __name__ == "__main__":
         attempt_ramdisk()
 
     # Try to find the serial number
-    information = command_to_properties(
-        ["ioreg", "-rd1", "-c", "IOPlatformExpertDevice"],
-        separator="=",
-        strip_chars='"<> ',
-    )
-    if "IOPlatformSerialNumber" in information:
-        serial_number = information["IOPlatformSerialNumber"]
-        PARAMS.image_name = f"{serial_number}_Acquisition"
+    PARAMS.image_name = default_image_name()
 
     app = wx.App()
     INPUT_WINDOW = InputWindow()
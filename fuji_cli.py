@@ -0,0 +1,275 @@
+import argparse
+import subprocess
+import sys
+import threading
+from pathlib import Path
+from typing import List, Optional
+
+from acquisition.abstract import AcquisitionMethod, Parameters
+from acquisition.verify import record, verify
+from meta import AUTHOR, VERSION
+from registry import CHECK_RUNNER, CHECKS, METHODS, default_image_name
+from shared.environment import RECOVERY
+from shared.hashing import DEFAULT_ALGORITHMS
+from shared.progress import ProgressTracker
+from shared.store import export_index
+
+# Headless entry point, which does not load wxPython:
+#
+#     python -m fuji_cli --case "Case" --examiner "Name" --method Rsync \
+#         --tmp /Volumes/Fuji --destination /Volumes/Fuji
+
+
+class ProgressPrinter:
+    # Prints the current stage of the acquisition at regular intervals
+    def __init__(self, tracker: ProgressTracker, interval: float):
+        self.tracker = tracker
+        self.interval = interval
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._run, daemon=True)
+
+    def _run(self) -> None:
+        last = None
+        while not self._stop.wait(self.interval):
+            current = self.tracker.current()
+            if not current:
+                continue
+            # Only print stages which are making some progress
+            state = (current.name, current.bytes_done, current.files_done)
+            if state != last:
+                print(f"\n[{current.describe()}]", flush=True)
+                last = state
+
+    def __enter__(self) -> "ProgressPrinter":
+        if self.interval > 0:
+            self._thread.start()
+        return self
+
+    def __exit__(self, *args) -> None:
+        self._stop.set()
+        if self._thread.is_alive():
+            self._thread.join()
+
+
+SIZE_UNITS = {"": 1, "K": 10**3, "M": 10**6, "G": 10**9, "T": 10**12}
+
+
+def _parse_size(text: str) -> int:
+    # Sizes like 650M or 2G (powers of 1000, like the sizes shown by Fuji)
+    value = text.strip().upper().rstrip("B")
+    unit = value[-1:] if value[-1:] in SIZE_UNITS else ""
+    try:
+        size = int(float(value[: len(value) - len(unit)]) * SIZE_UNITS[unit])
+    except ValueError:
+        raise argparse.ArgumentTypeError(f"invalid size: {text}")
+    if size < 0:
+        raise argparse.ArgumentTypeError(f"invalid size: {text}")
+    return size
+
+
+def _find_method(name: str) -> Optional[AcquisitionMethod]:
+    for method in METHODS:
+        if method.name.lower() == name.lower():
+            return method
+    return None
+
+
+def _parse_arguments(arguments: List[str]) -> argparse.Namespace:
+    defaults = Parameters()
+    parser = argparse.ArgumentParser(
+        prog="fuji_cli",
+        description=f"Fuji {VERSION} by {AUTHOR} - headless acquisition",
+    )
+    parser.add_argument("--case", default=defaults.case, help="case name")
+    parser.add_argument("--examiner", default=defaults.examiner, help="examiner")
+    parser.add_argument("--notes", default=defaults.notes, help="notes")
+    parser.add_argument(
+        "--name", help="image name (default: based on the serial number)"
+    )
+    parser.add_argument("--source", type=Path, default=defaults.source)
+    parser.add_argument("--tmp", type=Path, default=defaults.tmp)
+    parser.add_argument(
+        "--destination", type=Path, help="output directory (default: same as tmp)"
+    )
+    parser.add_argument(
+        "--method",
+        default=METHODS[0].name if METHODS else "",
+        help="acquisition method (see --list)",
+    )
+    parser.add_argument(
+        "--digests",
+        nargs="+",
+        choices=DEFAULT_ALGORITHMS,
+        default=list(defaults.digests),
+        help="hashes of the output file",
+    )
+    parser.add_argument(
+        "--hash-mmap",
+        action="store_true",
+        help="read the output through mmap while hashing it",
+    )
+    parser.add_argument(
+        "--manifest", action="store_true", help="write a file manifest (CSV)"
+    )
+    parser.add_argument(
+        "--log-index",
+        action="store_true",
+        help="index the unified logs in an SQLite database (Sysdiagnose)",
+    )
+    parser.add_argument(
+        "--segment-size",
+        type=_parse_size,
+        default=defaults.segment_size,
+        metavar="SIZE",
+        help="split the output in segments (e.g. 2G), 0 for a single file",
+    )
+    parser.add_argument(
+        "--store",
+        type=Path,
+        default=defaults.store,
+        metavar="DIR",
+        help="write the data to a deduplicating store instead of a DMG/ZIP",
+    )
+    parser.add_argument(
+        "--force", action="store_true", help="proceed even if some checks fail"
+    )
+    parser.add_argument(
+        "--progress",
+        type=float,
+        default=10.0,
+        metavar="SECONDS",
+        help="progress update interval (0 to disable)",
+    )
+    parser.add_argument(
+        "--list", action="store_true", help="list the available methods and exit"
+    )
+    parser.add_argument(
+        "--verify",
+        type=Path,
+        metavar="REPORT",
+        help="verify the output of an acquisition against its report and exit",
+    )
+    parser.add_argument(
+        "--export",
+        nargs=2,
+        type=Path,
+        metavar=("INDEX", "OUTPUT"),
+        help="rebuild a stored acquisition as a DMG or ZIP file and exit",
+    )
+    parser.add_argument(
+        "--full-stream",
+        action="store_true",
+        help="when verifying segments, also hash their concatenation",
+    )
+    return parser.parse_args(arguments)
+
+
+def _verify(report: Path, full_stream: bool) -> int:
+    print(f"Verifying {report}...")
+    verification = verify(report, full_stream=full_stream)
+    if verification.error:
+        print(verification.error)
+    for item in verification.files:
+        status = "OK" if item.passed else item.error or "hash mismatch"
+        print(f"{item.path}: {status}")
+    if verification.zip_members:
+        print(f"ZIP members checked: {verification.zip_members}")
+    for error in verification.zip_errors:
+        print(f"ZIP error: {error}")
+    if verification.report.exists():
+        record(verification)
+
+    result = "passed" if verification.passed else "FAILED"
+    print(f"Verification {result} ({verification.seconds:.1f} s)")
+    return 0 if verification.passed else 1
+
+
+def _export(index: Path, output: Path, tmp: Path) -> int:
+    print(f"Exporting {index} -> {output}...")
+    try:
+        export_index(index, output, tmp)
+    except (OSError, KeyError, ValueError, subprocess.CalledProcessError) as e:
+        print(f"Export failed: {e}")
+        return 1
+    print("Export completed")
+    return 0
+
+
+def main(arguments: List[str]) -> int:
+    args = _parse_arguments(arguments)
+
+    if args.verify:
+        return _verify(args.verify, args.full_stream)
+
+    if args.export:
+        index, output = args.export
+        return _export(index, output, args.tmp if args.tmp.is_dir() else output.parent)
+
+    if args.list:
+        for available in METHODS:
+            description = " ".join(available.description.split())
+            print(f"{available.name}: {description}")
+        return 0
+
+    method = _find_method(args.method)
+    if method is None:
+        print(f"Unknown or unavailable acquisition method: {args.method}")
+        return 1
+
+    params = Parameters(
+        case=args.case,
+        examiner=args.examiner,
+        notes=args.notes,
+        image_name=args.name or default_image_name(),
+        source=args.source,
+        tmp=args.tmp,
+        destination=args.destination or args.tmp,
+        sound=False,
+        digests=tuple(args.digests),
+        hash_mmap=args.hash_mmap,
+        manifest=args.manifest,
+        log_index=args.log_index,
+        segment_size=args.segment_size,
+        store=args.store,
+    )
+
+    print(f"Fuji {VERSION} - acquisition with {method.name}")
+    print(f"Source: {params.source}")
+    print(f"Destination: {params.destination / params.image_name}")
+    if params.store:
+        print(f"Deduplicating store: {params.store}")
+    if RECOVERY:
+        print("Running in recovery environment")
+
+    failed = False
+    results = CHECK_RUNNER.run_all(params, method)
+    for check, result in zip(CHECKS, results):
+        status = "OK" if result.passed else "FAILED"
+        print(f"\n{check.name}: {status}")
+        if result.message:
+            print(result.message)
+        failed = failed or not result.passed
+    if failed and not args.force:
+        print("\nSome checks failed, use --force to proceed anyway")
+        return 2
+
+    # The acquisition changes the folders and free space seen by the checks
+    CHECK_RUNNER.invalidate()
+    success = False
+    try:
+        with ProgressPrinter(method.progress, args.progress):
+            success = method.execute(params).success
+    except Exception as e:
+        # Like the graphical interface, which reports the error and goes on
+        print(f"\nError: {e}")
+    finally:
+        CHECK_RUNNER.invalidate()
+
+    if not success:
+        print("\nAcquisition failed")
+        return 1
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main(sys.argv[1:]))
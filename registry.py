@@ -0,0 +1,36 @@
+from typing import List
+
+from acquisition.abstract import AcquisitionMethod, Parameters
+from acquisition.asr import AsrMethod
+from acquisition.ditto import DittoMethod
+from acquisition.native import NativeMethod
+from acquisition.rsync import RsyncMethod
+from acquisition.sysdiagnose import SysdiagnoseMethod
+from checks.abstract import Check
+from checks.folders import FoldersCheck
+from checks.free_space import FreeSpaceCheck
+from checks.name import NameCheck
+from checks.network import NetworkCheck
+from checks.runner import CheckRunner
+from shared.environment import serial_number
+
+# Acquisition methods and checks shared by the graphical and command-line
+# interfaces
+
+ALL_METHODS: List[AcquisitionMethod] = [
+    DittoMethod(),
+    RsyncMethod(),
+    NativeMethod(),
+    AsrMethod(),
+    SysdiagnoseMethod(),
+]
+METHODS = [m for m in ALL_METHODS if m.available()]
+CHECKS: List[Check] = [NameCheck(), FoldersCheck(), FreeSpaceCheck(), NetworkCheck()]
+CHECK_RUNNER = CheckRunner(CHECKS)
+
+
+def default_image_name() -> str:
+    serial = serial_number()
+    if serial:
+        return f"{serial}_Acquisition"
+    return Parameters.image_name
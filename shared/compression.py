@@ -0,0 +1,139 @@
+import threading
+import zlib
+from dataclasses import dataclass, field
+from typing import Dict, Optional, Tuple
+
+# Choice of the compression of every ZIP member. Data which is already
+# compressed or encrypted is stored as it is, since deflating it only costs
+# CPU time. Known formats are recognized through their signature, everything
+# else by compressing a sample of the first blocks with the fastest level.
+
+STORE = "store"
+FAST = "fast"
+STRONG = "strong"
+
+# ZIP method and deflate level of every class
+SETTINGS: Dict[str, Tuple[int, int]] = {STORE: (0, 0), FAST: (8, 1), STRONG: (8, 6)}
+
+SAMPLE_SIZE = 64 * 1024
+# Headers are usually more compressible than the data following them, so they
+# are skipped in larger files
+HEADER_SIZE = 4 * 1024
+# Files smaller than this are always deflated, the sample would be the file
+SMALL_FILE = 16 * 1024
+
+# Sample compression ratios separating the classes
+STORE_RATIO = 0.95
+STRONG_RATIO = 0.5
+
+# Signatures of compressed or encrypted formats, at the given offsets
+SIGNATURES = [
+    (0, b"\xff\xd8\xff", "jpeg"),
+    (0, b"\x89PNG\r\n\x1a\n", "png"),
+    (0, b"GIF8", "gif"),
+    (0, b"PK\x03\x04", "zip"),
+    (0, b"\x1f\x8b", "gzip"),
+    (0, b"BZh", "bzip2"),
+    (0, b"\xfd7zXZ\x00", "xz"),
+    (0, b"7z\xbc\xaf\x27\x1c", "7z"),
+    (0, b"\x28\xb5\x2f\xfd", "zstd"),
+    (0, b"Rar!\x1a\x07", "rar"),
+    (0, b"\x1a\x45\xdf\xa3", "matroska"),
+    (0, b"ID3", "mp3"),
+    (0, b"OggS", "ogg"),
+    (0, b"fLaC", "flac"),
+    (0, b"bvx2", "lzfse"),
+    (0, b"encrcdsa", "encrypted dmg"),
+    (4, b"ftyp", "mp4/mov/heic"),
+    (8, b"WEBP", "webp"),
+]
+
+
+def _signature(header: bytes) -> Optional[str]:
+    for offset, magic, name in SIGNATURES:
+        if header[offset : offset + len(magic)] == magic:
+            return name
+    return None
+
+
+@dataclass
+class ClassStats:
+    files: int = 0
+    bytes: int = 0
+    compressed_bytes: int = 0
+
+
+@dataclass
+class Decision:
+    kind: str
+    reason: str
+
+    @property
+    def method(self) -> int:
+        return SETTINGS[self.kind][0]
+
+    @property
+    def level(self) -> int:
+        return SETTINGS[self.kind][1]
+
+
+@dataclass
+class CompressionPolicy:
+    # Decisions are taken concurrently on the workers of the ZIP writer, so
+    # the statistics are guarded by a lock
+    stats: Dict[str, ClassStats] = field(
+        default_factory=lambda: {kind: ClassStats() for kind in SETTINGS}
+    )
+    reasons: Dict[str, int] = field(default_factory=dict)
+    _lock: threading.Lock = field(default_factory=threading.Lock, repr=False)
+
+    def decide(self, path: str, size: int) -> Decision:
+        decision = self._decide(path, size)
+        with self._lock:
+            self.reasons[decision.reason] = self.reasons.get(decision.reason, 0) + 1
+        return decision
+
+    def _decide(self, path: str, size: int) -> Decision:
+        if size == 0:
+            return Decision(STORE, "empty")
+        try:
+            with open(path, "rb") as f:
+                header = f.read(HEADER_SIZE)
+                sample = f.read(SAMPLE_SIZE) if size > SMALL_FILE else header
+        except OSError:
+            # The error is reported when the data is read
+            return Decision(FAST, "unreadable")
+
+        name = _signature(header)
+        if name:
+            return Decision(STORE, name)
+        if size <= SMALL_FILE:
+            return Decision(STRONG, "small")
+
+        ratio = len(zlib.compress(sample, 1)) / len(sample) if sample else 1.0
+        if ratio >= STORE_RATIO:
+            return Decision(STORE, "incompressible")
+        if ratio <= STRONG_RATIO:
+            return Decision(STRONG, "compressible")
+        return Decision(FAST, "partly compressible")
+
+    def record(self, kind: str, size: int, compressed_size: int) -> None:
+        with self._lock:
+            stats = self.stats[kind]
+            stats.files = stats.files + 1
+            stats.bytes = stats.bytes + size
+            stats.compressed_bytes = stats.compressed_bytes + compressed_size
+
+    def summary(self) -> Dict:
+        # Serializable statistics for the report
+        return {
+            "classes": {
+                kind: {
+                    "files": stats.files,
+                    "bytes": stats.bytes,
+                    "compressed_bytes": stats.compressed_bytes,
+                }
+                for kind, stats in self.stats.items()
+            },
+            "reasons": dict(sorted(self.reasons.items())),
+        }
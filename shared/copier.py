@@ -0,0 +1,248 @@
+import errno
+import os
+import posix
+import shutil
+import stat
+import sys
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import dataclass
+from pathlib import Path
+from typing import Callable, Iterable, List, Optional, Set, Tuple
+
+import humanize
+
+from shared.walker import ParallelWalker
+
+# Flags from <copyfile.h>, used with fcopyfile() on macOS
+COPYFILE_XATTR = 1 << 2
+COPYFILE_DATA = 1 << 3
+
+# Errors meaning that a zero-copy primitive is not supported for a file pair
+FALLBACK_ERRORS = {errno.EXDEV, errno.ENOSYS, errno.EINVAL, errno.EOPNOTSUPP}
+
+
+@dataclass
+class CopyStats:
+    files: int = 0
+    bytes: int = 0
+    errors: int = 0
+    skipped: int = 0
+
+
+def _copy_range(source: int, destination: int) -> None:
+    while os.copy_file_range(source, destination, 1 << 30):  # type: ignore
+        pass
+
+
+def _copy_sendfile(source: int, destination: int) -> None:
+    offset = 0
+    while True:
+        sent = os.sendfile(destination, source, offset, 1 << 30)
+        if sent == 0:
+            break
+        offset = offset + sent
+
+
+def _copy_fcopyfile(source: int, destination: int) -> None:
+    # macOS: fcopyfile() clones or copies both data and extended attributes
+    flags = COPYFILE_DATA | COPYFILE_XATTR
+    posix._fcopyfile(source, destination, flags)  # type: ignore
+
+
+def _copy_data(source: int, destination: int) -> bool:
+    # Copy the file contents with the best available zero-copy primitive.
+    # Returns whether the extended attributes were copied as well.
+    primitives = []
+    if hasattr(posix, "_fcopyfile"):
+        primitives.append(_copy_fcopyfile)
+    if hasattr(os, "copy_file_range"):
+        primitives.append(_copy_range)
+    if sys.platform.startswith("linux"):
+        primitives.append(_copy_sendfile)
+
+    for primitive in primitives:
+        try:
+            primitive(source, destination)
+            return primitive == _copy_fcopyfile
+        except OSError as e:
+            # Try the next primitive only if nothing was written
+            written = os.lseek(destination, 0, os.SEEK_CUR)
+            if e.errno not in FALLBACK_ERRORS or written:
+                raise
+
+    with os.fdopen(source, "rb", closefd=False) as input, os.fdopen(
+        destination, "wb", closefd=False
+    ) as output:
+        shutil.copyfileobj(input, output, 1024 * 1024)
+    return False
+
+
+def _copy_xattrs(source: str, destination: str) -> None:
+    if not hasattr(os, "listxattr"):
+        return
+    for name in os.listxattr(source, follow_symlinks=False):
+        try:
+            value = os.getxattr(source, name, follow_symlinks=False)
+            os.setxattr(destination, name, value, follow_symlinks=False)
+        except OSError as e:
+            if e.errno not in (errno.EPERM, errno.ENOTSUP, errno.ENODATA):
+                raise
+
+
+def _copy_metadata(destination: str, info: os.stat_result) -> None:
+    # Ownership first, since changing it can reset special permission bits
+    try:
+        os.chown(destination, info.st_uid, info.st_gid, follow_symlinks=False)
+    except PermissionError:
+        pass
+
+    mode = stat.S_IMODE(info.st_mode)
+    times = (info.st_atime_ns, info.st_mtime_ns)
+    if not stat.S_ISLNK(info.st_mode):
+        os.chmod(destination, mode)
+        os.utime(destination, ns=times)
+        return
+
+    if os.chmod in os.supports_follow_symlinks:
+        os.chmod(destination, mode, follow_symlinks=False)
+    if os.utime in os.supports_follow_symlinks:
+        os.utime(destination, ns=times, follow_symlinks=False)
+
+
+class ParallelCopier:
+    # Copies a tree with a pool of walker threads feeding a pool of copy
+    # threads. Permissions, ownership, timestamps and extended attributes are
+    # preserved. Hard links are not, like rsync without -H.
+
+    def __init__(
+        self,
+        source: Path,
+        destination: Path,
+        exclusions: Iterable[Path] = (),
+        walkers: int = 4,
+        copiers: int = 16,
+        skip: Optional[Set[str]] = None,
+        on_copied: Optional[Callable[[str], None]] = None,
+        progress: Optional[Callable[[int, int], None]] = None,
+    ):
+        self.source = os.fspath(source).rstrip("/") or "/"
+        self.destination = os.fspath(destination)
+        self.exclusions = list(exclusions)
+        self.walkers = walkers
+        self.copiers = copiers
+        self.skip = skip or set()
+        self.on_copied = on_copied
+        # Called with the bytes and files copied so far
+        self.progress = progress
+        self.stats = CopyStats()
+
+        self._lock = threading.Lock()
+        self._slots = threading.BoundedSemaphore(copiers * 4)
+        self._directories: List[Tuple[str, os.stat_result]] = []
+        self._last_report = 0.0
+
+    def _relative(self, path: str) -> str:
+        return os.path.relpath(path, self.source)
+
+    def _target(self, path: str) -> str:
+        return os.path.join(self.destination, self._relative(path))
+
+    def _print_stats(self) -> None:
+        size = humanize.naturalsize(self.stats.bytes)
+        line = f"Copied {self.stats.files} files ({size}), {self.stats.errors} errors"
+        if self.stats.skipped:
+            line = line + f", {self.stats.skipped} skipped"
+        print(line)
+
+    def _failed(self, path: str, error: Exception) -> None:
+        print(f"Cannot copy {path}: {error}")
+        with self._lock:
+            self.stats.errors = self.stats.errors + 1
+
+    def _copied(self, size: int) -> None:
+        with self._lock:
+            self.stats.files = self.stats.files + 1
+            self.stats.bytes = self.stats.bytes + size
+            if self.progress:
+                self.progress(self.stats.bytes, self.stats.files)
+            now = time.monotonic()
+            if now - self._last_report >= 2:
+                self._last_report = now
+                self._print_stats()
+
+    def _copy_file(self, path: str, info: os.stat_result) -> None:
+        try:
+            target = self._target(path)
+            input = os.open(path, os.O_RDONLY)
+            try:
+                flags = os.O_WRONLY | os.O_CREAT | os.O_TRUNC
+                output = os.open(target, flags, 0o600)
+                try:
+                    copied_xattrs = _copy_data(input, output)
+                finally:
+                    os.close(output)
+            finally:
+                os.close(input)
+            if not copied_xattrs:
+                _copy_xattrs(path, target)
+            _copy_metadata(target, info)
+            self._copied(info.st_size)
+            if self.on_copied:
+                self.on_copied(self._relative(path))
+        except Exception as e:
+            self._failed(path, e)
+        finally:
+            self._slots.release()
+
+    def _copy_link(self, path: str, info: os.stat_result) -> None:
+        target = self._target(path)
+        if os.path.lexists(target):
+            os.unlink(target)
+        os.symlink(os.readlink(path), target)
+        _copy_metadata(target, info)
+        self._copied(0)
+
+    def _visit(self, entry: os.DirEntry, pool: ThreadPoolExecutor) -> bool:
+        info = entry.stat(follow_symlinks=False)
+        try:
+            if stat.S_ISDIR(info.st_mode):
+                os.makedirs(self._target(entry.path), exist_ok=True)
+                with self._lock:
+                    self._directories.append((entry.path, info))
+                return True
+            elif stat.S_ISLNK(info.st_mode):
+                self._copy_link(entry.path, info)
+            elif stat.S_ISREG(info.st_mode):
+                if self._relative(entry.path) in self.skip:
+                    with self._lock:
+                        self.stats.skipped = self.stats.skipped + 1
+                    return False
+                # Bound the amount of queued files
+                self._slots.acquire()
+                pool.submit(self._copy_file, entry.path, info)
+        except Exception as e:
+            self._failed(entry.path, e)
+        return False
+
+    def run(self) -> CopyStats:
+        os.makedirs(self.destination, exist_ok=True)
+        walker = ParallelWalker(self.walkers, exclusions=self.exclusions)
+        with ThreadPoolExecutor(self.copiers) as pool:
+            walker.walk(Path(self.source), lambda entry: self._visit(entry, pool))
+
+        # Directory metadata is applied last (deepest first), because copying
+        # their contents changes the timestamps
+        self._directories.sort(key=lambda item: item[0].count(os.sep), reverse=True)
+        self._directories.append((self.source, os.stat(self.source)))
+        for path, info in self._directories:
+            try:
+                target = self._target(path)
+                _copy_xattrs(path, target)
+                _copy_metadata(target, info)
+            except Exception as e:
+                self._failed(path, e)
+
+        self._print_stats()
+        return self.stats
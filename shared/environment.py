@@ -1,50 +1,113 @@
 import os
 import shlex
-import shutil
 import subprocess
 import sys
+from functools import cached_property
 from pathlib import Path
-from typing import List
-import wx.lib.agw.hyperlink as hl
+from typing import List, Tuple
 
 from meta import RAMDISK_NAME, VOLUME_NAME
 
+from .inventory import INVENTORY
 from .utils import command_to_properties
 
-RECOVERY: bool = bool(os.getenv("__OSINSTALL_ENVIRONMENT", ""))
-OS_ROOT: str = "/"
-SOURCE_PATH: str = "/"
-
-if RECOVERY:
-    mount_lines = command_to_properties(["mount"], separator=" on ")
-    candidates: List[str] = [
-        v.split("(")[0].strip()
-        for v in mount_lines.values()
-        if "apfs" in v.split("(")[1]
-    ]
-    # Find the OS_ROOT first
-    for path in candidates:
-        canary_path = os.path.join(path, "usr/bin/rsync")
-        data_canary_path = os.path.join(path, ".fseventsd")
-        if os.path.exists(canary_path) and not os.path.exists(data_canary_path):
-            OS_ROOT = path
-            break
-    # Then find the data volume
-    for path in candidates:
-        data_canary_path = os.path.join(path, ".fseventsd")
-        if path.startswith(OS_ROOT) and os.path.exists(data_canary_path):
-            SOURCE_PATH = path
-            break
-else:
-    data_path = "/System/Volumes/Data"
-    data_canary_path = os.path.join(data_path, ".fseventsd")
-    if os.path.exists(data_canary_path):
-        SOURCE_PATH = data_path
-
-RSYNC_PATH: str = os.path.join(OS_ROOT, "usr/bin/rsync")
-SLURP_PATH: str = os.path.join(
-    OS_ROOT, "System/Library/Filesystems/apfs.fs/Contents/Resources/slurpAPFSMeta"
-)
+
+class Environment:
+    # Paths of the running system. They are detected on first access, since
+    # this requires running `mount` in the recovery environment, and can be
+    # detected again with refresh() after volumes are mounted or unmounted.
+
+    @cached_property
+    def recovery(self) -> bool:
+        return bool(os.getenv("__OSINSTALL_ENVIRONMENT", ""))
+
+    @cached_property
+    def _roots(self) -> Tuple[str, str]:
+        os_root = "/"
+        source_path = "/"
+
+        if self.recovery:
+            candidates: List[str] = [
+                mount.mount_point
+                for mount in INVENTORY.mounts()
+                if mount.filesystem == "apfs"
+            ]
+            # Find the OS_ROOT first
+            for path in candidates:
+                canary_path = os.path.join(path, "usr/bin/rsync")
+                data_canary_path = os.path.join(path, ".fseventsd")
+                if os.path.exists(canary_path) and not os.path.exists(data_canary_path):
+                    os_root = path
+                    break
+            # Then find the data volume
+            for path in candidates:
+                data_canary_path = os.path.join(path, ".fseventsd")
+                if path.startswith(os_root) and os.path.exists(data_canary_path):
+                    source_path = path
+                    break
+        else:
+            data_path = "/System/Volumes/Data"
+            data_canary_path = os.path.join(data_path, ".fseventsd")
+            if os.path.exists(data_canary_path):
+                source_path = data_path
+
+        return os_root, source_path
+
+    @cached_property
+    def os_root(self) -> str:
+        return self._roots[0]
+
+    @cached_property
+    def source_path(self) -> str:
+        return self._roots[1]
+
+    @cached_property
+    def rsync_path(self) -> str:
+        return os.path.join(self.os_root, "usr/bin/rsync")
+
+    @cached_property
+    def slurp_path(self) -> str:
+        return os.path.join(
+            self.os_root,
+            "System/Library/Filesystems/apfs.fs/Contents/Resources/slurpAPFSMeta",
+        )
+
+    def refresh(self) -> None:
+        INVENTORY.invalidate()
+        for name in ("_roots", "os_root", "source_path", "rsync_path", "slurp_path"):
+            self.__dict__.pop(name, None)
+
+
+ENVIRONMENT = Environment()
+# Only an environment variable, so it is cheap to read
+RECOVERY: bool = ENVIRONMENT.recovery
+
+_LAZY_ATTRIBUTES = {
+    "OS_ROOT": "os_root",
+    "SOURCE_PATH": "source_path",
+    "RSYNC_PATH": "rsync_path",
+    "SLURP_PATH": "slurp_path",
+}
+
+
+def __getattr__(name: str):
+    # Module constants kept for compatibility, resolved on first access
+    if name in _LAZY_ATTRIBUTES:
+        return getattr(ENVIRONMENT, _LAZY_ATTRIBUTES[name])
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
+
+
+def serial_number() -> str:
+    # Hardware serial number, if it can be found
+    try:
+        information = command_to_properties(
+            ["ioreg", "-rd1", "-c", "IOPlatformExpertDevice"],
+            separator="=",
+            strip_chars='"<> ',
+        )
+    except (OSError, subprocess.CalledProcessError):
+        return ""
+    return information.get("IOPlatformSerialNumber", "")
 
 
 def current_volume() -> str:
@@ -91,11 +154,11 @@ def attempt_ramdisk() -> None:
         )
 
         # Find the mount point of the RAM disk
-        mount_lines = command_to_properties(["mount"], separator=" on ")
+        INVENTORY.invalidate()
         ramdisk = None
-        for mount_path, description in mount_lines.items():
-            if RAMDISK_NAME in description and ramdisk_device in mount_path:
-                ramdisk = Path(description.split("(")[0].strip())
+        for mount in INVENTORY.mounts():
+            if RAMDISK_NAME in mount.mount_point and ramdisk_device in mount.device:
+                ramdisk = Path(mount.mount_point)
                 break
 
         if not ramdisk:
@@ -141,49 +204,3 @@ def attempt_ramdisk() -> None:
 
     except (subprocess.CalledProcessError, FileNotFoundError):
         print("Aborting RAM disk attempt. Running from original location.")
-
-
-class AdaptiveHyperLinkCtrl(hl.HyperLinkCtrl):
-    def __init__(self, *args, **kwargs):
-        super().__init__(*args, **kwargs)
-
-        # Apple Silicon macOS recovery
-        safari_app = Path("/System/Cryptexes/App/System/Applications/Safari.app")
-        containers = Path("/System/Volumes/Data/private/var/root/Library/Containers")
-
-        # Intel-based macOS recovery
-        if not safari_app.exists():
-            safari_app = Path("/Applications/Safari.app")
-            containers = Path("/private/var/root/Library/Containers")
-
-        self.data_path = containers / "com.apple.Safari" / "Data"
-        self.safari = safari_app / "Contents" / "MacOS" / "Safari"
-
-        self.caches_path = self.data_path / "Library" / "Caches"
-        self.html_name = "redirect.html"
-        self.html_path = self.data_path / self.html_name
-        self.override = RECOVERY and self.safari.exists()
-
-    def GotoURL(self, URL, ReportErrors=True, NotSameWinIfPossible=False):
-        if not self.override:
-            return super().GotoURL(URL, ReportErrors, NotSameWinIfPossible)
-
-        # Space can be very limited, clean temporary cache to be safe
-        shutil.rmtree(self.caches_path, ignore_errors=True)
-
-        # Leverage Safari's ability to open local HTML files to perform the
-        # redirection, since we cannot pass a custom URL directly to it.
-        html_content = f"""<!DOCTYPE html>
-        <html>
-        <head>
-            <script>location.href = "{URL}";</script>
-            <title>Redirect...</title>
-        </head>
-        <body>
-        </body>
-        </html>"""
-        self.data_path.mkdir(parents=True, exist_ok=True)
-        self.html_path.write_text(html_content)
-
-        subprocess.Popen([self.safari, self.html_name])
-        return True
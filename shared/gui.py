@@ -0,0 +1,64 @@
+import shutil
+import subprocess
+from pathlib import Path
+from typing import Optional
+
+import wx.lib.agw.hyperlink as hl
+from wx import Control, Font
+
+from shared.environment import RECOVERY
+
+
+def set_font(widget: Control, size: Optional[int] = None, weight: Optional[int] = None):
+    font: Font = widget.GetFont()
+    if size is not None:
+        font.SetPointSize(size)
+    if weight is not None:
+        font.SetWeight(weight)
+    widget.SetFont(font)
+
+
+class AdaptiveHyperLinkCtrl(hl.HyperLinkCtrl):
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+
+        # Apple Silicon macOS recovery
+        safari_app = Path("/System/Cryptexes/App/System/Applications/Safari.app")
+        containers = Path("/System/Volumes/Data/private/var/root/Library/Containers")
+
+        # Intel-based macOS recovery
+        if not safari_app.exists():
+            safari_app = Path("/Applications/Safari.app")
+            containers = Path("/private/var/root/Library/Containers")
+
+        self.data_path = containers / "com.apple.Safari" / "Data"
+        self.safari = safari_app / "Contents" / "MacOS" / "Safari"
+
+        self.caches_path = self.data_path / "Library" / "Caches"
+        self.html_name = "redirect.html"
+        self.html_path = self.data_path / self.html_name
+        self.override = RECOVERY and self.safari.exists()
+
+    def GotoURL(self, URL, ReportErrors=True, NotSameWinIfPossible=False):
+        if not self.override:
+            return super().GotoURL(URL, ReportErrors, NotSameWinIfPossible)
+
+        # Space can be very limited, clean temporary cache to be safe
+        shutil.rmtree(self.caches_path, ignore_errors=True)
+
+        # Leverage Safari's ability to open local HTML files to perform the
+        # redirection, since we cannot pass a custom URL directly to it.
+        html_content = f"""<!DOCTYPE html>
+        <html>
+        <head>
+            <script>location.href = "{URL}";</script>
+            <title>Redirect...</title>
+        </head>
+        <body>
+        </body>
+        </html>"""
+        self.data_path.mkdir(parents=True, exist_ok=True)
+        self.html_path.write_text(html_content)
+
+        subprocess.Popen([self.safari, self.html_name])
+        return True
@@ -0,0 +1,110 @@
+import os
+import struct
+import time
+import zlib
+from collections import deque
+from concurrent.futures import Future, ThreadPoolExecutor
+from typing import BinaryIO, Callable, Deque, Optional, Tuple
+
+from .process import Sink
+from .zipwriter import crc32_combine
+
+BLOCK_SIZE = 1024 * 1024
+# Deflate can refer back to the last 32 KiB of data
+WINDOW_SIZE = 32 * 1024
+# Empty final block, closing the deflate stream
+FINAL_BLOCK = b"\x03\x00"
+
+
+def _deflate_block(data: bytes, dictionary: bytes, level: int) -> Tuple[int, bytes]:
+    # Every block ends with a sync flush, so blocks can be concatenated. The
+    # end of the previous block is used as a dictionary, like pigz does, so
+    # the compression ratio is close to the one of a single stream.
+    if dictionary:
+        compressor = zlib.compressobj(level, zlib.DEFLATED, -15, zdict=dictionary)
+    else:
+        compressor = zlib.compressobj(level, zlib.DEFLATED, -15)
+    compressed = compressor.compress(data) + compressor.flush(zlib.Z_SYNC_FLUSH)
+    return zlib.crc32(data), compressed
+
+
+class ParallelGzipWriter(Sink):
+    # Gzip stream compressed in blocks on a thread pool. Data is accepted as
+    # it is produced (e.g. the output of a process) and the compressed blocks
+    # are written in order. The number of blocks in flight is bounded, so a
+    # fast producer waits for the compression to catch up.
+
+    def __init__(
+        self,
+        output: BinaryIO,
+        workers: Optional[int] = None,
+        level: int = 6,
+        block_size: int = BLOCK_SIZE,
+        progress: Optional[Callable[[int], None]] = None,
+    ):
+        self.output = output
+        self.workers = workers or os.cpu_count() or 4
+        self.level = level
+        self.block_size = block_size
+        self.progress = progress
+        self.size = 0
+        self.compressed_size = 0
+
+        self._pool = ThreadPoolExecutor(self.workers)
+        self._pending: Deque[Tuple[int, Future]] = deque()
+        self._buffer = bytearray()
+        self._dictionary = b""
+        self._crc = 0
+        self._closed = False
+
+        # Header without file name, with the current time
+        header = struct.pack("<BBBBIBB", 0x1F, 0x8B, 8, 0, int(time.time()), 0, 3)
+        self._write(header)
+
+    def _write(self, data: bytes) -> None:
+        self.output.write(data)
+        self.compressed_size = self.compressed_size + len(data)
+
+    def _drain(self, limit: int) -> None:
+        while len(self._pending) > limit:
+            size, future = self._pending.popleft()
+            crc, compressed = future.result()
+            self._crc = crc32_combine(self._crc, crc, size)
+            self._write(compressed)
+            self.size = self.size + size
+            if self.progress:
+                self.progress(self.size)
+
+    def _submit(self, block: bytes) -> None:
+        future = self._pool.submit(_deflate_block, block, self._dictionary, self.level)
+        self._pending.append((len(block), future))
+        self._dictionary = block[-WINDOW_SIZE:]
+        self._drain(self.workers * 2)
+
+    def write(self, data: bytes) -> None:
+        self._buffer.extend(data)
+        while len(self._buffer) >= self.block_size:
+            block = bytes(self._buffer[: self.block_size])
+            del self._buffer[: self.block_size]
+            self._submit(block)
+
+    def close(self) -> None:
+        if self._closed:
+            return
+        self._closed = True
+        try:
+            if self._buffer:
+                self._submit(bytes(self._buffer))
+                self._buffer.clear()
+            self._drain(0)
+        finally:
+            self._pool.shutdown()
+        self._write(FINAL_BLOCK)
+        self._write(struct.pack("<II", self._crc, self.size & 0xFFFFFFFF))
+        self.output.flush()
+
+    def __enter__(self) -> "ParallelGzipWriter":
+        return self
+
+    def __exit__(self, *args) -> None:
+        self.close()
@@ -0,0 +1,157 @@
+import hashlib
+import mmap
+import os
+import queue
+import shutil
+import threading
+from pathlib import Path
+from typing import Callable, Dict, Iterable, List, Optional
+
+DEFAULT_ALGORITHMS = ("md5", "sha1", "sha256")
+# Blocks are a multiple of the allocation granularity, so they can also be used
+# as offsets when the file is memory mapped
+BLOCK_SIZE = 4 * 1024 * 1024 - (4 * 1024 * 1024) % mmap.ALLOCATIONGRANULARITY
+
+ProgressCallback = Callable[[int], None]
+
+
+class MultiHasher:
+    # Every digest is updated by its own worker thread. Hashlib releases the GIL
+    # while hashing large buffers, so the digests are computed in parallel and
+    # the caller only pays for queueing the blocks.
+
+    def __init__(self, algorithms: Iterable[str] = DEFAULT_ALGORITHMS, depth=4):
+        self.algorithms = tuple(algorithms)
+        self._queues: List[queue.Queue] = []
+        self._threads: List[threading.Thread] = []
+        self._results: Dict[str, str] = {}
+        self._finished = False
+
+        for algorithm in self.algorithms:
+            digest = hashlib.new(algorithm)
+            blocks: queue.Queue = queue.Queue(maxsize=depth)
+            thread = threading.Thread(
+                target=self._work, args=(algorithm, digest, blocks), daemon=True
+            )
+            thread.start()
+            self._queues.append(blocks)
+            self._threads.append(thread)
+
+    def _work(self, algorithm: str, digest, blocks: queue.Queue) -> None:
+        while True:
+            block = blocks.get()
+            if block is None:
+                break
+            digest.update(block)
+        self._results[algorithm] = digest.hexdigest()
+
+    def update(self, data) -> None:
+        # The data must not be modified after being passed to this method
+        for blocks in self._queues:
+            blocks.put(data)
+
+    def hexdigests(self) -> Dict[str, str]:
+        if not self._finished:
+            self._finished = True
+            for blocks in self._queues:
+                blocks.put(None)
+            for thread in self._threads:
+                thread.join()
+        return dict(self._results)
+
+    def __enter__(self) -> "MultiHasher":
+        return self
+
+    def __exit__(self, *args) -> None:
+        self.hexdigests()
+
+
+def hash_file(
+    path: Path,
+    algorithms: Iterable[str] = DEFAULT_ALGORITHMS,
+    block_size: int = BLOCK_SIZE,
+    use_mmap: bool = False,
+    progress: Optional[ProgressCallback] = None,
+) -> Dict[str, str]:
+    total_size = os.stat(path).st_size
+    amount = 0
+
+    with open(path, "rb", buffering=0) as f, MultiHasher(algorithms) as hasher:
+        if use_mmap and total_size > 0:
+            with mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mapped:
+                view = memoryview(mapped)
+                try:
+                    while amount < total_size:
+                        hasher.update(view[amount : amount + block_size])
+                        amount = min(amount + block_size, total_size)
+                        if progress:
+                            progress(amount)
+                finally:
+                    # Blocks must be consumed before the mapping is closed
+                    digests = hasher.hexdigests()
+                    view.release()
+        else:
+            while True:
+                chunk = f.read(block_size)
+                if not chunk:
+                    break
+                hasher.update(chunk)
+                amount = amount + len(chunk)
+                if progress:
+                    progress(amount)
+            digests = hasher.hexdigests()
+
+    return digests
+
+
+def copy_and_hash(
+    source: Path,
+    destination: Path,
+    algorithms: Iterable[str] = DEFAULT_ALGORITHMS,
+    block_size: int = BLOCK_SIZE,
+    progress: Optional[ProgressCallback] = None,
+) -> Dict[str, str]:
+    # Copy a file while hashing the copied bytes, so the destination does not
+    # need to be read again. Writing happens on a separate thread to overlap it
+    # with reading.
+    amount = 0
+    blocks: queue.Queue = queue.Queue(maxsize=4)
+    errors: List[BaseException] = []
+
+    def write(output) -> None:
+        while True:
+            block = blocks.get()
+            if block is None:
+                break
+            if errors:
+                # Keep draining the queue after a failure
+                continue
+            try:
+                output.write(block)
+            except BaseException as e:
+                errors.append(e)
+
+    with open(source, "rb", buffering=0) as input, open(destination, "wb") as output:
+        writer = threading.Thread(target=write, args=(output,), daemon=True)
+        writer.start()
+        with MultiHasher(algorithms) as hasher:
+            try:
+                while not errors:
+                    chunk = input.read(block_size)
+                    if not chunk:
+                        break
+                    hasher.update(chunk)
+                    blocks.put(chunk)
+                    amount = amount + len(chunk)
+                    if progress:
+                        progress(amount)
+            finally:
+                blocks.put(None)
+                writer.join()
+            digests = hasher.hexdigests()
+
+    if errors:
+        raise errors[0]
+
+    shutil.copymode(source, destination)
+    return digests
@@ -0,0 +1,240 @@
+import os
+import re
+import subprocess
+import threading
+import time
+from dataclasses import dataclass, field
+from pathlib import Path
+from typing import Dict, Iterable, List, Optional, Tuple
+
+from .utils import lines_to_properties
+
+MOUNT_LINE = re.compile(r"^(.+?) on (.+) \(([^)]*)\)$")
+
+
+@dataclass
+class MountInfo:
+    device: str
+    mount_point: str
+    filesystem: str = ""
+    options: Tuple[str, ...] = ()
+
+
+@dataclass
+class DiskSpaceInfo:
+    identifier: str = ""
+    size: int = 0
+    used_space: int = 0
+    free_space: int = 0
+    mount_point: str = ""
+
+
+@dataclass
+class PartitionInfo:
+    indent: int = 0
+    type: str = ""
+    name: str = ""
+    size: str = ""
+    identifier: str = ""
+    status: str = ""
+    disk_space: Optional[DiskSpaceInfo] = None
+
+
+@dataclass
+class DeviceInfo:
+    node: str
+    status: str = ""
+    partitions: List[PartitionInfo] = field(default_factory=list)
+
+
+@dataclass
+class VolumeInfo:
+    # Output of `diskutil info` for a mount point
+    mount_point: str
+    device: str = ""
+    filesystem: str = ""
+    text: str = ""
+
+
+def _output(arguments: List[str]) -> str:
+    # Tools like df print useful information even when they fail on some
+    # volumes, hence the status code is ignored
+    p = subprocess.run(arguments, capture_output=True, universal_newlines=True)
+    return p.stdout
+
+
+def _parse_stanza(stanza: str, space: Dict[str, DiskSpaceInfo]) -> DeviceInfo:
+    lines = stanza.splitlines()
+    first, second = lines[:2]
+    status = ""
+    if "(" in first:
+        status = first.split("(")[1].split(")")[0]
+    device = DeviceInfo(node=first.split()[0].rstrip(":"), status=status)
+    pivot_1 = second.index(":") + 1
+    pivot_2 = second.index(" NAME")
+    pivot_3 = second.index(" SIZE")
+    pivot_4 = second.index(" IDENTIFIER")
+
+    is_disk = True
+    for line in lines[2:]:
+        type = line[pivot_1 + 1 : pivot_2].strip()
+        name = line[pivot_2:pivot_3].strip()
+        size = line[pivot_3 + 1 : pivot_4].strip()
+        identifier = line[pivot_4:].strip()
+        if not identifier:
+            continue
+        indent = identifier[4:].count("s")
+        if identifier == "-":
+            indent = 1
+        device.partitions.append(
+            PartitionInfo(
+                indent=indent,
+                type=type,
+                name=name,
+                size=size,
+                identifier=identifier,
+                status=status if is_disk else "",
+                disk_space=space.get(identifier),
+            )
+        )
+        is_disk = False
+    return device
+
+
+class DiskInventory:
+    # Mounts, free space and disk layout of the system, collected once by
+    # running mount, df and diskutil and then shared by every caller. The
+    # tables are dropped after a while, or explicitly with invalidate()
+    # whenever volumes are attached or detached.
+
+    def __init__(self, ttl: float = 30):
+        self.ttl = ttl
+        self._lock = threading.RLock()
+        self.invalidate()
+
+    def invalidate(self) -> None:
+        with self._lock:
+            self._loaded = time.monotonic()
+            self._mounts: Optional[List[MountInfo]] = None
+            self._by_mount_point: Dict[str, MountInfo] = {}
+            self._by_device: Dict[str, List[MountInfo]] = {}
+            self._by_st_dev: Optional[Dict[int, MountInfo]] = None
+            self._space: Optional[Dict[str, DiskSpaceInfo]] = None
+            self._devices: Optional[List[DeviceInfo]] = None
+            self._volumes: Dict[str, VolumeInfo] = {}
+
+    def _check_expired(self) -> None:
+        if time.monotonic() - self._loaded > self.ttl:
+            self.invalidate()
+
+    def mounts(self) -> List[MountInfo]:
+        with self._lock:
+            self._check_expired()
+            if self._mounts is None:
+                self._mounts = []
+                for line in _output(["mount"]).splitlines():
+                    match = MOUNT_LINE.match(line)
+                    if not match:
+                        continue
+                    device, mount_point, details = match.groups()
+                    options = tuple(o.strip() for o in details.split(","))
+                    mount = MountInfo(device, mount_point, options[0], options[1:])
+                    self._mounts.append(mount)
+                    self._by_mount_point[mount_point] = mount
+                    self._by_device.setdefault(device, []).append(mount)
+            return self._mounts
+
+    def mount_at(self, path: Path) -> Optional[MountInfo]:
+        with self._lock:
+            self.mounts()
+            return self._by_mount_point.get(f"{path}")
+
+    def mounts_of_device(self, device: str) -> List[MountInfo]:
+        with self._lock:
+            self.mounts()
+            return self._by_device.get(device, [])
+
+    def mount_for_st_dev(self, st_dev: int) -> Optional[MountInfo]:
+        with self._lock:
+            mounts = self.mounts()
+            if self._by_st_dev is None:
+                self._by_st_dev = {}
+                for mount in mounts:
+                    try:
+                        key = os.stat(mount.mount_point).st_dev
+                    except OSError:
+                        continue
+                    self._by_st_dev.setdefault(key, mount)
+            return self._by_st_dev.get(st_dev)
+
+    def mount_point(self, path: Path) -> Path:
+        # Closest mount point containing the path, looked up in the mount
+        # table instead of checking every parent directory
+        path = Path(os.path.realpath(path))
+        with self._lock:
+            known = bool(self.mounts())
+            while path != path.parent:
+                if known and f"{path}" in self._by_mount_point:
+                    break
+                if not known and path.is_mount():
+                    break
+                path = path.parent
+        return path
+
+    def space(self) -> Dict[str, DiskSpaceInfo]:
+        # Usage of the mounted disks, indexed by identifier (e.g. disk1s1)
+        with self._lock:
+            self._check_expired()
+            if self._space is None:
+                self._space = {}
+                for line in _output(["df"]).splitlines():
+                    if not line.startswith("/dev/disk"):
+                        continue
+                    identifier, size, used, free, _, _, _, _, mount_point = re.split(
+                        r"\s+", line, maxsplit=8
+                    )
+                    self._space[identifier[5:]] = DiskSpaceInfo(
+                        identifier=identifier,
+                        size=int(size) * 512,
+                        used_space=int(used) * 512,
+                        free_space=int(free) * 512,
+                        mount_point=mount_point,
+                    )
+            return self._space
+
+    def devices(self) -> List[DeviceInfo]:
+        with self._lock:
+            self._check_expired()
+            if self._devices is None:
+                space = self.space()
+                stanzas = _output(["diskutil", "list"]).strip().split("\n\n")
+                self._devices = [
+                    _parse_stanza(stanza, space)
+                    for stanza in stanzas
+                    if stanza.startswith("/dev/")
+                ]
+            return self._devices
+
+    def partitions(self) -> Iterable[PartitionInfo]:
+        for device in self.devices():
+            yield from device.partitions
+
+    def volume(self, mount_point: Path) -> VolumeInfo:
+        key = f"{mount_point}"
+        with self._lock:
+            self._check_expired()
+            if key not in self._volumes:
+                text = subprocess.check_output(
+                    ["diskutil", "info", key], universal_newlines=True
+                )
+                properties = lines_to_properties(text.splitlines())
+                self._volumes[key] = VolumeInfo(
+                    mount_point=key,
+                    device=properties.get("Device Node", ""),
+                    filesystem=properties.get("Type (Bundle)", ""),
+                    text=text,
+                )
+            return self._volumes[key]
+
+
+INVENTORY = DiskInventory()
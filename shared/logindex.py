@@ -0,0 +1,173 @@
+import gzip
+import json
+import sqlite3
+from dataclasses import dataclass
+from pathlib import Path
+from typing import Callable, Dict, Iterator, List, Optional, Tuple
+
+from .unifiedlog import parse_time
+
+# SQLite index of the unified logs exported as NDJSON. Process, subsystem and
+# category names repeat a lot, so they are stored once in a table of names
+# and referenced by number. The message is searchable with FTS5, when the
+# SQLite library provides it, through an external-content table which does
+# not duplicate the text. The `logs` view joins everything back:
+#
+#     SELECT time, process, message FROM logs
+#     WHERE subsystem = 'com.apple.xpc' AND timestamp > 1700000000
+#
+#     SELECT time, process, message FROM logs
+#     WHERE id IN (SELECT rowid FROM messages WHERE messages MATCH 'sandbox')
+#
+# The id of a record is its line number in the NDJSON file, where all other
+# fields can be found.
+
+BATCH_SIZE = 10000
+CACHE_KIB = 64 * 1024
+
+SCHEMA = """
+CREATE TABLE names (id INTEGER PRIMARY KEY, name TEXT NOT NULL UNIQUE);
+CREATE TABLE records (
+    id INTEGER PRIMARY KEY,
+    timestamp REAL,
+    type INTEGER,
+    pid INTEGER,
+    process INTEGER,
+    subsystem INTEGER,
+    category INTEGER,
+    message TEXT
+);
+CREATE VIEW logs AS
+    SELECT r.id, r.timestamp, datetime(r.timestamp, 'unixepoch') AS time,
+        t.name AS type, r.pid,
+        p.name AS process, s.name AS subsystem, c.name AS category, r.message
+    FROM records r
+    LEFT JOIN names t ON t.id = r.type
+    LEFT JOIN names p ON p.id = r.process
+    LEFT JOIN names s ON s.id = r.subsystem
+    LEFT JOIN names c ON c.id = r.category;
+"""
+
+# Created after loading the data, which is much faster than updating them
+INDEXES = """
+CREATE INDEX records_timestamp ON records (timestamp);
+CREATE INDEX records_process ON records (process, timestamp);
+CREATE INDEX records_subsystem ON records (subsystem, category, timestamp);
+"""
+
+FTS_SCHEMA = """
+CREATE VIRTUAL TABLE messages USING fts5(
+    message, content='records', content_rowid='id'
+);
+"""
+
+
+@dataclass
+class LogIndexStats:
+    records: int = 0
+    malformed: int = 0
+    names: int = 0
+    full_text: bool = False
+
+
+def fts5_available() -> bool:
+    try:
+        with sqlite3.connect(":memory:") as connection:
+            connection.execute("CREATE VIRTUAL TABLE test USING fts5(text)")
+        return True
+    except sqlite3.OperationalError:
+        return False
+
+
+def _lines(path: Path) -> Iterator[bytes]:
+    opener = gzip.open if path.suffix == ".gz" else open
+    with opener(path, "rb") as source:  # type: ignore
+        yield from source
+
+
+class _Names:
+    # Numbers of the names seen so far. The number of distinct names is
+    # small, so they are kept in memory.
+
+    def __init__(self, connection: sqlite3.Connection):
+        self.connection = connection
+        self.ids: Dict[str, int] = {}
+
+    def get(self, name: Optional[str]) -> Optional[int]:
+        if not name:
+            return None
+        number = self.ids.get(name)
+        if number is None:
+            number = len(self.ids) + 1
+            self.ids[name] = number
+            self.connection.execute("INSERT INTO names VALUES (?, ?)", (number, name))
+        return number
+
+
+def _row(line: int, record: Dict, names: _Names) -> Tuple:
+    time = record.get("timestamp") or ""
+    image = record.get("processImagePath") or ""
+    return (
+        line,
+        parse_time(time) if time else None,
+        names.get(record.get("messageType") or record.get("eventType")),
+        record.get("processID"),
+        names.get(image.rsplit("/", 1)[-1]),
+        names.get(record.get("subsystem")),
+        names.get(record.get("category")),
+        record.get("eventMessage") or "",
+    )
+
+
+def build_log_index(
+    source: Path,
+    database: Path,
+    full_text: bool = True,
+    progress: Optional[Callable[[int], None]] = None,
+) -> LogIndexStats:
+    # Stream the NDJSON (optionally gzipped) once, inserting records in
+    # batches, so that the memory used does not depend on the size of the logs
+    stats = LogIndexStats(full_text=full_text and fts5_available())
+    database.unlink(missing_ok=True)
+    connection = sqlite3.connect(database)
+    try:
+        # A new file is built from scratch, thus it needs no journal
+        connection.execute("PRAGMA journal_mode=OFF")
+        connection.execute("PRAGMA synchronous=OFF")
+        connection.execute(f"PRAGMA cache_size=-{CACHE_KIB}")
+        connection.executescript(SCHEMA)
+        names = _Names(connection)
+
+        query = "INSERT INTO records VALUES (?, ?, ?, ?, ?, ?, ?, ?)"
+        batch: List[Tuple] = []
+        amount = 0
+        for number, line in enumerate(_lines(source), 1):
+            amount = amount + len(line)
+            try:
+                record = json.loads(line)
+            except ValueError:
+                stats.malformed = stats.malformed + 1
+                continue
+            if not isinstance(record, dict):
+                stats.malformed = stats.malformed + 1
+                continue
+            batch.append(_row(number, record, names))
+            if len(batch) >= BATCH_SIZE:
+                connection.executemany(query, batch)
+                stats.records = stats.records + len(batch)
+                batch = []
+                if progress:
+                    progress(amount)
+        connection.executemany(query, batch)
+        stats.records = stats.records + len(batch)
+
+        connection.executescript(INDEXES)
+        if stats.full_text:
+            connection.executescript(FTS_SCHEMA)
+            connection.execute("INSERT INTO messages(messages) VALUES ('rebuild')")
+        connection.commit()
+        connection.execute("ANALYZE")
+        stats.names = len(names.ids)
+    finally:
+        connection.close()
+    return stats
@@ -0,0 +1,103 @@
+import csv
+import hashlib
+import os
+import stat
+from concurrent.futures import FIRST_COMPLETED, Future, ThreadPoolExecutor, wait
+from datetime import datetime, timezone
+from pathlib import Path
+from typing import Iterator, List, Optional, Set
+
+MANIFEST_FIELDS = [
+    "path",
+    "size",
+    "modified",
+    "accessed",
+    "changed",
+    "created",
+    "sha256",
+]
+CHUNK_SIZE = 1024 * 1024
+
+
+def _timestamp(value: Optional[float]) -> str:
+    if value is None:
+        return ""
+    moment = datetime.fromtimestamp(value, tz=timezone.utc)
+    return moment.isoformat()
+
+
+def _walk(root: Path) -> Iterator[os.DirEntry]:
+    # Iterative walk, so deep trees do not hit the recursion limit
+    pending = [root]
+    while pending:
+        directory = pending.pop()
+        try:
+            with os.scandir(directory) as entries:
+                for entry in entries:
+                    if entry.is_dir(follow_symlinks=False):
+                        pending.append(Path(entry.path))
+                    yield entry
+        except OSError as e:
+            print(f"Cannot list {directory}: {e}")
+
+
+def _describe(entry: os.DirEntry, root: Path) -> List[str]:
+    info = entry.stat(follow_symlinks=False)
+    digest = ""
+    if stat.S_ISREG(info.st_mode):
+        sha256 = hashlib.sha256()
+        try:
+            with open(entry.path, "rb", buffering=0) as f:
+                while True:
+                    chunk = f.read(CHUNK_SIZE)
+                    if not chunk:
+                        break
+                    sha256.update(chunk)
+            digest = sha256.hexdigest()
+        except OSError as e:
+            print(f"Cannot hash {entry.path}: {e}")
+
+    relative = Path(entry.path).relative_to(root).as_posix()
+    return [
+        relative,
+        f"{info.st_size}",
+        _timestamp(info.st_mtime),
+        _timestamp(info.st_atime),
+        _timestamp(info.st_ctime),
+        _timestamp(getattr(info, "st_birthtime", None)),
+        digest,
+    ]
+
+
+def write_manifest(root: Path, output: Path, workers: Optional[int] = None) -> int:
+    # Hash every file below root on a thread pool and stream the rows to a CSV
+    # file as soon as they are ready. Only a bounded number of files is in
+    # flight, so memory does not depend on the size of the tree.
+    workers = workers or os.cpu_count() or 4
+    limit = workers * 4
+    count = 0
+
+    with open(output, "w", newline="") as f, ThreadPoolExecutor(workers) as pool:
+        writer = csv.writer(f)
+        writer.writerow(MANIFEST_FIELDS)
+
+        running: Set[Future] = set()
+
+        def collect(done: Set[Future]) -> None:
+            nonlocal count
+            for future in done:
+                try:
+                    writer.writerow(future.result())
+                    count = count + 1
+                except OSError as e:
+                    print(f"Cannot read file metadata: {e}")
+
+        for entry in _walk(root):
+            if len(running) >= limit:
+                done, running = wait(running, return_when=FIRST_COMPLETED)
+                collect(done)
+            running.add(pool.submit(_describe, entry, root))
+
+        collect(wait(running).done)
+
+    return count
@@ -0,0 +1,173 @@
+import codecs
+import os
+import selectors
+import subprocess
+import sys
+import threading
+from collections import deque
+from pathlib import Path
+from typing import IO, Callable, Deque, Dict, Iterable, List, Optional, Tuple
+
+READ_SIZE = 64 * 1024
+
+
+class Sink:
+    # Receives the raw output of a process, as it is produced
+
+    def write(self, data: bytes) -> None:
+        pass
+
+    def close(self) -> None:
+        pass
+
+
+class ConsoleSink(Sink):
+    # Decodes the output and writes it to the current standard output, which
+    # might be redirected to the user interface
+    def __init__(self, encoding="utf-8"):
+        self.decoder = codecs.getincrementaldecoder(encoding)("ignore")
+
+    def write(self, data: bytes) -> None:
+        text = self.decoder.decode(data)
+        if text:
+            sys.stdout.write(text)
+
+    def close(self) -> None:
+        text = self.decoder.decode(b"", final=True)
+        if text:
+            sys.stdout.write(text)
+
+
+class CaptureSink(Sink):
+    # Keeps (at least) the last `limit` bytes of output in memory
+    def __init__(self, limit=1024000):
+        self.limit = limit
+        self.chunks: Deque[bytes] = deque()
+        self.size = 0
+
+    def write(self, data: bytes) -> None:
+        self.chunks.append(data)
+        self.size = self.size + len(data)
+        while self.size - len(self.chunks[0]) >= self.limit:
+            self.size = self.size - len(self.chunks.popleft())
+
+    def getvalue(self, encoding="utf-8") -> str:
+        return b"".join(self.chunks).decode(encoding, "ignore")
+
+
+class FileSink(Sink):
+    def __init__(self, path: Path):
+        self.file = open(path, "ab")
+
+    def write(self, data: bytes) -> None:
+        self.file.write(data)
+
+    def close(self) -> None:
+        self.file.close()
+
+
+def run_process(
+    arguments: List[str],
+    sinks: Iterable[Sink] = (),
+    redirect: Optional[Path] = None,
+    heartbeat: Optional[Callable[[], None]] = None,
+    interval: Optional[float] = None,
+    output: Optional[Sink] = None,
+) -> int:
+    # Run a process without a shell and stream its output to the sinks. The
+    # loop only wakes up when there is new output or when the process exits,
+    # unless a heartbeat interval is given. If the standard output is
+    # redirected to a file or to the output sink, the sinks receive the
+    # standard error.
+    sinks = list(sinks)
+    separate = redirect is not None or output is not None
+    output_file = open(redirect, "wb") if redirect is not None else None
+    try:
+        process = subprocess.Popen(
+            arguments,
+            stdout=output_file or subprocess.PIPE,
+            stderr=subprocess.PIPE if separate else subprocess.STDOUT,
+        )
+    except OSError as e:
+        # Same status codes as a shell, for missing or non-executable commands
+        message = f"{arguments[0]}: {e.strerror}\n".encode()
+        for sink in sinks:
+            sink.write(message)
+            sink.close()
+        if output is not None:
+            output.close()
+        return 127 if isinstance(e, FileNotFoundError) else 126
+    finally:
+        if output_file:
+            output_file.close()
+
+    def forward(data: bytes) -> None:
+        for sink in sinks:
+            sink.write(data)
+
+    # Destination of the data read from every pipe
+    streams: Dict[int, Tuple[IO[bytes], Callable[[bytes], None]]] = {}
+    error_stream = process.stderr if separate else process.stdout
+    assert error_stream is not None
+    streams[error_stream.fileno()] = (error_stream, forward)
+    if output is not None:
+        stdout = process.stdout
+        assert stdout is not None
+        streams[stdout.fileno()] = (stdout, output.write)
+
+    # Exit is signaled through a pipe, so it can be selected like the output.
+    # Some tools leave children holding the output open after exiting.
+    exit_read, exit_write = os.pipe()
+
+    def wait() -> None:
+        process.wait()
+        os.write(exit_write, b"x")
+
+    waiter = threading.Thread(target=wait, daemon=True)
+    waiter.start()
+
+    try:
+        with selectors.DefaultSelector() as selector:
+            open_fds = set(streams)
+            for fd in open_fds:
+                selector.register(fd, selectors.EVENT_READ)
+            selector.register(exit_read, selectors.EVENT_READ)
+            exited = False
+            while open_fds and not exited:
+                events = selector.select(interval)
+                if not events and heartbeat:
+                    heartbeat()
+                for key, _ in events:
+                    if key.fd == exit_read:
+                        exited = True
+                        continue
+                    data = os.read(key.fd, READ_SIZE)
+                    if data:
+                        streams[key.fd][1](data)
+                    else:
+                        open_fds.discard(key.fd)
+                        selector.unregister(key.fd)
+
+            # Collect whatever was written right before exiting
+            for fd in open_fds:
+                os.set_blocking(fd, False)
+                while True:
+                    try:
+                        data = os.read(fd, READ_SIZE)
+                    except BlockingIOError:
+                        break
+                    if not data:
+                        break
+                    streams[fd][1](data)
+    finally:
+        for stream, _ in streams.values():
+            stream.close()
+        waiter.join()
+        os.close(exit_read)
+        os.close(exit_write)
+        for sink in sinks:
+            sink.close()
+        if output is not None:
+            output.close()
+
+    return process.returncode
@@ -0,0 +1,265 @@
+import codecs
+import copy
+import os
+import re
+import threading
+import time
+from dataclasses import dataclass
+from datetime import timedelta
+from typing import Callable, List, Optional
+
+import humanize
+
+from shared.process import Sink
+
+# Weight of the latest measurement in the smoothed rate
+RATE_SMOOTHING = 0.3
+RATE_INTERVAL = 1.0
+
+
+@dataclass
+class StageProgress:
+    name: str
+    bytes_done: int = 0
+    bytes_total: int = 0
+    files_done: int = 0
+    files_total: int = 0
+    rate: float = 0.0
+    started: float = 0.0
+    finished: Optional[float] = None
+
+    @property
+    def elapsed(self) -> float:
+        end = self.finished if self.finished is not None else time.monotonic()
+        return end - self.started
+
+    @property
+    def fraction(self) -> Optional[float]:
+        if self.bytes_total > 0:
+            return min(self.bytes_done / self.bytes_total, 1.0)
+        if self.files_total > 0:
+            return min(self.files_done / self.files_total, 1.0)
+        return None
+
+    @property
+    def average_rate(self) -> float:
+        elapsed = self.elapsed
+        return self.bytes_done / elapsed if elapsed > 0 else 0.0
+
+    @property
+    def eta(self) -> Optional[float]:
+        if self.finished is not None:
+            return 0.0
+        remaining = self.bytes_total - self.bytes_done
+        if self.bytes_total <= 0 or remaining <= 0 or self.rate <= 0:
+            return None
+        return remaining / self.rate
+
+    def describe(self) -> str:
+        parts = []
+        if self.bytes_total:
+            done = humanize.naturalsize(self.bytes_done)
+            total = humanize.naturalsize(self.bytes_total)
+            parts.append(f"{done} of {total}")
+        elif self.bytes_done:
+            parts.append(humanize.naturalsize(self.bytes_done))
+        if self.files_total:
+            parts.append(f"{self.files_done:,} of {self.files_total:,} files")
+        elif self.files_done:
+            parts.append(f"{self.files_done:,} files")
+
+        rate = self.rate if self.finished is None else self.average_rate
+        if rate > 0:
+            parts.append(f"{humanize.naturalsize(rate)}/s")
+        if self.finished is not None:
+            parts.append(f"took {timedelta(seconds=round(self.elapsed))}")
+        else:
+            eta = self.eta
+            if eta is not None:
+                parts.append(f"ETA {timedelta(seconds=round(eta))}")
+
+        details = ", ".join(parts)
+        return f"{self.name}: {details}" if details else self.name
+
+
+class ProgressTracker:
+    # Progress of the acquisition pipeline. Stages report into it from the
+    # worker threads, while the user interface reads snapshots.
+
+    def __init__(self):
+        self.stages: List[StageProgress] = []
+        self._lock = threading.Lock()
+        self._rate_time = 0.0
+        self._rate_bytes = 0
+
+    def reset(self) -> None:
+        with self._lock:
+            self.stages = []
+
+    def _finish_current(self, now: float) -> None:
+        if self.stages and self.stages[-1].finished is None:
+            self.stages[-1].finished = now
+
+    def start(self, name: str, bytes_total=0, files_total=0) -> None:
+        with self._lock:
+            now = time.monotonic()
+            self._finish_current(now)
+            stage = StageProgress(
+                name, bytes_total=bytes_total, files_total=files_total, started=now
+            )
+            self.stages.append(stage)
+            self._rate_time = now
+            self._rate_bytes = 0
+
+    def finish(self) -> None:
+        with self._lock:
+            self._finish_current(time.monotonic())
+
+    def update(
+        self,
+        bytes_done: Optional[int] = None,
+        files_done: Optional[int] = None,
+        bytes_total: Optional[int] = None,
+        files_total: Optional[int] = None,
+    ) -> None:
+        with self._lock:
+            if not self.stages or self.stages[-1].finished is not None:
+                return
+            stage = self.stages[-1]
+            if bytes_total is not None:
+                stage.bytes_total = bytes_total
+            if files_total is not None:
+                stage.files_total = files_total
+            if files_done is not None:
+                stage.files_done = files_done
+            if bytes_done is not None:
+                stage.bytes_done = bytes_done
+                now = time.monotonic()
+                delta = now - self._rate_time
+                if delta >= RATE_INTERVAL:
+                    current = (bytes_done - self._rate_bytes) / delta
+                    if stage.rate:
+                        current = (
+                            RATE_SMOOTHING * current + (1 - RATE_SMOOTHING) * stage.rate
+                        )
+                    stage.rate = max(current, 0.0)
+                    self._rate_time = now
+                    self._rate_bytes = bytes_done
+
+    def advance(self, bytes_done=0, files_done=0) -> None:
+        current = self.current()
+        if current is None:
+            return
+        self.update(
+            bytes_done=current.bytes_done + bytes_done,
+            files_done=current.files_done + files_done,
+        )
+
+    def current(self) -> Optional[StageProgress]:
+        with self._lock:
+            if not self.stages or self.stages[-1].finished is not None:
+                return None
+            return copy.copy(self.stages[-1])
+
+    def snapshot(self) -> List[StageProgress]:
+        with self._lock:
+            return [copy.copy(stage) for stage in self.stages]
+
+
+class VolumeMonitor:
+    # Reports the space used on a volume as the progress of the current stage,
+    # for copy tools which do not print byte counts
+
+    def __init__(self, path: str, tracker: ProgressTracker, interval=1.0):
+        self.path = path
+        self.tracker = tracker
+        self.interval = interval
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._run, daemon=True)
+        self._baseline = self._used()
+
+    def _used(self) -> int:
+        try:
+            stats = os.statvfs(self.path)
+        except OSError:
+            return 0
+        return (stats.f_blocks - stats.f_bfree) * stats.f_frsize
+
+    def _run(self) -> None:
+        while not self._stop.wait(self.interval):
+            self.tracker.update(bytes_done=max(self._used() - self._baseline, 0))
+
+    def __enter__(self) -> "VolumeMonitor":
+        self._thread.start()
+        return self
+
+    def __exit__(self, *args) -> None:
+        self._stop.set()
+        self._thread.join()
+
+
+class LineSink(Sink):
+    # Calls a parser on every line of output, also splitting on carriage
+    # returns which tools use to redraw their progress. With `partial`, the
+    # incomplete last line is parsed as well (e.g. dots printed by asr).
+    max_partial = 1000
+
+    def __init__(self, parser: Callable[[str], None], partial=False, encoding="utf-8"):
+        self.parser = parser
+        self.parse_partial = partial
+        self.decoder = codecs.getincrementaldecoder(encoding)("ignore")
+        self.partial = ""
+
+    def write(self, data: bytes) -> None:
+        lines = re.split(r"[\r\n]", self.partial + self.decoder.decode(data))
+        self.partial = lines.pop()[-self.max_partial :]
+        for line in lines:
+            if line:
+                self.parser(line)
+        if self.parse_partial and self.partial:
+            self.parser(self.partial)
+
+    def close(self) -> None:
+        if self.partial:
+            self.parser(self.partial)
+            self.partial = ""
+
+
+RSYNC_CHECK = re.compile(r"to-che?c?k=(\d+)/(\d+)")
+PERCENT = re.compile(r"PERCENT:([\d.]+)")
+ASR_PERCENT = re.compile(r"\.\.(\d+)")
+
+
+def rsync_parser(tracker: ProgressTracker) -> LineSink:
+    # Files are counted from the "to-check" status. Bytes are measured on the
+    # destination volume, since rsync only prints per-file progress.
+    def parse(line: str) -> None:
+        match = RSYNC_CHECK.search(line)
+        if match:
+            remaining, total = int(match.group(1)), int(match.group(2))
+            tracker.update(files_done=total - remaining, files_total=total)
+
+    return LineSink(parse)
+
+
+def line_counter(tracker: ProgressTracker) -> LineSink:
+    # One line per copied file (e.g. ditto -V)
+    return LineSink(lambda line: tracker.advance(files_done=1))
+
+
+def percent_parser(tracker: ProgressTracker, pattern=PERCENT) -> LineSink:
+    # Progress printed as a percentage (hdiutil -puppetstrings, asr)
+    def parse(line: str) -> None:
+        matches = pattern.findall(line)
+        current = tracker.current()
+        if not matches or current is None or not current.bytes_total:
+            return
+        percent = float(matches[-1])
+        if 0 <= percent <= 100:
+            tracker.update(bytes_done=int(current.bytes_total * percent / 100))
+
+    return LineSink(parse, partial=True)
+
+
+def asr_parser(tracker: ProgressTracker) -> LineSink:
+    return percent_parser(tracker, ASR_PERCENT)
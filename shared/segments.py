@@ -0,0 +1,185 @@
+import io
+import os
+from concurrent.futures import Future, ThreadPoolExecutor
+from dataclasses import dataclass, field
+from pathlib import Path
+from typing import BinaryIO, Dict, Iterable, List, Optional, Sequence
+
+from .hashing import BLOCK_SIZE, DEFAULT_ALGORITHMS, MultiHasher, ProgressCallback
+
+
+@dataclass
+class Segment:
+    path: Path
+    size: int = 0
+    digests: Dict[str, str] = field(default_factory=dict)
+
+
+def segment_path(base: Path, index: int) -> Path:
+    # Numbered like split files (image.dmg.001, image.dmg.002...)
+    return base.with_name(f"{base.name}.{index + 1:03}")
+
+
+def find_segments(base: Path) -> List[Path]:
+    paths: List[Path] = []
+    while segment_path(base, len(paths)).exists():
+        paths.append(segment_path(base, len(paths)))
+    return paths
+
+
+class SegmentedWriter:
+    # Writable stream split into segments of a fixed size. The whole stream
+    # and every segment are hashed while being written. When a segment is
+    # full, its digests are finalized on a background thread, while the data
+    # keeps flowing into the next one.
+
+    def __init__(
+        self,
+        base: Path,
+        segment_size: int,
+        algorithms: Iterable[str] = DEFAULT_ALGORITHMS,
+    ):
+        if segment_size <= 0:
+            raise ValueError("The segment size must be positive")
+        self.base = base
+        self.segment_size = segment_size
+        self.algorithms = tuple(algorithms)
+        self.segments: List[Segment] = []
+        self.digests: Dict[str, str] = {}
+
+        self._stream = MultiHasher(self.algorithms)
+        self._finalizer = ThreadPoolExecutor(1)
+        self._pending: List[Future] = []
+        self._file: Optional[BinaryIO] = None
+        self._hasher: Optional[MultiHasher] = None
+        self._closed = False
+
+    def _open_segment(self) -> None:
+        segment = Segment(segment_path(self.base, len(self.segments)))
+        self.segments.append(segment)
+        self._file = open(segment.path, "wb")
+        self._hasher = MultiHasher(self.algorithms)
+
+    def _close_segment(self) -> None:
+        if not self._file:
+            return
+        self._file.close()
+        segment, hasher = self.segments[-1], self._hasher
+
+        def finalize() -> None:
+            segment.digests = hasher.hexdigests()  # type: ignore
+
+        self._pending.append(self._finalizer.submit(finalize))
+        self._file = None
+        self._hasher = None
+
+    def write(self, data) -> int:
+        view = memoryview(data).cast("B")
+        self._stream.update(view)
+        written = 0
+        while written < len(view):
+            if not self._file:
+                self._open_segment()
+            segment = self.segments[-1]
+            room = self.segment_size - segment.size
+            block = view[written : written + room]
+            self._file.write(block)  # type: ignore
+            self._hasher.update(block)  # type: ignore
+            segment.size = segment.size + len(block)
+            written = written + len(block)
+            if segment.size == self.segment_size:
+                self._close_segment()
+        return written
+
+    def close(self) -> None:
+        if self._closed:
+            return
+        self._closed = True
+        if not self.segments:
+            # An empty stream still produces a (empty) segment
+            self._open_segment()
+        self._close_segment()
+        for pending in self._pending:
+            pending.result()
+        self._finalizer.shutdown()
+        self.digests = self._stream.hexdigests()
+
+    def __enter__(self) -> "SegmentedWriter":
+        return self
+
+    def __exit__(self, *args) -> None:
+        self.close()
+
+
+def copy_to_segments(
+    source: Path,
+    writer: SegmentedWriter,
+    block_size: int = BLOCK_SIZE,
+    progress: Optional[ProgressCallback] = None,
+) -> None:
+    amount = 0
+    with open(source, "rb", buffering=0) as input:
+        while True:
+            chunk = input.read(block_size)
+            if not chunk:
+                break
+            writer.write(chunk)
+            amount = amount + len(chunk)
+            if progress:
+                progress(amount)
+
+
+class SegmentReader(io.RawIOBase):
+    # Read-only, seekable view of the concatenation of the segments, so that
+    # e.g. a segmented ZIP can be opened with zipfile
+
+    def __init__(self, paths: Sequence[Path]):
+        super().__init__()
+        self._files = [open(path, "rb", buffering=0) for path in paths]
+        self._starts: List[int] = []
+        self._size = 0
+        for f in self._files:
+            self._starts.append(self._size)
+            self._size = self._size + os.fstat(f.fileno()).st_size
+        self._position = 0
+
+    def readable(self) -> bool:
+        return True
+
+    def seekable(self) -> bool:
+        return True
+
+    def tell(self) -> int:
+        return self._position
+
+    def seek(self, offset: int, whence: int = io.SEEK_SET) -> int:
+        if whence == io.SEEK_CUR:
+            offset = self._position + offset
+        elif whence == io.SEEK_END:
+            offset = self._size + offset
+        self._position = max(offset, 0)
+        return self._position
+
+    def readinto(self, buffer) -> int:
+        view = memoryview(buffer).cast("B")
+        done = 0
+        index = len(self._starts) - 1
+        while index > 0 and self._starts[index] > self._position:
+            index = index - 1
+        while done < len(view) and index < len(self._files):
+            start = self._starts[index]
+            f = self._files[index]
+            f.seek(self._position - start)
+            count = f.readinto(view[done:])
+            if not count:
+                # End of this segment
+                index = index + 1
+                continue
+            done = done + count
+            self._position = self._position + count
+        return done
+
+    def close(self) -> None:
+        for f in self._files:
+            f.close()
+        super().close()
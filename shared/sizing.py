@@ -0,0 +1,182 @@
+import os
+import stat
+import threading
+import time
+from concurrent.futures import Future
+from dataclasses import dataclass
+from pathlib import Path
+from typing import Dict, Hashable, Iterable, List, Set, Tuple
+
+from .walker import ParallelWalker
+
+# Space taken by the metadata of every file and directory in the image
+ENTRY_OVERHEAD = 4096
+# Safety margin of the upper bound
+MARGIN = 0.05
+# Seconds for which a shared estimate is reused
+SHARED_MAX_AGE = 300
+
+
+@dataclass
+class SizeEstimate:
+    # Size of the data to be acquired. Hard links are detected through their
+    # inode and counted separately, since not every copy tool preserves them.
+    # APFS clones cannot be told apart from regular files with stat(), thus
+    # they count as independent files, which is what the copy tools produce.
+    logical_bytes: int = 0
+    allocated_bytes: int = 0
+    files: int = 0
+    directories: int = 0
+    hardlinks: int = 0
+    hardlink_logical_bytes: int = 0
+    hardlink_allocated_bytes: int = 0
+    unreadable: int = 0
+    # False when taken from the statistics of a whole volume
+    scanned: bool = True
+
+    @property
+    def lower(self) -> int:
+        # Hard links preserved, sparse and compressed files kept as they are
+        return self.allocated_bytes
+
+    @property
+    def expected(self) -> int:
+        if not self.scanned:
+            return self.allocated_bytes
+        overhead = ENTRY_OVERHEAD * self.directories
+        return max(self.logical_bytes, self.allocated_bytes) + overhead
+
+    @property
+    def upper(self) -> int:
+        # Hard links copied as separate files, sparse and compressed files
+        # expanded, plus some space for metadata
+        if not self.scanned:
+            return self.allocated_bytes
+        data = max(self.logical_bytes, self.allocated_bytes)
+        duplicates = max(self.hardlink_logical_bytes, self.hardlink_allocated_bytes)
+        overhead = ENTRY_OVERHEAD * (self.files + self.directories)
+        return int((data + duplicates + overhead) * (1 + MARGIN))
+
+    @property
+    def complete(self) -> bool:
+        return self.unreadable == 0
+
+
+def volume_estimate(path: Path) -> SizeEstimate:
+    # Used space of a whole volume, which is much faster than a scan
+    try:
+        stats = os.statvfs(path)
+    except OSError:
+        return SizeEstimate(scanned=False)
+    used = (stats.f_blocks - stats.f_bfree) * stats.f_frsize
+    return SizeEstimate(
+        logical_bytes=used,
+        allocated_bytes=used,
+        files=max(stats.f_files - stats.f_ffree, 0),
+        scanned=False,
+    )
+
+
+class _Totals:
+    def __init__(self):
+        self.logical = 0
+        self.allocated = 0
+        self.files = 0
+        self.directories = 0
+
+
+def scan_estimate(
+    path: Path, exclusions: Iterable[Path] = (), workers: int = 8
+) -> SizeEstimate:
+    # Walk the tree on a thread pool. Every thread keeps its own totals, while
+    # inodes with more than one link are collected in a shared set.
+    local = threading.local()
+    all_totals: List[_Totals] = []
+    inodes: Set[Tuple[int, int]] = set()
+    duplicates = _Totals()
+    lock = threading.Lock()
+
+    def visit(entry: os.DirEntry) -> bool:
+        totals = getattr(local, "totals", None)
+        if totals is None:
+            totals = local.totals = _Totals()
+            with lock:
+                all_totals.append(totals)
+
+        info = entry.stat(follow_symlinks=False)
+        if stat.S_ISDIR(info.st_mode):
+            totals.directories = totals.directories + 1
+            return True
+
+        totals.files = totals.files + 1
+        allocated = getattr(info, "st_blocks", 0) * 512
+        if info.st_nlink > 1 and not stat.S_ISLNK(info.st_mode):
+            key = (info.st_dev, info.st_ino)
+            with lock:
+                seen = key in inodes
+                inodes.add(key)
+                if seen:
+                    duplicates.files = duplicates.files + 1
+                    duplicates.logical = duplicates.logical + info.st_size
+                    duplicates.allocated = duplicates.allocated + allocated
+            if seen:
+                return False
+        totals.logical = totals.logical + info.st_size
+        totals.allocated = totals.allocated + allocated
+        return False
+
+    walker = ParallelWalker(workers, exclusions=exclusions)
+    walker.walk(path, visit)
+
+    return SizeEstimate(
+        logical_bytes=sum(t.logical for t in all_totals),
+        allocated_bytes=sum(t.allocated for t in all_totals),
+        files=sum(t.files for t in all_totals),
+        directories=sum(t.directories for t in all_totals),
+        hardlinks=duplicates.files,
+        hardlink_logical_bytes=duplicates.logical,
+        hardlink_allocated_bytes=duplicates.allocated,
+        unreadable=walker.errors,
+    )
+
+
+def estimate_size(path: Path, exclusions: Iterable[Path] = ()) -> SizeEstimate:
+    # Whole volumes are sized from their statistics, folders are scanned
+    if not os.path.isdir(path):
+        return SizeEstimate()
+    if os.path.ismount(path):
+        return volume_estimate(path)
+    return scan_estimate(path, exclusions)
+
+
+_shared: Dict[Hashable, Tuple[float, Future]] = {}
+_shared_lock = threading.Lock()
+
+
+def _compute(future: Future, path: Path, exclusions: List[Path]) -> None:
+    try:
+        future.set_result(estimate_size(path, exclusions))
+    except Exception as e:
+        future.set_exception(e)
+
+
+def shared_estimate(path: Path, exclusions: Iterable[Path] = ()) -> Future:
+    # Scanning a large folder takes a while, so the free space check and the
+    # acquisition share the same estimate. It is computed on a background
+    # thread, which keeps going when a caller stops waiting for it.
+    exclusions = list(exclusions)
+    key = f"{path}", tuple(sorted(f"{p}" for p in exclusions))
+    with _shared_lock:
+        entry = _shared.get(key)
+        if entry and time.monotonic() - entry[0] < SHARED_MAX_AGE:
+            future = entry[1]
+            if not future.done() or not future.exception():
+                return future
+        future = Future()
+        _shared[key] = (time.monotonic(), future)
+
+    thread = threading.Thread(
+        target=_compute, args=(future, path, exclusions), daemon=True
+    )
+    thread.start()
+    return future
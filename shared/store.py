@@ -0,0 +1,424 @@
+import gzip
+import hashlib
+import json
+import os
+import sqlite3
+import stat
+import subprocess
+import tempfile
+import threading
+import zlib
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import dataclass
+from pathlib import Path
+from typing import Any, Callable, Dict, Iterator, List, Optional, Set, Tuple
+
+from .compression import CompressionPolicy
+from .xattrs import read_xattrs, write_xattr
+from .zipwriter import ZipWriter
+
+# Content-addressed store shared by several acquisitions. Files are split in
+# fixed-size chunks named by their SHA-256. Chunks are appended to pack files
+# and located through an SQLite index, so each one is stored only once. Every
+# acquisition is described by a compressed JSONL index, listing its entries
+# and the chunks of every file.
+
+CHUNK_SIZE = 4 * 1024 * 1024
+PACK_SIZE = 1024 * 1024 * 1024
+INDEX_VERSION = 1
+# Chunks are compressed only when this saves at least 1/8 of the size
+COMPRESSION_GAIN = 8
+
+
+@dataclass
+class StoreStats:
+    files: int = 0
+    chunks: int = 0
+    new_chunks: int = 0
+    bytes: int = 0
+    new_bytes: int = 0
+    stored_bytes: int = 0
+
+    @property
+    def deduplicated(self) -> float:
+        # Fraction of the data which was already in the store
+        return 1 - self.new_bytes / self.bytes if self.bytes else 0.0
+
+
+class ChunkStore:
+    def __init__(self, root: Path, pack_size: int = PACK_SIZE):
+        self.root = root
+        self.pack_size = pack_size
+        self.stats = StoreStats()
+        # The lock guards the writer connection and the pack. Lookups go
+        # through a read connection per thread, which WAL mode lets run
+        # alongside the writer.
+        self._lock = threading.Lock()
+        self._stats_lock = threading.Lock()
+        self._local = threading.local()
+        self._readers: List[sqlite3.Connection] = []
+        # Digests written since the last commit, not yet visible to readers
+        self._recent: Set[bytes] = set()
+        self._pack: Optional[Any] = None
+        self._pack_number = 0
+        self._uncommitted = 0
+
+        (root / "packs").mkdir(parents=True, exist_ok=True)
+        self._database = root / "index.sqlite"
+        self._db = sqlite3.connect(self._database, check_same_thread=False)
+        self._db.execute("PRAGMA journal_mode=WAL")
+        # The digest is the primary key of a table without row IDs, so every
+        # lookup is a single walk down a shallow B-tree
+        self._db.execute("""CREATE TABLE IF NOT EXISTS chunks (
+                digest BLOB PRIMARY KEY,
+                pack INTEGER NOT NULL,
+                offset INTEGER NOT NULL,
+                size INTEGER NOT NULL,
+                compressed INTEGER NOT NULL
+            ) WITHOUT ROWID""")
+        row = self._db.execute("SELECT MAX(pack) FROM chunks").fetchone()
+        self._pack_number = row[0] or 0
+
+    def _pack_path(self, number: int) -> Path:
+        return self.root / "packs" / f"pack-{number:06}.pack"
+
+    def _open_pack(self, size: int) -> Any:
+        # Called with the lock held
+        if self._pack and self._pack.tell() + size > self.pack_size:
+            self._commit()
+            self._pack.close()
+            self._pack = None
+            self._pack_number = self._pack_number + 1
+        if not self._pack:
+            self._pack_number = max(self._pack_number, 1)
+            self._pack = open(self._pack_path(self._pack_number), "ab")
+        return self._pack
+
+    def _commit(self) -> None:
+        # Chunks are made durable before the index refers to them
+        if self._pack:
+            self._pack.flush()
+            os.fsync(self._pack.fileno())
+        self._db.commit()
+        self._uncommitted = 0
+        self._recent.clear()
+
+    def _reader(self) -> sqlite3.Connection:
+        reader = getattr(self._local, "reader", None)
+        if reader is None:
+            reader = sqlite3.connect(self._database, check_same_thread=False)
+            self._local.reader = reader
+            with self._lock:
+                self._readers.append(reader)
+        return reader
+
+    def has(self, digest: bytes) -> bool:
+        if digest in self._recent:
+            return True
+        query = "SELECT 1 FROM chunks WHERE digest = ?"
+        return self._reader().execute(query, (digest,)).fetchone() is not None
+
+    def put(self, data: bytes) -> str:
+        digest = hashlib.sha256(data).digest()
+        with self._stats_lock:
+            self.stats.chunks = self.stats.chunks + 1
+            self.stats.bytes = self.stats.bytes + len(data)
+        if self.has(digest):
+            return digest.hex()
+
+        # Compression happens outside of the lock
+        stored = zlib.compress(data, 1)
+        compressed = len(stored) < len(data) - len(data) // COMPRESSION_GAIN
+        if not compressed:
+            stored = data
+
+        with self._lock:
+            query = "SELECT 1 FROM chunks WHERE digest = ?"
+            if self._db.execute(query, (digest,)).fetchone():
+                # Written by another thread in the meantime
+                return digest.hex()
+            pack = self._open_pack(len(stored))
+            offset = pack.tell()
+            pack.write(stored)
+            self._db.execute(
+                "INSERT INTO chunks VALUES (?, ?, ?, ?, ?)",
+                (digest, self._pack_number, offset, len(stored), compressed),
+            )
+            self._recent.add(digest)
+            self._uncommitted = self._uncommitted + 1
+            if self._uncommitted >= 1000:
+                self._commit()
+        with self._stats_lock:
+            self.stats.new_chunks = self.stats.new_chunks + 1
+            self.stats.new_bytes = self.stats.new_bytes + len(data)
+            self.stats.stored_bytes = self.stats.stored_bytes + len(stored)
+        return digest.hex()
+
+    def get(self, digest: str) -> bytes:
+        key = bytes.fromhex(digest)
+        query = "SELECT pack, offset, size, compressed FROM chunks WHERE digest = ?"
+        row = None
+        if key not in self._recent:
+            row = self._reader().execute(query, (key,)).fetchone()
+        if not row:
+            # Possibly written after the last commit
+            with self._lock:
+                row = self._db.execute(query, (key,)).fetchone()
+                if self._pack:
+                    self._pack.flush()
+        if not row:
+            raise KeyError(f"Chunk {digest} is not in the store")
+        pack, offset, size, compressed = row
+        with open(self._pack_path(pack), "rb") as f:
+            f.seek(offset)
+            data = f.read(size)
+        if compressed:
+            data = zlib.decompress(data)
+        if hashlib.sha256(data).digest() != key:
+            raise ValueError(f"Chunk {digest} is corrupted")
+        return data
+
+    def close(self) -> None:
+        with self._lock:
+            self._commit()
+            if self._pack:
+                self._pack.close()
+                self._pack = None
+            for reader in self._readers:
+                reader.close()
+            self._readers.clear()
+            self._db.close()
+
+    def __enter__(self) -> "ChunkStore":
+        return self
+
+    def __exit__(self, *args) -> None:
+        self.close()
+
+
+def _store_value(store: ChunkStore, value: bytes) -> List[str]:
+    return [
+        store.put(value[start : start + CHUNK_SIZE])
+        for start in range(0, len(value), CHUNK_SIZE)
+    ]
+
+
+def _entry(
+    store: ChunkStore, root: Path, path: Path, info: os.stat_result
+) -> Dict[str, Any]:
+    entry: Dict[str, Any] = {
+        "path": path.relative_to(root).as_posix(),
+        "mode": stat.S_IMODE(info.st_mode),
+        "uid": info.st_uid,
+        "gid": info.st_gid,
+        "atime": info.st_atime,
+        "mtime": info.st_mtime,
+    }
+    birthtime = getattr(info, "st_birthtime", None)
+    if birthtime is not None:
+        entry["birthtime"] = birthtime
+    # Attribute values can be large, like resource forks, so they are kept in
+    # the store as well
+    try:
+        attributes = read_xattrs(f"{path}")
+    except OSError as e:
+        print(f"Cannot read the attributes of {path}: {e}")
+        attributes = {}
+    if attributes:
+        entry["xattrs"] = {
+            name: _store_value(store, value) for name, value in attributes.items()
+        }
+    if stat.S_ISDIR(info.st_mode):
+        entry["type"] = "directory"
+    elif stat.S_ISLNK(info.st_mode):
+        entry["type"] = "symlink"
+        entry["target"] = os.readlink(path)
+    elif stat.S_ISREG(info.st_mode):
+        entry["type"] = "file"
+        entry["size"] = info.st_size
+    else:
+        entry["type"] = "other"
+    return entry
+
+
+def _tree(root: Path) -> Iterator[Tuple[Path, os.stat_result]]:
+    # Entries in a stable order, so that indexes of the same data are equal
+    for directory, folders, files in os.walk(root):
+        folders.sort()
+        base = Path(directory)
+        for name in sorted(folders + files):
+            path = base / name
+            try:
+                yield path, path.lstat()
+            except OSError as e:
+                print(f"Cannot read {path}: {e}")
+
+
+def _store_file(
+    store: ChunkStore, path: Path, progress: Callable[[int], None]
+) -> List[str]:
+    chunks = []
+    with open(path, "rb", buffering=0) as f:
+        while True:
+            data = f.read(CHUNK_SIZE)
+            if not data:
+                break
+            chunks.append(store.put(data))
+            progress(len(data))
+    return chunks
+
+
+def ingest_tree(
+    store: ChunkStore,
+    root: Path,
+    index_path: Path,
+    workers: Optional[int] = None,
+    progress: Optional[Callable[[int], None]] = None,
+) -> StoreStats:
+    # Add every file under root to the store and write the index of the tree.
+    # Files are read and hashed concurrently, while entries are written in
+    # order.
+    amount = 0
+    amount_lock = threading.Lock()
+
+    def advance(size: int) -> None:
+        nonlocal amount
+        with amount_lock:
+            amount = amount + size
+            if progress:
+                progress(amount)
+
+    workers = workers or os.cpu_count() or 4
+    with ThreadPoolExecutor(workers) as pool, gzip.open(index_path, "wt") as index:
+        header = {"version": INDEX_VERSION, "store": f"{store.root}"}
+        index.write(json.dumps(header) + "\n")
+
+        pending: List[Tuple[Dict[str, Any], Any]] = []
+
+        def flush(limit: int) -> None:
+            while len(pending) > limit:
+                entry, future = pending.pop(0)
+                if future is not None:
+                    try:
+                        entry["chunks"] = future.result()
+                    except OSError as e:
+                        print(f"Cannot store {entry['path']}: {e}")
+                        entry["error"] = f"{e}"
+                index.write(json.dumps(entry) + "\n")
+
+        for path, info in _tree(root):
+            entry = _entry(store, root, path, info)
+            future = None
+            if entry["type"] == "file":
+                future = pool.submit(_store_file, store, path, advance)
+                store.stats.files = store.stats.files + 1
+            pending.append((entry, future))
+            flush(workers * 8)
+        flush(0)
+
+    return store.stats
+
+
+def read_index(
+    index_path: Path,
+) -> Tuple[Dict[str, Any], Iterator[Dict[str, Any]]]:
+    handle = gzip.open(index_path, "rt")
+    header = json.loads(handle.readline())
+
+    def entries() -> Iterator[Dict[str, Any]]:
+        with handle:
+            for line in handle:
+                yield json.loads(line)
+
+    return header, entries()
+
+
+def _restore_metadata(store: ChunkStore, path: Path, entry: Dict[str, Any]) -> None:
+    # Attributes before the mode, which might not allow writing them. Then
+    # ownership, since changing it can reset special permission bits.
+    for name, chunks in entry.get("xattrs", {}).items():
+        value = b"".join(store.get(digest) for digest in chunks)
+        write_xattr(f"{path}", name, value)
+    try:
+        os.chown(path, entry["uid"], entry["gid"], follow_symlinks=False)
+    except PermissionError:
+        pass
+
+    link = entry["type"] == "symlink"
+    if not link:
+        os.chmod(path, entry["mode"])
+    elif os.chmod in os.supports_follow_symlinks:
+        os.chmod(path, entry["mode"], follow_symlinks=False)
+    if link and os.utime not in os.supports_follow_symlinks:
+        return
+
+    mtime = entry["mtime"]
+    atime = entry.get("atime", mtime)
+    birthtime = entry.get("birthtime")
+    if birthtime is not None and birthtime < mtime:
+        # On macOS an earlier modification time moves the creation time back
+        os.utime(path, (atime, birthtime), follow_symlinks=not link)
+    os.utime(path, (atime, mtime), follow_symlinks=not link)
+
+
+def restore_index(store: ChunkStore, index_path: Path, destination: Path) -> None:
+    # Rebuild the acquired tree from the store
+    _, entries = read_index(index_path)
+    directories = []
+    destination.mkdir(parents=True, exist_ok=True)
+    for entry in entries:
+        path = destination / entry["path"]
+        kind = entry["type"]
+        if kind == "directory":
+            path.mkdir(exist_ok=True)
+            directories.append((path, entry))
+            continue
+        if kind == "symlink":
+            os.symlink(entry["target"], path)
+        elif kind == "file":
+            with open(path, "wb") as output:
+                for digest in entry.get("chunks", []):
+                    output.write(store.get(digest))
+        else:
+            continue
+        _restore_metadata(store, path, entry)
+
+    # Directories last, since adding their contents changes the times
+    for path, entry in reversed(directories):
+        _restore_metadata(store, path, entry)
+
+
+def export_index(
+    index_path: Path,
+    output: Path,
+    tmp: Path,
+    store_path: Optional[Path] = None,
+) -> None:
+    # Plain DMG or ZIP of an acquisition, depending on the output extension
+    header, _ = read_index(index_path)
+    root = store_path or Path(header["store"])
+    with ChunkStore(root) as store, tempfile.TemporaryDirectory(
+        prefix="fuji-export-", dir=tmp
+    ) as directory:
+        tree = Path(directory) / output.stem
+        restore_index(store, index_path, tree)
+        if output.suffix.lower() == ".zip":
+            policy = CompressionPolicy()
+            with open(output, "wb") as stream, ZipWriter(
+                stream, policy=policy
+            ) as writer:
+                writer.write_tree(tree)
+        else:
+            subprocess.run(
+                [
+                    "hdiutil",
+                    "create",
+                    "-srcfolder",
+                    f"{tree}",
+                    "-format",
+                    "UDZO",
+                    "-ov",
+                    f"{output}",
+                ],
+                check=True,
+            )
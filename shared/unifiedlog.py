@@ -0,0 +1,161 @@
+import re
+import subprocess
+from datetime import datetime, timezone
+from pathlib import Path
+from typing import Dict, List, Optional, Tuple
+
+from .process import Sink
+
+# Helpers to convert a log archive with several `log show` processes, each
+# one covering a different time window. The windows requested to `log show`
+# overlap by a second, and every worker keeps only the records of its own
+# half-open window, so that records on a boundary are neither lost nor
+# duplicated whatever the precision of --start and --end.
+
+TIMESTAMP = re.compile(rb'"timestamp" ?: ?"([^"]+)"')
+SPAN_LINE = re.compile(r"^\s*(start|end)\s*:\s*(.+?)\s*$", re.IGNORECASE)
+SPAN_FORMATS = [
+    "%Y-%m-%d %H:%M:%S.%f%z",
+    "%Y-%m-%d %H:%M:%S%z",
+    "%a %b %d %H:%M:%S %Y",
+]
+# Archives covering less than this are converted by a single process
+MINIMUM_SPAN = 600
+OVERLAP = 1
+
+# Time window, as Unix timestamps. None means unbounded.
+Window = Tuple[Optional[float], Optional[float]]
+
+
+def parse_time(text: str) -> Optional[float]:
+    try:
+        return datetime.fromisoformat(text).timestamp()
+    except ValueError:
+        pass
+    for pattern in SPAN_FORMATS:
+        try:
+            # Dates without a time zone are local, like the output of log
+            return datetime.strptime(text, pattern).timestamp()
+        except ValueError:
+            continue
+    return None
+
+
+def record_time(line: bytes) -> Optional[float]:
+    match = TIMESTAMP.search(line)
+    if not match:
+        return None
+    return parse_time(match.group(1).decode("ascii", "ignore"))
+
+
+def log_span(archive: Path) -> Optional[Tuple[float, float]]:
+    # First and last time of the archive, according to `log stats`
+    try:
+        result = subprocess.run(
+            ["log", "stats", "--archive", f"{archive}"],
+            capture_output=True,
+            text=True,
+            timeout=600,
+        )
+    except (OSError, subprocess.SubprocessError):
+        return None
+    values: Dict[str, float] = {}
+    for line in result.stdout.splitlines():
+        match = SPAN_LINE.match(line)
+        if match:
+            moment = parse_time(match.group(2))
+            if moment is not None:
+                values.setdefault(match.group(1).lower(), moment)
+    if "start" in values and "end" in values and values["end"] > values["start"]:
+        return values["start"], values["end"]
+    return None
+
+
+def plan_windows(span: Optional[Tuple[float, float]], count: int) -> List[Window]:
+    # Consecutive windows of the same length, with boundaries on whole
+    # seconds. The first and last ones are open, in case the span reported
+    # by `log stats` is not exact.
+    if not span or count < 2 or span[1] - span[0] < MINIMUM_SPAN:
+        return [(None, None)]
+    start, end = span
+    step = (end - start) / count
+    boundaries = [float(int(start + step * index)) for index in range(1, count)]
+    edges: List[Optional[float]] = [None, *boundaries, None]
+    return [(edges[index], edges[index + 1]) for index in range(count)]
+
+
+def _option_time(moment: float) -> str:
+    value = datetime.fromtimestamp(moment, timezone.utc)
+    return value.strftime("%Y-%m-%d %H:%M:%S%z")
+
+
+def window_options(window: Window) -> List[str]:
+    # Arguments of `log show` covering the window, with some overlap
+    options = []
+    start, end = window
+    if start is not None:
+        options.extend(["--start", _option_time(start - OVERLAP)])
+    if end is not None:
+        options.extend(["--end", _option_time(end + OVERLAP)])
+    return options
+
+
+class WindowFilter(Sink):
+    # Forwards the NDJSON records of a window to the output sink. The output
+    # of `log show` is sorted by time, so only the data around the edges of
+    # the window needs to be looked at line by line: a block is passed as it
+    # is when its last record is within the window. Lines without a
+    # timestamp are kept.
+
+    def __init__(self, output: Sink, window: Window):
+        self.output = output
+        self.start, self.end = window
+        self.skipped = 0
+        self._partial = b""
+        self._inside = self.start is None
+        self._finished = False
+
+    def write(self, data: bytes) -> None:
+        data = self._partial + data
+        cut = data.rfind(b"\n") + 1
+        self._partial = data[cut:]
+        if cut:
+            self._filter(data[:cut])
+
+    def _filter(self, block: bytes) -> None:
+        if self._finished:
+            self.skipped = self.skipped + block.count(b"\n")
+            return
+        if self._inside:
+            if self.end is None:
+                self.output.write(block)
+                return
+            last = block.rstrip(b"\n").rpartition(b"\n")[2]
+            moment = record_time(last)
+            if moment is not None and moment < self.end:
+                self.output.write(block)
+                return
+
+        kept = []
+        for line in block.splitlines(keepends=True):
+            moment = record_time(line)
+            if moment is None:
+                if not self._finished:
+                    kept.append(line)
+                continue
+            if self._finished or (self.end is not None and moment >= self.end):
+                self._finished = True
+                self.skipped = self.skipped + 1
+            elif self._inside or moment >= self.start:  # type: ignore
+                self._inside = True
+                kept.append(line)
+            else:
+                self.skipped = self.skipped + 1
+        if kept:
+            self.output.write(b"".join(kept))
+
+    def close(self) -> None:
+        if self._partial:
+            self._filter(self._partial)
+            self._partial = b""
+        self.output.close()
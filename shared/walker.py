@@ -0,0 +1,82 @@
+import os
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+from typing import Callable, Iterable, Optional
+
+# Called for every entry found by the walker. For directories, the return value
+# tells whether the walker should descend into them.
+Visitor = Callable[[os.DirEntry], bool]
+
+
+class ParallelWalker:
+    # Directory walker that lists directories concurrently on a thread pool.
+    # Directories are not descended into when they are excluded or, if
+    # requested, when they belong to a different file system (like rsync -x).
+
+    def __init__(
+        self,
+        workers: int = 8,
+        exclusions: Iterable[Path] = (),
+        one_filesystem: bool = True,
+    ):
+        self.workers = workers
+        self.exclusions = {os.fspath(p).rstrip("/") for p in exclusions}
+        self.one_filesystem = one_filesystem
+
+        # Directories which could not be listed
+        self.errors = 0
+        self._pending = 0
+        self._condition = threading.Condition()
+        self._device: Optional[int] = None
+        self._pool: Optional[ThreadPoolExecutor] = None
+
+    def _submit(self, directory: str, visit: Visitor) -> None:
+        with self._condition:
+            self._pending = self._pending + 1
+        self._pool.submit(self._scan, directory, visit)  # type: ignore
+
+    def _descend(self, entry: os.DirEntry) -> bool:
+        if entry.path in self.exclusions:
+            return False
+        if self.one_filesystem:
+            try:
+                device = entry.stat(follow_symlinks=False).st_dev
+            except OSError:
+                return False
+            if device != self._device:
+                return False
+        return True
+
+    def _scan(self, directory: str, visit: Visitor) -> None:
+        try:
+            with os.scandir(directory) as entries:
+                for entry in entries:
+                    try:
+                        is_directory = entry.is_dir(follow_symlinks=False)
+                        if is_directory and not self._descend(entry):
+                            continue
+                        descend = visit(entry)
+                        if is_directory and descend:
+                            self._submit(entry.path, visit)
+                    except Exception as e:
+                        print(f"Error while processing {entry.path}: {e}")
+        except OSError as e:
+            print(f"Cannot list {directory}: {e}")
+            with self._condition:
+                self.errors = self.errors + 1
+        finally:
+            with self._condition:
+                self._pending = self._pending - 1
+                if self._pending == 0:
+                    self._condition.notify_all()
+
+    def walk(self, root: Path, visit: Visitor) -> None:
+        self._device = os.stat(root).st_dev
+        with ThreadPoolExecutor(self.workers) as pool:
+            self._pool = pool
+            self._submit(os.fspath(root), visit)
+            with self._condition:
+                while self._pending > 0:
+                    self._condition.wait()
+        self._pool = None
@@ -0,0 +1,127 @@
+import ctypes
+import errno
+import os
+import sys
+from typing import Dict, List, Optional
+
+# Extended attributes of a path, not following symlinks. Python exposes them
+# only on Linux, so on macOS the calls of libc are used directly.
+
+# From <sys/xattr.h> on macOS
+XATTR_NOFOLLOW = 0x0001
+
+# Attributes which cannot be read or written are skipped
+SKIPPED_ERRORS = {errno.EPERM, errno.EACCES, errno.ENOTSUP, errno.ENODATA}
+
+_libc: Optional[ctypes.CDLL] = None
+if not hasattr(os, "listxattr") and sys.platform == "darwin":
+    _libc = ctypes.CDLL(None, use_errno=True)
+    _libc.listxattr.argtypes = [
+        ctypes.c_char_p,
+        ctypes.c_char_p,
+        ctypes.c_size_t,
+        ctypes.c_int,
+    ]
+    _libc.listxattr.restype = ctypes.c_ssize_t
+    _libc.getxattr.argtypes = [
+        ctypes.c_char_p,
+        ctypes.c_char_p,
+        ctypes.c_void_p,
+        ctypes.c_size_t,
+        ctypes.c_uint32,
+        ctypes.c_int,
+    ]
+    _libc.getxattr.restype = ctypes.c_ssize_t
+    _libc.setxattr.argtypes = [
+        ctypes.c_char_p,
+        ctypes.c_char_p,
+        ctypes.c_void_p,
+        ctypes.c_size_t,
+        ctypes.c_uint32,
+        ctypes.c_int,
+    ]
+    _libc.setxattr.restype = ctypes.c_int
+
+
+def supported() -> bool:
+    return hasattr(os, "listxattr") or _libc is not None
+
+
+def _check(result: int, path: str) -> int:
+    if result < 0:
+        code = ctypes.get_errno()
+        raise OSError(code, os.strerror(code), path)
+    return result
+
+
+def _read(function, path: str, *arguments) -> bytes:
+    # Ask for the size first, then read. The value might grow in between.
+    encoded = os.fsencode(path)
+    while True:
+        size = _check(function(encoded, *arguments, None, 0), path)
+        if size == 0:
+            return b""
+        buffer = ctypes.create_string_buffer(size)
+        try:
+            length = _check(function(encoded, *arguments, buffer, size), path)
+        except OSError as e:
+            if e.errno == errno.ERANGE:
+                continue
+            raise
+        return buffer.raw[:length]
+
+
+def _names(path: str) -> List[str]:
+    if hasattr(os, "listxattr"):
+        return os.listxattr(path, follow_symlinks=False)
+    raw = _read(
+        lambda p, buffer, size: _libc.listxattr(  # type: ignore
+            p, buffer, size, XATTR_NOFOLLOW
+        ),
+        path,
+    )
+    return [os.fsdecode(name) for name in raw.split(b"\0") if name]
+
+
+def _value(path: str, name: str) -> bytes:
+    if hasattr(os, "getxattr"):
+        return os.getxattr(path, name, follow_symlinks=False)
+    encoded = os.fsencode(name)
+    return _read(
+        lambda p, buffer, size: _libc.getxattr(  # type: ignore
+            p, encoded, buffer, size, 0, XATTR_NOFOLLOW
+        ),
+        path,
+    )
+
+
+def read_xattrs(path: str) -> Dict[str, bytes]:
+    if not supported():
+        return {}
+    values = {}
+    for name in _names(path):
+        try:
+            values[name] = _value(path, name)
+        except OSError as e:
+            if e.errno not in SKIPPED_ERRORS:
+                raise
+    return values
+
+
+def write_xattr(path: str, name: str, value: bytes) -> None:
+    try:
+        if hasattr(os, "setxattr"):
+            os.setxattr(path, name, value, follow_symlinks=False)
+        elif _libc is not None:
+            result = _libc.setxattr(
+                os.fsencode(path),
+                os.fsencode(name),
+                value,
+                len(value),
+                0,
+                XATTR_NOFOLLOW,
+            )
+            _check(result, path)
+    except OSError as e:
+        if e.errno not in SKIPPED_ERRORS:
+            raise
@@ -0,0 +1,428 @@
+import functools
+import os
+import stat
+import struct
+import time
+import zlib
+from collections import deque
+from concurrent.futures import Future, ThreadPoolExecutor
+from dataclasses import dataclass
+from pathlib import Path
+from typing import BinaryIO, Callable, Deque, List, Optional, Tuple
+
+from .compression import CompressionPolicy
+
+ZIP_STORED = 0
+ZIP_DEFLATED = 8
+
+ZIP64_LIMIT = (1 << 32) - 1
+ZIP_FILECOUNT_LIMIT = (1 << 16) - 1
+# Members close to the limit get ZIP64 headers, since deflate can expand data
+ZIP64_THRESHOLD = int(ZIP64_LIMIT * 0.95)
+
+CHUNK_SIZE = 1024 * 1024
+
+FLAG_DATA_DESCRIPTOR = 1 << 3
+FLAG_UTF8 = 1 << 11
+
+
+def _gf2_times(matrix: Tuple[int, ...], vector: int) -> int:
+    result = 0
+    index = 0
+    while vector:
+        if vector & 1:
+            result ^= matrix[index]
+        vector >>= 1
+        index += 1
+    return result
+
+
+def _gf2_square(matrix: Tuple[int, ...]) -> Tuple[int, ...]:
+    return tuple(_gf2_times(matrix, column) for column in matrix)
+
+
+@functools.lru_cache(maxsize=64)
+def _crc32_operator(length: int) -> Tuple[int, ...]:
+    # Operator appending `length` zero bytes to a CRC-32, as in zlib
+    result = tuple(1 << n for n in range(32))
+    power = (0xEDB88320,) + tuple(1 << n for n in range(31))
+    for _ in range(3):
+        power = _gf2_square(power)
+    while length:
+        if length & 1:
+            result = tuple(_gf2_times(power, column) for column in result)
+        length >>= 1
+        if length:
+            power = _gf2_square(power)
+    return result
+
+
+def crc32_combine(crc1: int, crc2: int, length2: int) -> int:
+    # CRC-32 of the concatenation of two blocks, given their CRCs
+    if length2 == 0:
+        return crc1
+    return _gf2_times(_crc32_operator(length2), crc1) ^ crc2
+
+
+def _dos_datetime(timestamp: float) -> Tuple[int, int]:
+    moment = time.localtime(timestamp)
+    if moment.tm_year < 1980:
+        return (0 << 9) | (1 << 5) | 1, 0
+    date = (moment.tm_year - 1980) << 9 | moment.tm_mon << 5 | moment.tm_mday
+    clock = moment.tm_hour << 11 | moment.tm_min << 5 | moment.tm_sec // 2
+    return date, clock
+
+
+@dataclass
+class ZipMember:
+    name: bytes
+    mode: int
+    mtime: float
+    size: int
+    method: int = ZIP_DEFLATED
+    level: int = 6
+    zip64: bool = False
+    offset: int = 0
+    crc: int = 0
+    compressed_size: int = 0
+    uncompressed_size: int = 0
+    path: Optional[str] = None
+    # Pending choice of the compression policy
+    decision: Optional[Future] = None
+    kind: str = ""
+
+
+def _compress_chunk(
+    path: str, offset: int, size: int, method: int, level: int, last: bool
+) -> Tuple[int, int, bytes]:
+    with open(path, "rb") as f:
+        f.seek(offset)
+        data = f.read(size)
+    crc = zlib.crc32(data)
+    if method == ZIP_STORED:
+        return len(data), crc, data
+
+    # Raw deflate streams can be concatenated when every chunk but the last
+    # one ends with a sync flush, like pigz does
+    compressor = zlib.compressobj(level, zlib.DEFLATED, -15)
+    mode = zlib.Z_FINISH if last else zlib.Z_SYNC_FLUSH
+    compressed = compressor.compress(data) + compressor.flush(mode)
+    return len(data), crc, compressed
+
+
+def _compress_member_chunk(
+    member: ZipMember, offset: int, size: int, last: bool
+) -> Tuple[int, int, bytes]:
+    method, level = member.method, member.level
+    if member.decision is not None:
+        # Submitted before the chunks, so it is already running or done
+        decision = member.decision.result()
+        method, level = decision.method, decision.level
+    path: str = member.path  # type: ignore
+    return _compress_chunk(path, offset, size, method, level, last)
+
+
+class ZipWriter:
+    # Streaming ZIP64 writer. File members are split into chunks compressed
+    # concurrently on a thread pool, while a single writer emits the results
+    # in order. The output is written sequentially (sizes are stored in data
+    # descriptors), so it does not need to be seekable. With a compression
+    # policy, the method of every file is chosen by the workers as well.
+
+    def __init__(
+        self,
+        output: BinaryIO,
+        workers: Optional[int] = None,
+        level: int = 6,
+        chunk_size: int = CHUNK_SIZE,
+        progress: Optional[Callable[[int], None]] = None,
+        policy: Optional[CompressionPolicy] = None,
+    ):
+        self.output = output
+        self.workers = workers or os.cpu_count() or 4
+        self.level = level
+        self.chunk_size = chunk_size
+        self.progress = progress
+        self.policy = policy
+
+        self.members: List[ZipMember] = []
+        self.offset = 0
+        self.processed = 0
+
+        self._pool = ThreadPoolExecutor(self.workers)
+        self._queue: Deque[Tuple[str, ZipMember, Optional[Future]]] = deque()
+        self._running = 0
+        self._window = self.workers * 8
+
+    def _write(self, data: bytes) -> None:
+        self.output.write(data)
+        self.offset = self.offset + len(data)
+
+    def _local_header(self, member: ZipMember) -> bytes:
+        date, clock = _dos_datetime(member.mtime)
+        flags = FLAG_UTF8
+        crc = size = compressed_size = 0
+        extra = b""
+        if member.path is not None:
+            # Sizes and CRC follow the data, in a data descriptor
+            flags = flags | FLAG_DATA_DESCRIPTOR
+        if member.zip64:
+            extra = struct.pack("<HHQQ", 1, 16, 0, 0)
+            size = compressed_size = 0xFFFFFFFF
+        version = 45 if member.zip64 else 20
+        header = struct.pack(
+            "<IHHHHHIIIHH",
+            0x04034B50,
+            version,
+            flags,
+            member.method,
+            clock,
+            date,
+            crc,
+            compressed_size,
+            size,
+            len(member.name),
+            len(extra),
+        )
+        return header + member.name + extra
+
+    def _data_descriptor(self, member: ZipMember) -> bytes:
+        if member.zip64:
+            return struct.pack(
+                "<IIQQ",
+                0x08074B50,
+                member.crc,
+                member.compressed_size,
+                member.uncompressed_size,
+            )
+        return struct.pack(
+            "<IIII",
+            0x08074B50,
+            member.crc,
+            member.compressed_size,
+            member.uncompressed_size,
+        )
+
+    def _central_header(self, member: ZipMember) -> bytes:
+        date, clock = _dos_datetime(member.mtime)
+        flags = FLAG_UTF8
+        if member.path is not None:
+            flags = flags | FLAG_DATA_DESCRIPTOR
+
+        extra_fields = []
+        size = member.uncompressed_size
+        compressed_size = member.compressed_size
+        offset = member.offset
+        if size > ZIP64_LIMIT:
+            extra_fields.append(size)
+            size = 0xFFFFFFFF
+        if compressed_size > ZIP64_LIMIT:
+            extra_fields.append(compressed_size)
+            compressed_size = 0xFFFFFFFF
+        if offset > ZIP64_LIMIT:
+            extra_fields.append(offset)
+            offset = 0xFFFFFFFF
+        extra = b""
+        if extra_fields:
+            extra = struct.pack(
+                f"<HH{len(extra_fields)}Q", 1, 8 * len(extra_fields), *extra_fields
+            )
+
+        version = 45 if extra_fields or member.zip64 else 20
+        attributes = (member.mode & 0xFFFF) << 16
+        if stat.S_ISDIR(member.mode):
+            # MS-DOS directory flag
+            attributes = attributes | 0x10
+        header = struct.pack(
+            "<IHHHHHHIIIHHHHHII",
+            0x02014B50,
+            (3 << 8) | version,
+            version,
+            flags,
+            member.method,
+            clock,
+            date,
+            member.crc,
+            compressed_size,
+            size,
+            len(member.name),
+            len(extra),
+            0,
+            0,
+            0,
+            attributes,
+            offset,
+        )
+        return header + member.name + extra
+
+    def _drain(self, limit: int) -> None:
+        # Write queued items in order, while more than `limit` chunks are pending
+        while self._queue:
+            kind, member, future = self._queue[0]
+            if kind == "chunk" and self._running <= limit:
+                break
+            self._queue.popleft()
+
+            if kind == "begin" and member.decision is not None:
+                decision = member.decision.result()
+                member.method, member.level = decision.method, decision.level
+                member.kind = decision.kind
+            if kind in ("begin", "directory"):
+                member.offset = self.offset
+                self._write(self._local_header(member))
+                if kind == "directory":
+                    self.members.append(member)
+            elif kind == "chunk":
+                size, crc, data = future.result()  # type: ignore
+                self._running = self._running - 1
+                if member.uncompressed_size:
+                    member.crc = crc32_combine(member.crc, crc, size)
+                else:
+                    # Most files fit in a single chunk, which needs no combining
+                    member.crc = crc
+                member.uncompressed_size = member.uncompressed_size + size
+                member.compressed_size = member.compressed_size + len(data)
+                self._write(data)
+                self.processed = self.processed + size
+                if self.progress:
+                    self.progress(self.processed)
+            elif kind == "end":
+                self._write(self._data_descriptor(member))
+                self.members.append(member)
+                if self.policy and member.kind:
+                    self.policy.record(
+                        member.kind,
+                        member.uncompressed_size,
+                        member.compressed_size,
+                    )
+
+    def _enqueue(self, kind: str, member: ZipMember, future=None) -> None:
+        self._queue.append((kind, member, future))
+        if future is not None:
+            self._running = self._running + 1
+            if self._running > self._window:
+                self._drain(self._window)
+
+    def add_directory(self, arcname: str, info: os.stat_result) -> None:
+        name = arcname.rstrip("/") + "/"
+        member = ZipMember(
+            name=name.encode("utf-8", "surrogateescape"),
+            mode=info.st_mode,
+            mtime=info.st_mtime,
+            size=0,
+            method=ZIP_STORED,
+        )
+        self._enqueue("directory", member)
+
+    def add_file(
+        self,
+        path: str,
+        arcname: str,
+        info: os.stat_result,
+        method: Optional[int] = None,
+        level: Optional[int] = None,
+    ) -> None:
+        # Without an explicit method, the policy decides (if any)
+        member = ZipMember(
+            name=arcname.encode("utf-8", "surrogateescape"),
+            mode=info.st_mode,
+            mtime=info.st_mtime,
+            size=info.st_size,
+            method=ZIP_DEFLATED if method is None else method,
+            level=self.level if level is None else level,
+            zip64=info.st_size > ZIP64_THRESHOLD,
+            path=path,
+        )
+        if method is None and self.policy:
+            member.decision = self._pool.submit(self.policy.decide, path, member.size)
+        self._enqueue("begin", member)
+        offset = 0
+        while True:
+            last = offset + self.chunk_size >= member.size
+            size = self.chunk_size if not last else member.size - offset
+            future = self._pool.submit(
+                _compress_member_chunk, member, offset, size, last
+            )
+            self._enqueue("chunk", member, future)
+            offset = offset + size
+            if last:
+                break
+        self._enqueue("end", member)
+
+    def write_tree(self, root: Path) -> None:
+        # Regular files are stored following symlinks, like shutil.make_archive
+        pending = [os.fspath(root)]
+        while pending:
+            directory = pending.pop()
+            try:
+                names = sorted(os.listdir(directory))
+            except OSError as e:
+                print(f"Cannot list {directory}: {e}")
+                continue
+            for name in names:
+                path = os.path.join(directory, name)
+                arcname = os.path.relpath(path, root).replace(os.sep, "/")
+                try:
+                    info = os.stat(path)
+                except OSError as e:
+                    print(f"Cannot read {path}: {e}")
+                    continue
+                if stat.S_ISDIR(info.st_mode) and not os.path.islink(path):
+                    self.add_directory(arcname, info)
+                    pending.append(path)
+                elif stat.S_ISREG(info.st_mode):
+                    self.add_file(path, arcname, info)
+
+    def close(self) -> None:
+        try:
+            self._drain(0)
+        finally:
+            self._pool.shutdown()
+
+        start = self.offset
+        for member in self.members:
+            self._write(self._central_header(member))
+        size = self.offset - start
+        count = len(self.members)
+
+        needs_zip64 = (
+            count > ZIP_FILECOUNT_LIMIT or start > ZIP64_LIMIT or size > ZIP64_LIMIT
+        )
+        if needs_zip64:
+            record_offset = self.offset
+            self._write(
+                struct.pack(
+                    "<IQHHIIQQQQ",
+                    0x06064B50,
+                    44,
+                    (3 << 8) | 45,
+                    45,
+                    0,
+                    0,
+                    count,
+                    count,
+                    size,
+                    start,
+                )
+            )
+            self._write(struct.pack("<IIQI", 0x07064B50, 0, record_offset, 1))
+
+        self._write(
+            struct.pack(
+                "<IHHHHIIH",
+                0x06054B50,
+                0,
+                0,
+                0xFFFF if needs_zip64 else count,
+                0xFFFF if needs_zip64 else count,
+                0xFFFFFFFF if needs_zip64 else size,
+                0xFFFFFFFF if needs_zip64 else start,
+                0,
+            )
+        )
+
+    def __enter__(self) -> "ZipWriter":
+        return self
+
+    def __exit__(self, *args) -> None:
+        self.close()